@@ -79,6 +79,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        #In-memory test databases fail concurrent writers instead of making them wait
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -1,21 +1,48 @@
-from django.shortcuts import render
+from django.shortcuts import render,get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.generic import ListView,CreateView,UpdateView,DetailView,View
 from DjangoEcommerceApp.models import Categories,SubCategories,CustomUser,MerchantUser,Products,ProductAbout,ProductDetails,ProductMedia,ProductTransaction,ProductTags,StaffUser,CustomerUser
 from django.contrib.messages.views import SuccessMessageMixin
+from django.core.exceptions import ImproperlyConfigured
 from django.core.files.storage import FileSystemStorage
 from django.contrib.messages.views import messages
 from django.urls import reverse
-from django.http import HttpResponseRedirect,HttpResponse
-from django.db.models import Q
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.http import HttpResponseRedirect,HttpResponse,JsonResponse,StreamingHttpResponse
+from django.db.models import Q,Prefetch
 from DjangoEcommerce.settings import BASE_URL
+from DjangoEcommerceApp.pagination import KeysetPaginationMixin,CachedCountMixin
+from DjangoEcommerceApp.search import search_products,search_profiles
+from DjangoEcommerceApp.category_tree import get_category_tree
+from DjangoEcommerceApp.facets import parse_facet_filters,filter_products,facet_counts
+from DjangoEcommerceApp.prices import parse_price
+from DjangoEcommerceApp.reviews import review_feed,review_data
+from DjangoEcommerceApp.exports import FORMATS,ExportError,export_lines
+from DjangoEcommerceApp.bulk_actions import BulkActionError,run_bulk_action
+from DjangoEcommerceApp.product_import import bulk_create_products,parse_tags
+from DjangoEcommerceApp.product_edit import apply_product_edit
+from DjangoEcommerceApp.inventory import add_stock
+from DjangoEcommerceApp.stock_series import SeriesError,stock_series,parse_series_params
+from DjangoEcommerceApp.forecasting import reorder_plan
+from decimal import Decimal
 from django.views.decorators.csrf import csrf_exempt
 
 @login_required(login_url="/admin/")
 def admin_home(request):
     return render(request,"admin_templates/home.html")
 
-class CategoriesListView(ListView):
+@login_required(login_url="/admin/")
+def export_data(request,name):
+    format=request.GET.get("format","csv")
+    try:
+        lines=export_lines(name,format,request.GET.get("columns"),request.GET)
+    except ExportError as e:
+        return HttpResponse(str(e),status=400,content_type="text/plain")
+    response=StreamingHttpResponse(lines,content_type=FORMATS[format])
+    response["Content-Disposition"]='attachment; filename="%s.%s"' % (name,format)
+    return response
+
+class CategoriesListView(KeysetPaginationMixin,CachedCountMixin,ListView):
     model=Categories
     template_name="admin_templates/category_list.html"
     paginate_by=3
@@ -51,7 +78,7 @@ class CategoriesUpdate(SuccessMessageMixin,UpdateView):
     template_name="admin_templates/category_update.html"
 
 
-class SubCategoriesListView(ListView):
+class SubCategoriesListView(KeysetPaginationMixin,CachedCountMixin,ListView):
     model=SubCategories
     template_name="admin_templates/sub_category_list.html"
     paginate_by=3
@@ -86,7 +113,7 @@ class SubCategoriesUpdate(SuccessMessageMixin,UpdateView):
     fields="__all__"
     template_name="admin_templates/sub_category_update.html"
 
-class MerchantUserListView(ListView):
+class MerchantUserListView(KeysetPaginationMixin,CachedCountMixin,ListView):
     model=MerchantUser
     template_name="admin_templates/merchant_list.html"
     paginate_by=3
@@ -95,7 +122,7 @@ class MerchantUserListView(ListView):
         filter_val=self.request.GET.get("filter","")
         order_by=self.request.GET.get("orderby","id")
         if filter_val!="":
-            cat=MerchantUser.objects.filter(Q(auth_user_id__first_name__contains=filter_val) |Q(auth_user_id__last_name__contains=filter_val) | Q(auth_user_id__email__contains=filter_val) | Q(auth_user_id__username__contains=filter_val)).order_by(order_by)
+            cat=search_profiles(MerchantUser.objects.all(),filter_val).order_by(order_by)
         else:
             cat=MerchantUser.objects.all().order_by(order_by)
 
@@ -187,11 +214,7 @@ class MerchantUserUpdateView(SuccessMessageMixin,UpdateView):
 
 class ProductView(View):
     def get(self,request,*args,**kwargs):
-        categories=Categories.objects.filter(is_active=1)
-        categories_list=[]
-        for category in categories:
-            sub_category=SubCategories.objects.filter(is_active=1,category_id=category.id)
-            categories_list.append({"category":category,"sub_category":sub_category})
+        categories_list=get_category_tree()
 
         merchant_users=MerchantUser.objects.filter(auth_user_id__is_active=True)
 
@@ -202,8 +225,8 @@ class ProductView(View):
         brand=request.POST.get("brand")
         url_slug=request.POST.get("url_slug")
         sub_category=request.POST.get("sub_category")
-        product_max_price=request.POST.get("product_max_price")
-        product_discount_price=request.POST.get("product_discount_price")
+        product_max_price=parse_price(request.POST.get("product_max_price"),Decimal("0"))
+        product_discount_price=parse_price(request.POST.get("product_discount_price"),Decimal("0"))
         product_description=request.POST.get("product_description")
         added_by_merchant=request.POST.get("added_by_merchant")
         in_stock_total=request.POST.get("in_stock_total")
@@ -215,38 +238,38 @@ class ProductView(View):
         product_tags=request.POST.get("product_tags")
         long_desc=request.POST.get("long_desc")
 
+        #Every field is checked before the first upload is written, so bad input leaves no files behind
+        try:
+            in_stock_total=int(in_stock_total or 0)
+        except ValueError:
+            return HttpResponse("Invalid in_stock_total %r" % in_stock_total,status=400,content_type="text/plain")
+        if in_stock_total<0:
+            return HttpResponse("in_stock_total cannot be negative",status=400,content_type="text/plain")
         subcat_obj=SubCategories.objects.get(id=sub_category)
         merchant_user_obj=MerchantUser.objects.get(id=added_by_merchant)
-        product=Products(product_name=product_name,in_stock_total=in_stock_total,url_slug=url_slug,brand=brand,subcategories_id=subcat_obj,product_description=product_description,product_max_price=product_max_price,product_discount_price=product_discount_price,product_long_description=long_desc,added_by_merchant=merchant_user_obj)
-        product.save()
 
-        i=0
-        for media_content in media_content_list:
-            fs=FileSystemStorage()
-            filename=fs.save(media_content.name,media_content)
-            media_url=fs.url(filename)
-            product_media=ProductMedia(product_id=product,media_type=media_type_list[i],media_content=media_url)
-            product_media.save()
-            i=i+1
-        
-        j=0
-        for title_title in title_title_list:
-            product_details=ProductDetails(title=title_title,title_details=title_details_list[j],product_id=product)
-            product_details.save()
-            j=j+1
-
-        for about in about_title_list:
-            product_about=ProductAbout(title=about,product_id=product)
-            product_about.save()
-        
-        product_tags_list=product_tags.split(",")
-
-        for product_tag in product_tags_list:
-            product_tag_obj=ProductTags(product_id=product,title=product_tag)
-            product_tag_obj.save()
-        
-        product_transaction=ProductTransaction(product_id=product,transaction_type=1,transaction_product_count=in_stock_total,transaction_description="Intially Item Added in Stocks")
-        product_transaction.save()
+        #Uploads are stored before the transaction, so no write lock is held during disk I/O
+        fs=FileSystemStorage()
+        saved_files=[]
+        media=[]
+        try:
+            for media_type,media_content in zip(media_type_list,media_content_list):
+                filename=fs.save(media_content.name,media_content)
+                saved_files.append(filename)
+                media.append((media_type,fs.url(filename)))
+
+            spec={
+                "product":dict(product_name=product_name,in_stock_total=in_stock_total,url_slug=url_slug,brand=brand,subcategories_id=subcat_obj,product_description=product_description,product_max_price=product_max_price,product_discount_price=product_discount_price,product_long_description=long_desc,added_by_merchant=merchant_user_obj),
+                "media":media,
+                "details":list(zip(title_title_list,title_details_list)),
+                "about":about_title_list,
+                "tags":parse_tags(product_tags),
+            }
+            bulk_create_products([spec])
+        except Exception:
+            for filename in saved_files:
+                fs.delete(filename)
+            raise
         return HttpResponse("OK")
 
 @csrf_exempt
@@ -258,34 +281,101 @@ def file_upload(request):
     return HttpResponse('{"location":"'+BASE_URL+''+file_url+'"}')
 
 
-class ProductListView(ListView):
+class ProductListView(KeysetPaginationMixin,CachedCountMixin,ListView):
     model=Products
     template_name="admin_templates/product_list.html"
     paginate_by=3
 
+    def get_ordering(self):
+        #Searches are ranked by relevance unless a sort is picked; a rank cannot be used as a cursor key
+        default="id"
+        if self.request.GET.get("filter","")!="" and not self.is_cursor_mode():
+            default="search_rank"
+        order_by=self.request.GET.get("orderby",default)
+        if self.is_cursor_mode():
+            order_by=self.keyset_ordering(order_by)
+        return order_by
+
     def get_queryset(self):
         filter_val=self.request.GET.get("filter","")
-        order_by=self.request.GET.get("orderby","id")
+        order_by=self.get_ordering()
         if filter_val!="":
-            products=Products.objects.filter(Q(product_name__contains=filter_val) | Q(product_description__contains=filter_val)).order_by(order_by)
+            products=search_products(Products.objects.all(),filter_val).order_by(order_by)
         else:
             products=Products.objects.all().order_by(order_by)
-        
-        product_list=[]
-        for product in products:
-            product_media=ProductMedia.objects.filter(product_id=product.id,media_type=1,is_active=1).first()
-            product_list.append({"product":product,"media":product_media})
+        products=filter_products(products,parse_facet_filters(self.request.GET))
 
-        return product_list
+        price_min=parse_price(self.request.GET.get("price_min"))
+        price_max=parse_price(self.request.GET.get("price_max"))
+        if price_min is not None:
+            products=products.filter(product_discount_price__gte=price_min)
+        if price_max is not None:
+            products=products.filter(product_discount_price__lte=price_max)
+
+        #Primary image is prefetched for the current page only, in one query
+        primary_media=ProductMedia.objects.filter(media_type=1,is_active=1).order_by("id")
+        products=products.select_related("subcategories_id","rating_summary").prefetch_related(Prefetch("productmedia_set",queryset=primary_media,to_attr="primary_media"))
+        return products
 
     def get_context_data(self,**kwargs):
         context=super(ProductListView,self).get_context_data(**kwargs)
         context["filter"]=self.request.GET.get("filter","")
-        context["orderby"]=self.request.GET.get("orderby","id")
+        context["orderby"]=self.get_ordering()
+        context["price_min"]=self.request.GET.get("price_min","")
+        context["price_max"]=self.request.GET.get("price_max","")
+        #Price and facet filters carried over by the sort and page links, which set the rest themselves
+        query=self.request.GET.copy()
+        for key in ("filter","orderby","page","cursor"):
+            query.pop(key,None)
+        context["extra_query"]="&"+query.urlencode() if query else ""
+        #Called by the template only when it renders the bulk action form
+        context["categories"]=get_category_tree
         context["all_table_fields"]=Products._meta.get_fields()
         return context
 
 
+class ProductBulkActionView(View):
+    def post(self,request,*args,**kwargs):
+        try:
+            message=run_bulk_action(request.POST.get("action"),request.POST.getlist("product_ids"),request.POST)
+            messages.success(request,message)
+        except BulkActionError as e:
+            messages.error(request,str(e))
+        next_url=request.POST.get("next")
+        if not next_url or not url_has_allowed_host_and_scheme(next_url,allowed_hosts={request.get_host()}):
+            next_url=reverse("product_list")
+        return HttpResponseRedirect(next_url)
+
+
+class ProductFacetsView(View):
+    def get(self,request,*args,**kwargs):
+        filters=parse_facet_filters(request.GET)
+        counts=facet_counts(filters)
+        sub_categories=dict(SubCategories.objects.filter(id__in=[value for value,count in counts.get("subcategory",[])]).values_list("id","title"))
+        facets={}
+        for facet,values in counts.items():
+            facets[facet]=[{"value":value,"label":sub_categories.get(int(value),value) if facet=="subcategory" else value,"count":count} for value,count in values]
+        return JsonResponse({"filters":filters,"facets":facets})
+
+
+class ProductReviewsView(View):
+    def get(self,request,*args,**kwargs):
+        sort=request.GET.get("sort","helpful")
+        page=review_feed(kwargs["product_id"],sort,request.GET.get("cursor"))
+        return JsonResponse({"sort":sort,"reviews":[review_data(review) for review in page],"next_cursor":page.next_cursor,"previous_cursor":page.previous_cursor})
+
+
+class ProductStockSeriesView(View):
+    def get(self,request,*args,**kwargs):
+        product=get_object_or_404(Products,id=kwargs["product_id"])
+        try:
+            resolution,start,end=parse_series_params(request.GET)
+            series=stock_series(product.id,resolution,start,end)
+        except SeriesError as e:
+            return JsonResponse({"error":str(e)},status=400)
+        return JsonResponse({"product_id":product.id,"resolution":resolution,"in_stock_total":product.in_stock_total,"series":series})
+
+
 class ProductEdit(View):
 
     def get(self,request,*args,**kwargs):
@@ -295,11 +385,7 @@ class ProductEdit(View):
         product_about=ProductAbout.objects.filter(product_id=product_id)
         product_tags=ProductTags.objects.filter(product_id=product_id)
 
-        categories=Categories.objects.filter(is_active=1)
-        categories_list=[]
-        for category in categories:
-            sub_category=SubCategories.objects.filter(is_active=1,category_id=category.id)
-            categories_list.append({"category":category,"sub_category":sub_category})
+        categories_list=get_category_tree()
 
         return render(request,"admin_templates/product_edit.html",{"categories":categories_list,"product":product,"product_details":product_details,"product_about":product_about,"product_tags":product_tags})
 
@@ -309,8 +395,8 @@ class ProductEdit(View):
         brand=request.POST.get("brand")
         url_slug=request.POST.get("url_slug")
         sub_category=request.POST.get("sub_category")
-        product_max_price=request.POST.get("product_max_price")
-        product_discount_price=request.POST.get("product_discount_price")
+        product_max_price=parse_price(request.POST.get("product_max_price"),Decimal("0"))
+        product_discount_price=parse_price(request.POST.get("product_discount_price"),Decimal("0"))
         product_description=request.POST.get("product_description")
         title_title_list=request.POST.getlist("title_title[]")
         details_ids=request.POST.getlist("details_id[]")
@@ -323,55 +409,10 @@ class ProductEdit(View):
 
         product_id=kwargs["product_id"]
         product=Products.objects.get(id=product_id)
-        product.product_name=product_name
-        product.url_slug=url_slug
-        product.brand=brand
-        product.subcategories_id=subcat_obj
-        product.product_description=product_description
-        product.product_max_price=product_max_price
-        product.product_discount_price=product_discount_price
-        product.product_long_description=long_desc
-        product.save()
-
-        
-        j=0
-        for title_title in title_title_list:
-            detail_id=details_ids[j]
-            if detail_id == "blank" and title_title!="":
-                product_details=ProductDetails(title=title_title,title_details=title_details_list[j],product_id=product)
-                product_details.save()
-            else: 
-                if title_title!="":               
-                    product_details=ProductDetails.objects.get(id=detail_id)
-                    product_details.title=title_title
-                    product_details.title_details=title_details_list[j]
-                    product_details.product_id=product
-                    product_details.save()
-            j=j+1
-
-
-        k=0
-        for about in about_title_list:
-            about_id=about_ids[k]
-            if about_id=="blank" and about!="":
-                product_about=ProductAbout(title=about,product_id=product)
-                product_about.save()
-            else:
-                if about!="":
-                    product_about=ProductAbout.objects.get(id=about_id)
-                    product_about.title=about
-                    product_about.product_id=product
-                    product_about.save()
-            k=k+1
-        
-        ProductTags.objects.filter(product_id=product_id).delete()
-
-        product_tags_list=product_tags.split(",")
-
-        for product_tag in product_tags_list:
-            product_tag_obj=ProductTags(product_id=product,title=product_tag)
-            product_tag_obj.save()
-        
+        values=dict(product_name=product_name,url_slug=url_slug,brand=brand,subcategories_id_id=subcat_obj.id,product_description=product_description,product_max_price=product_max_price,product_discount_price=product_discount_price,product_long_description=long_desc)
+        details=list(zip(details_ids,title_title_list,title_details_list))
+        about=list(zip(about_ids,about_title_list))
+        apply_product_edit(product,values,details,about,parse_tags(product_tags))
         return HttpResponse("OK")
 
 class ProductAddMedia(View):
@@ -428,19 +469,30 @@ class ProductAddStocks(View):
     def post(self,request,*args,**kwargs):
         product_id=kwargs["product_id"]
         new_instock=request.POST.get("add_stocks")
-        product=Products.objects.get(id=product_id)
-        old_stocks=product.in_stock_total
-        new_stocks=int(new_instock)+int(old_stocks)
-        product.in_stock_total=new_stocks
-        product.save()
-
-        product_obj=Products.objects.get(id=product_id)
-        product_transaction=ProductTransaction(product_id=product_obj,transaction_product_count=new_instock,transaction_description="New Product Added",transaction_type=1)
-        product_transaction.save()
+        try:
+            add_stock(product_id,new_instock)
+        except ValueError as e:
+            messages.error(request,str(e))
         return HttpResponseRedirect(reverse("product_add_stocks",kwargs={"product_id":product_id}))
 
 
-class StaffUserListView(ListView):
+class ReorderReportView(View):
+    limit=100
+
+    def get(self,request,*args,**kwargs):
+        try:
+            plan=reorder_plan()
+        except ImproperlyConfigured as e:
+            messages.error(request,str(e))
+            return render(request,"admin_templates/reorder_report.html",{"suggestions":[],"product_count":0,"unavailable":True})
+        suggestions=plan.suggestions(self.limit)
+        names=dict(Products.objects.filter(id__in=[row["product_id"] for row in suggestions]).values_list("id","product_name"))
+        for row in suggestions:
+            row["product_name"]=names.get(row["product_id"],"")
+        return render(request,"admin_templates/reorder_report.html",{"suggestions":suggestions,"product_count":len(plan)})
+
+
+class StaffUserListView(KeysetPaginationMixin,CachedCountMixin,ListView):
     model=StaffUser
     template_name="admin_templates/staff_list.html"
     paginate_by=3
@@ -449,7 +501,7 @@ class StaffUserListView(ListView):
         filter_val=self.request.GET.get("filter","")
         order_by=self.request.GET.get("orderby","id")
         if filter_val!="":
-            cat=StaffUser.objects.filter(Q(auth_user_id__first_name__contains=filter_val) |Q(auth_user_id__last_name__contains=filter_val) | Q(auth_user_id__email__contains=filter_val) | Q(auth_user_id__username__contains=filter_val)).order_by(order_by)
+            cat=search_profiles(StaffUser.objects.all(),filter_val).order_by(order_by)
         else:
             cat=StaffUser.objects.all().order_by(order_by)
 
@@ -519,7 +571,7 @@ class StaffUserUpdateView(SuccessMessageMixin,UpdateView):
         return HttpResponseRedirect(reverse("staff_list"))
 
 
-class CustomerUserListView(ListView):
+class CustomerUserListView(KeysetPaginationMixin,CachedCountMixin,ListView):
     model=CustomerUser
     template_name="admin_templates/customer_list.html"
     paginate_by=3
@@ -528,7 +580,7 @@ class CustomerUserListView(ListView):
         filter_val=self.request.GET.get("filter","")
         order_by=self.request.GET.get("orderby","id")
         if filter_val!="":
-            cat=CustomerUser.objects.filter(Q(auth_user_id__first_name__contains=filter_val) |Q(auth_user_id__last_name__contains=filter_val) | Q(auth_user_id__email__contains=filter_val) | Q(auth_user_id__username__contains=filter_val)).order_by(order_by)
+            cat=search_profiles(CustomerUser.objects.all(),filter_val).order_by(order_by)
         else:
             cat=CustomerUser.objects.all().order_by(order_by)
 
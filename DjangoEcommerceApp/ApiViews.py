@@ -0,0 +1,42 @@
+from django.http import HttpResponse,Http404,JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.generic import View
+
+from DjangoEcommerceApp.documents import get_product_document
+from DjangoEcommerceApp.product_batch import BatchError,parse_ids,parse_fields,load_products
+from DjangoEcommerceApp.tag_index import tag_cloud,tagged_product_page
+
+
+class ProductDocumentView(View):
+    def get(self,request,*args,**kwargs):
+        document=get_product_document(kwargs["product_id"])
+        if document is None or not document.is_public:
+            raise Http404("No such product")
+        etag='"%s"' % document.etag
+        response=get_conditional_response(request,etag=etag)
+        if response is None:
+            response=HttpResponse(document.document,content_type="application/json")
+        response["ETag"]=etag
+        return response
+
+
+class ProductBatchView(View):
+    def get(self,request,*args,**kwargs):
+        try:
+            ids=parse_ids(request.GET.get("ids",""))
+            fields=parse_fields(request.GET.get("fields",""))
+        except BatchError as e:
+            return JsonResponse({"error":str(e)},status=400)
+        products,missing=load_products(ids,fields)
+        return JsonResponse({"products":products,"missing":missing})
+
+
+class TagCloudView(View):
+    def get(self,request,*args,**kwargs):
+        return JsonResponse({"tags":[{"name":name,"product_count":count} for name,count in tag_cloud()]})
+
+
+class TagProductsView(View):
+    def get(self,request,*args,**kwargs):
+        page=tagged_product_page(kwargs["name"],request.GET.get("cursor"))
+        return JsonResponse({"products":[product.id for product in page.object_list],"next_cursor":page.next_cursor})
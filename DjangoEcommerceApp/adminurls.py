@@ -50,6 +50,11 @@ urlpatterns = [
     #Products
     path('product_create',AdminViews.ProductView.as_view(),name="product_view"),
     path('product_list',AdminViews.ProductListView.as_view(),name="product_list"),
+    path('product_bulk_action',AdminViews.ProductBulkActionView.as_view(),name="product_bulk_action"),
+    path('product_facets',AdminViews.ProductFacetsView.as_view(),name="product_facets"),
+    path('product_reviews/<str:product_id>',AdminViews.ProductReviewsView.as_view(),name="product_reviews"),
+    path('product_stock_series/<int:product_id>',AdminViews.ProductStockSeriesView.as_view(),name="product_stock_series"),
+    path('reorder_report',AdminViews.ReorderReportView.as_view(),name="reorder_report"),
     path('product_edit/<str:product_id>',AdminViews.ProductEdit.as_view(),name="product_edit"),
     path('product_add_media/<str:product_id>',AdminViews.ProductAddMedia.as_view(),name="product_add_media"),
     path('product_edit_media/<str:product_id>',AdminViews.ProductEditMedia.as_view(),name="product_edit_media"),
@@ -57,6 +62,9 @@ urlpatterns = [
     path('product_add_stocks/<str:product_id>',AdminViews.ProductAddStocks.as_view(),name="product_add_stocks"),
     path('file_upload',AdminViews.file_upload,name="file_upload"),
 
+    #Exports
+    path('export/<str:name>',AdminViews.export_data,name="export_data"),
+
     #Staff User
     path('staff_create',AdminViews.StaffUserCreateView.as_view(),name="staff_create"),
     path('staff_list',AdminViews.StaffUserListView.as_view(),name="staff_list"),
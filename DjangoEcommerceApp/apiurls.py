@@ -0,0 +1,11 @@
+from django.urls import path
+from DjangoEcommerceApp import ApiViews
+
+urlpatterns = [
+    #Products
+    path('products',ApiViews.ProductBatchView.as_view(),name="api_products"),
+    path('products/<int:product_id>',ApiViews.ProductDocumentView.as_view(),name="api_product"),
+    #Tags
+    path('tags',ApiViews.TagCloudView.as_view(),name="api_tags"),
+    path('tags/<str:name>',ApiViews.TagProductsView.as_view(),name="api_tag_products"),
+]
@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+
+from DjangoEcommerceApp.models import SubCategories,Products,ProductMedia,ProductTransaction,ProductDetails,ProductAbout,ProductTags,ProductQuestions,ProductReviews,ProductReviewVoting,ProductVarientItems,ProductRatingSummary,ProductDocument,StockReservation,StockSnapshot,CustomerOrders
+from DjangoEcommerceApp.product_import import refresh_product_indexes
+from DjangoEcommerceApp.facets import remove_product_facets
+from DjangoEcommerceApp.search import remove_products
+from DjangoEcommerceApp.tag_index import remove_product_tags
+
+BULK_STOCK_DESCRIPTION="Bulk Stock Adjustment"
+
+
+class BulkActionError(ValueError):
+    pass
+
+
+def raw_delete(queryset):
+    #One DELETE ... WHERE statement, without loading rows or sending signals
+    return queryset._raw_delete(queryset.db)
+
+def set_active(product_ids,is_active):
+    updated=Products.objects.filter(id__in=product_ids).exclude(is_active=is_active).update(is_active=is_active)
+    refresh_product_indexes(product_ids)
+    return updated
+
+def activate(product_ids,params):
+    return "%d products activated" % set_active(product_ids,1)
+
+def deactivate(product_ids,params):
+    return "%d products deactivated" % set_active(product_ids,0)
+
+def recategorize(product_ids,params):
+    subcategory=SubCategories.objects.filter(id=params.get("sub_category") or 0).first()
+    if subcategory is None:
+        raise BulkActionError("Choose the sub category to move the products to")
+    updated=Products.objects.filter(id__in=product_ids).exclude(subcategories_id=subcategory).update(subcategories_id=subcategory)
+    refresh_product_indexes(product_ids)
+    return "%d products moved to %s" % (updated,subcategory.title)
+
+def adjust_stock(product_ids,params):
+    """
+    Add (or with a negative amount, remove) stock on every product that has
+    enough, with one UPDATE and one bulk INSERT of ledger rows.
+    """
+    try:
+        delta=int(params.get("stock_delta"))
+    except (TypeError,ValueError):
+        raise BulkActionError("Enter the stock to add or remove")
+    if delta==0:
+        raise BulkActionError("Enter the stock to add or remove")
+
+    eligible=Products.objects.filter(id__in=product_ids)
+    if delta<0:
+        eligible=eligible.filter(in_stock_total__gte=F("reserved_stock_total")-delta)
+    eligible_ids=list(eligible.select_for_update().values_list("id",flat=True))
+    Products.objects.filter(id__in=eligible_ids).update(in_stock_total=F("in_stock_total")+delta)
+    ProductTransaction.objects.bulk_create([ProductTransaction(product_id_id=product_id,transaction_product_count=abs(delta),transaction_type=1 if delta>0 else 2,transaction_description=BULK_STOCK_DESCRIPTION) for product_id in eligible_ids],batch_size=500)
+    refresh_product_indexes(eligible_ids)
+
+    message="Stock adjusted by %+d on %d products" % (delta,len(eligible_ids))
+    skipped=len(product_ids)-len(eligible_ids)
+    if skipped:
+        message+=", %d skipped for lack of stock" % skipped
+    return message
+
+def media_storage_name(media_content):
+    #Media rows store the URL returned by FileSystemStorage.url()
+    name=str(media_content)
+    if not name.startswith(settings.MEDIA_URL):
+        return None
+    return name[len(settings.MEDIA_URL):]
+
+def delete_media_files(names):
+    """
+    Remove uploaded files that no media row points at any more. Runs after
+    the deleting transaction commits, so a rollback never loses files.
+    """
+    still_used=set(ProductMedia.objects.filter(media_content__in=names).values_list("media_content",flat=True))
+    for name in names:
+        storage_name=media_storage_name(name)
+        if name in still_used or storage_name is None:
+            continue
+        try:
+            default_storage.delete(storage_name)
+        except OSError:
+            pass
+
+def delete(product_ids,params):
+    """
+    Delete products and everything hanging off them with one DELETE per
+    table. Products with customer orders are kept, since orders do not
+    cascade.
+    """
+    ordered=set(CustomerOrders.objects.filter(product_id__in=product_ids).values_list("product_id",flat=True))
+    product_ids=[product_id for product_id in product_ids if product_id not in ordered]
+    media_names=list(ProductMedia.objects.filter(product_id__in=product_ids).values_list("media_content",flat=True).distinct())
+
+    remove_product_facets(product_ids)
+    remove_product_tags(product_ids)
+    raw_delete(ProductReviewVoting.objects.filter(product_review_id__product_id__in=product_ids))
+    for model in (ProductReviews,ProductQuestions,ProductMedia,ProductTransaction,ProductDetails,ProductAbout,ProductTags,ProductVarientItems,ProductRatingSummary,ProductDocument,StockReservation,StockSnapshot):
+        raw_delete(model.objects.filter(product_id__in=product_ids))
+    deleted=raw_delete(Products.objects.filter(id__in=product_ids))
+    remove_products(product_ids)
+
+    if media_names:
+        transaction.on_commit(lambda: delete_media_files(media_names))
+    message="%d products deleted" % deleted
+    if ordered:
+        message+=", %d kept because they have orders" % len(ordered)
+    return message
+
+BULK_ACTIONS={
+    "activate":activate,
+    "deactivate":deactivate,
+    "delete":delete,
+    "recategorize":recategorize,
+    "adjust_stock":adjust_stock,
+}
+
+def parse_product_ids(values):
+    product_ids=[]
+    for value in values:
+        if not str(value).isdigit():
+            raise BulkActionError("Invalid product id %r" % value)
+        product_ids.append(int(value))
+    if not product_ids:
+        raise BulkActionError("Select at least one product")
+    return sorted(set(product_ids))
+
+@transaction.atomic
+def run_bulk_action(action,product_ids,params):
+    """
+    Apply one of BULK_ACTIONS to the products in a single transaction and
+    return a message describing what changed.
+    """
+    if not action:
+        raise BulkActionError("Choose an action")
+    if action not in BULK_ACTIONS:
+        raise BulkActionError("Unknown action %r" % action)
+    return BULK_ACTIONS[action](parse_product_ids(product_ids),params)
@@ -0,0 +1,34 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from DjangoEcommerceApp.models import Categories,SubCategories
+
+CATEGORY_TREE_CACHE_KEY="category_tree"
+
+#Signals invalidate the tree on every write; the timeout only bounds staleness
+#for other processes when the cache backend is not shared (LocMemCache).
+CATEGORY_TREE_CACHE_TIMEOUT=300
+
+
+def load_category_tree():
+    categories=list(Categories.objects.filter(is_active=1).order_by("id"))
+    sub_categories={}
+    for sub_category in SubCategories.objects.filter(is_active=1,category_id__is_active=1).order_by("id"):
+        sub_categories.setdefault(sub_category.category_id_id,[]).append(sub_category)
+    return [{"category":category,"sub_category":sub_categories.get(category.id,[])} for category in categories]
+
+def get_category_tree():
+    """
+    Active categories with their active sub categories, as
+    [{"category":Categories,"sub_category":[SubCategories,...]},...].
+    """
+    tree=cache.get(CATEGORY_TREE_CACHE_KEY)
+    if tree is None:
+        tree=load_category_tree()
+        cache.set(CATEGORY_TREE_CACHE_KEY,tree,CATEGORY_TREE_CACHE_TIMEOUT)
+    return tree
+
+def invalidate_category_tree():
+    cache.delete(CATEGORY_TREE_CACHE_KEY)
+    #Drop it again once the write commits, in case a reader cached the old tree meanwhile
+    transaction.on_commit(lambda: cache.delete(CATEGORY_TREE_CACHE_KEY))
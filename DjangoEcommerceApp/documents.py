@@ -0,0 +1,68 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+
+from DjangoEcommerceApp.models import Products,ProductDocument
+from DjangoEcommerceApp.product_page import product_page_queryset,catalog_data
+
+
+def serialize_document(data):
+    document=json.dumps(data,cls=DjangoJSONEncoder,separators=(",",":"),sort_keys=True)
+    return document,hashlib.sha256(document.encode()).hexdigest()
+
+def invalidate_product_documents(**filters):
+    #Only bumps existing rows; documents are created when first read
+    ProductDocument.objects.filter(**filters).update(version=F("version")+1)
+
+def build_product_documents(product_ids):
+    """
+    (Re)serialize the documents of the given products with a fixed number
+    of queries. Versions are read before the product data, so a write that
+    lands while building leaves the document stale instead of losing it.
+    """
+    product_ids=set(product_ids)
+    documents={document.product_id_id:document for document in ProductDocument.objects.filter(product_id__in=product_ids).only("id","product_id","version")}
+    missing=product_ids-documents.keys()
+    if missing:
+        ProductDocument.objects.bulk_create([ProductDocument(product_id_id=product_id) for product_id in Products.objects.filter(id__in=missing).values_list("id",flat=True)],ignore_conflicts=True)
+        documents.update({document.product_id_id:document for document in ProductDocument.objects.filter(product_id__in=missing).only("id","product_id","version")})
+
+    built_at=timezone.now()
+    built=[]
+    for product in product_page_queryset().filter(id__in=documents.keys()):
+        document=documents[product.id]
+        document.document,document.etag=serialize_document(catalog_data(product))
+        document.is_public=product.is_active==1
+        document.built_version=document.version
+        document.built_at=built_at
+        built.append(document)
+    ProductDocument.objects.bulk_update(built,["document","etag","is_public","built_version","built_at"])
+    return built
+
+def get_product_document(product_id):
+    """
+    The current ProductDocument of a product, rebuilt first if it is
+    missing or stale, or None if there is no such product.
+    """
+    document=ProductDocument.objects.filter(product_id=product_id).first()
+    if document is not None and document.is_fresh():
+        return document
+    built=build_product_documents([product_id])
+    return built[0] if built else None
+
+def rebuild_product_documents(batch_size=500,progress=None):
+    product_ids=Products.objects.order_by("id").values_list("id",flat=True)
+    last_id=0
+    built=0
+    while True:
+        batch=list(product_ids.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        built+=len(build_product_documents(batch))
+        last_id=batch[-1]
+        if progress is not None:
+            progress(built)
+    return built
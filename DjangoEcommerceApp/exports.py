@@ -0,0 +1,169 @@
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from DjangoEcommerceApp.models import Products,ProductTransaction,CustomerOrders
+from DjangoEcommerceApp.prices import parse_price
+
+#Rows fetched per database round trip; memory stays at one chunk whatever the row count
+EXPORT_CHUNK_SIZE=2000
+
+FORMATS={"csv":"text/csv","jsonl":"application/x-ndjson"}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError,ValueError):
+        raise ExportError("Expected a number, got %r" % value)
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError,ValueError):
+        raise ExportError("Expected a YYYY-MM-DD date, got %r" % value)
+
+def parse_amount(value):
+    price=parse_price(value)
+    if price is None:
+        raise ExportError("Expected an amount, got %r" % value)
+    return price
+
+def parse_text(value):
+    return value
+
+CREATED_FILTERS={
+    "created_from":("created_at__date__gte",parse_date),
+    "created_to":("created_at__date__lte",parse_date),
+}
+
+#Export name: model, {column: field lookup}, default columns, {filter: (lookup, parser)}
+EXPORTS={
+    "products":{
+        "model":Products,
+        "columns":{
+            "id":"id",
+            "product_name":"product_name",
+            "url_slug":"url_slug",
+            "brand":"brand",
+            "subcategory":"subcategories_id__title",
+            "merchant":"added_by_merchant__company_name",
+            "product_max_price":"product_max_price",
+            "product_discount_price":"product_discount_price",
+            "product_description":"product_description",
+            "in_stock_total":"in_stock_total",
+            "is_active":"is_active",
+            "created_at":"created_at",
+        },
+        "default_columns":["id","product_name","brand","subcategory","merchant","product_max_price","product_discount_price","in_stock_total","is_active","created_at"],
+        "filters":dict(CREATED_FILTERS,
+            subcategory=("subcategories_id",parse_int),
+            merchant=("added_by_merchant",parse_int),
+            is_active=("is_active",parse_int),
+            price_min=("product_discount_price__gte",parse_amount),
+            price_max=("product_discount_price__lte",parse_amount),
+        ),
+    },
+    "transactions":{
+        "model":ProductTransaction,
+        "columns":{
+            "id":"id",
+            "product_id":"product_id_id",
+            "product_name":"product_id__product_name",
+            "transaction_type":"transaction_type",
+            "transaction_product_count":"transaction_product_count",
+            "transaction_description":"transaction_description",
+            "created_at":"created_at",
+        },
+        "default_columns":["id","product_id","product_name","transaction_type","transaction_product_count","transaction_description","created_at"],
+        "filters":dict(CREATED_FILTERS,
+            product_id=("product_id",parse_int),
+            transaction_type=("transaction_type",parse_text),
+        ),
+    },
+    "orders":{
+        "model":CustomerOrders,
+        "columns":{
+            "id":"id",
+            "product_id":"product_id_id",
+            "product_name":"product_id__product_name",
+            "purchase_price":"purchase_price",
+            "coupon_code":"coupon_code",
+            "discount_amt":"discount_amt",
+            "quantity":"quantity",
+            "product_status":"product_status",
+            "created_at":"created_at",
+        },
+        "default_columns":["id","product_id","product_name","purchase_price","coupon_code","discount_amt","product_status","created_at"],
+        "filters":dict(CREATED_FILTERS,
+            product_id=("product_id",parse_int),
+            product_status=("product_status",parse_text),
+        ),
+    },
+}
+
+
+class Echo:
+    #File-like object that hands back what csv.writer writes instead of storing it
+    def write(self,value):
+        return value
+
+
+def get_export(name):
+    if name not in EXPORTS:
+        raise ExportError("Unknown export %r, expected one of %s" % (name,", ".join(EXPORTS)))
+    return EXPORTS[name]
+
+def parse_columns(export,value):
+    if not value:
+        return list(export["default_columns"])
+    columns=[column.strip() for column in value.split(",") if column.strip()]
+    unknown=[column for column in columns if column not in export["columns"]]
+    if unknown:
+        raise ExportError("Unknown columns: %s" % ", ".join(unknown))
+    return columns
+
+def parse_filters(export,params):
+    """
+    Queryset filter kwargs from the export's filter parameters in `params`
+    (a dict or QueryDict); other keys are ignored.
+    """
+    filters={}
+    for name,(lookup,parser) in export["filters"].items():
+        value=params.get(name)
+        if value not in (None,""):
+            filters[lookup]=parser(value)
+    return filters
+
+def export_rows(export,columns,filters):
+    queryset=export["model"].objects.filter(**filters).order_by("id")
+    return queryset.values_list(*[export["columns"][column] for column in columns]).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+def csv_lines(columns,rows):
+    writer=csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+def jsonl_lines(columns,rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns,row)),cls=DjangoJSONEncoder)+"\n"
+
+def export_lines(name,format="csv",columns=None,params=None):
+    """
+    Lines of the `name` export in `format`, generated lazily from a chunked
+    database iterator. Raises ExportError for bad arguments before any row
+    is read.
+    """
+    export=get_export(name)
+    if format not in FORMATS:
+        raise ExportError("Unknown format %r, expected csv or jsonl" % format)
+    columns=parse_columns(export,columns)
+    rows=export_rows(export,columns,parse_filters(export,params or {}))
+    return csv_lines(columns,rows) if format=="csv" else jsonl_lines(columns,rows)
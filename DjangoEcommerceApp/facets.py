@@ -0,0 +1,150 @@
+from django.db import transaction
+from django.db.models import Count,F
+
+from DjangoEcommerceApp.models import Products,ProductDetails,ProductFacetValue,ProductFacetCount
+from DjangoEcommerceApp.prices import parse_price
+
+#Upper bounds of the price bands, on product_discount_price
+PRICE_BANDS=[500,1000,2000,5000,10000]
+
+SPEC_FACET_PREFIX="spec:"
+
+
+def price_band(price):
+    price=parse_price(price)
+    if price is None:
+        return None
+    lower=0
+    for upper in PRICE_BANDS:
+        if price<upper:
+            return "%d-%d" % (lower,upper)
+        lower=upper
+    return "%d+" % lower
+
+def product_facets(product,details):
+    """
+    The (facet, value) pairs a product is counted under. Inactive products
+    are not part of the catalog and have none.
+    """
+    if product.is_active!=1:
+        return set()
+    facets={("subcategory",str(product.subcategories_id_id)),("stock","in_stock" if product.in_stock_total>0 else "out_of_stock")}
+    if product.brand:
+        facets.add(("brand",product.brand.strip()[:255]))
+    band=price_band(product.product_discount_price)
+    if band is not None:
+        facets.add(("price",band))
+    for detail in details:
+        if detail.is_active==1 and detail.title.strip() and detail.title_details.strip():
+            facets.add(((SPEC_FACET_PREFIX+detail.title.strip())[:255],detail.title_details.strip()[:255]))
+    return facets
+
+def apply_count_deltas(deltas):
+    deltas={key:delta for key,delta in deltas.items() if delta}
+    if not deltas:
+        return
+    ProductFacetCount.objects.bulk_create([ProductFacetCount(facet=facet,value=value) for facet,value in deltas],ignore_conflicts=True)
+    for (facet,value),delta in deltas.items():
+        ProductFacetCount.objects.filter(facet=facet,value=value).update(product_count=F("product_count")+delta)
+
+@transaction.atomic
+def sync_product_facets(product_ids):
+    """
+    Diff the stored facet values of the given products against their
+    current state and adjust the facet counts by the difference.
+    """
+    product_ids=set(product_ids)
+    products={product.id:product for product in Products.objects.filter(id__in=product_ids)}
+    details={}
+    for detail in ProductDetails.objects.filter(product_id__in=products.keys()):
+        details.setdefault(detail.product_id_id,[]).append(detail)
+    stored={}
+    for membership in ProductFacetValue.objects.filter(product_id__in=product_ids):
+        stored.setdefault(membership.product_id_id,{})[(membership.facet,membership.value)]=membership.id
+
+    deltas={}
+    removed_ids=[]
+    added=[]
+    for product_id in product_ids:
+        current=product_facets(products[product_id],details.get(product_id,[])) if product_id in products else set()
+        previous=stored.get(product_id,{})
+        for key in previous.keys()-current:
+            removed_ids.append(previous[key])
+            deltas[key]=deltas.get(key,0)-1
+        for key in current-previous.keys():
+            added.append(ProductFacetValue(product_id_id=product_id,facet=key[0],value=key[1]))
+            deltas[key]=deltas.get(key,0)+1
+
+    if removed_ids:
+        ProductFacetValue.objects.filter(id__in=removed_ids).delete()
+    if added:
+        ProductFacetValue.objects.bulk_create(added)
+    apply_count_deltas(deltas)
+
+@transaction.atomic
+def remove_product_facets(product_ids):
+    memberships=ProductFacetValue.objects.filter(product_id__in=product_ids)
+    deltas={}
+    for facet,value,count in memberships.values_list("facet","value").annotate(count=Count("id")):
+        deltas[(facet,value)]=-count
+    memberships.delete()
+    apply_count_deltas(deltas)
+
+def rebuild_product_facets(batch_size=2000,progress=None):
+    with transaction.atomic():
+        ProductFacetValue.objects.all().delete()
+        ProductFacetCount.objects.all().delete()
+    product_ids=Products.objects.order_by("id").values_list("id",flat=True)
+    last_id=0
+    synced=0
+    while True:
+        batch=list(product_ids.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        sync_product_facets(batch)
+        synced+=len(batch)
+        last_id=batch[-1]
+        if progress is not None:
+            progress(synced)
+    ProductFacetCount.objects.filter(product_count__lte=0).delete()
+    return synced
+
+def parse_facet_filters(params):
+    """
+    {facet: [values]} from query parameters such as
+    ?brand=Acme&brand=Globex&price=500-1000&spec:Color=Red
+    """
+    filters={}
+    for facet in params.keys():
+        if facet in ("brand","subcategory","price","stock") or facet.startswith(SPEC_FACET_PREFIX):
+            values=[value for value in params.getlist(facet) if value!=""]
+            if values:
+                filters[facet]=values
+    return filters
+
+def filter_products(queryset,filters):
+    """
+    Products matching every facet in `filters` (any of the values given for
+    the same facet), resolved through the (facet, value, product) index.
+    """
+    for facet,values in filters.items():
+        queryset=queryset.filter(id__in=ProductFacetValue.objects.filter(facet=facet,value__in=values).values("product_id"))
+    return queryset
+
+def facet_counts(filters=None):
+    """
+    {facet: [(value, product_count), ...]} for the whole catalog, read from
+    the maintained counts, or for the products matching `filters` with a
+    single grouped query over just their facet values.
+    """
+    if filters:
+        matching=filter_products(Products.objects.filter(is_active=1),filters).values("id")
+        rows=ProductFacetValue.objects.filter(product_id__in=matching).values_list("facet","value").annotate(product_count=Count("id"))
+    else:
+        rows=ProductFacetCount.objects.filter(product_count__gt=0).values_list("facet","value","product_count")
+    counts={}
+    for facet,value,product_count in rows.order_by():
+        counts.setdefault(facet,[]).append((value,product_count))
+    for values in counts.values():
+        values.sort(key=lambda item:(-item[1],item[0]))
+    return counts
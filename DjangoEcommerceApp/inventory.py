@@ -0,0 +1,120 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import F,OuterRef,Subquery,Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from DjangoEcommerceApp.models import Products,ProductTransaction,StockReservation
+from DjangoEcommerceApp.facets import sync_product_facets
+from DjangoEcommerceApp.documents import invalidate_product_documents
+
+STOCK_ADDED_DESCRIPTION="New Product Added"
+STOCK_REMOVED_DESCRIPTION="Stock Removed"
+RESERVATION_SOLD_DESCRIPTION="Reserved Stock Sold"
+
+RESERVATION_TTL=datetime.timedelta(minutes=15)
+
+#Expired reservations released per pair of statements
+EXPIRE_BATCH_SIZE=500
+
+
+class InsufficientStockError(ValueError):
+    pass
+
+
+def parse_quantity(quantity):
+    try:
+        quantity=int(quantity)
+    except (TypeError,ValueError):
+        raise ValueError("Invalid quantity %r" % quantity)
+    if quantity<=0:
+        raise ValueError("Quantity must be positive, got %d" % quantity)
+    return quantity
+
+def available_stock(product):
+    return product.in_stock_total-product.reserved_stock_total
+
+def record_stock_change(product_id,quantity,transaction_type,description):
+    """
+    Write the ledger row for a stock change made with update(), which sends
+    no post_save, and refresh the stock facet and API document it affects.
+    Called after the guarded UPDATE so that on SQLite the transaction
+    already holds the write lock.
+    """
+    ProductTransaction.objects.create(product_id_id=product_id,transaction_product_count=quantity,transaction_type=transaction_type,transaction_description=description)
+    sync_product_facets([product_id])
+    invalidate_product_documents(product_id=product_id)
+
+@transaction.atomic
+def add_stock(product_id,quantity,description=STOCK_ADDED_DESCRIPTION):
+    """
+    Add stock with one UPDATE ... SET in_stock_total = in_stock_total + n,
+    so concurrent additions never overwrite each other, and write the BUY
+    row in the same transaction.
+    """
+    quantity=parse_quantity(quantity)
+    if not Products.objects.filter(id=product_id).update(in_stock_total=F("in_stock_total")+quantity):
+        raise Products.DoesNotExist("No product %r" % product_id)
+    record_stock_change(product_id,quantity,1,description)
+
+@transaction.atomic
+def remove_stock(product_id,quantity,description=STOCK_REMOVED_DESCRIPTION):
+    """
+    Take unreserved stock away with a guarded UPDATE that only matches while
+    enough is available, and write the SELL row in the same transaction.
+    Raises InsufficientStockError instead of going negative.
+    """
+    quantity=parse_quantity(quantity)
+    guarded=Products.objects.filter(id=product_id,in_stock_total__gte=F("reserved_stock_total")+quantity)
+    if not guarded.update(in_stock_total=F("in_stock_total")-quantity):
+        raise InsufficientStockError("Not enough stock of product %r for %d" % (product_id,quantity))
+    record_stock_change(product_id,quantity,2,description)
+
+@transaction.atomic
+def reserve_stock(product_id,quantity,ttl=RESERVATION_TTL):
+    """
+    Hold stock for a checkout until it is sold, released or expires. The
+    hold is a guarded increment of reserved_stock_total, so it cannot
+    oversell; in_stock_total and the ledger only change when it is sold.
+    """
+    quantity=parse_quantity(quantity)
+    guarded=Products.objects.filter(id=product_id,in_stock_total__gte=F("reserved_stock_total")+quantity)
+    if not guarded.update(reserved_stock_total=F("reserved_stock_total")+quantity):
+        raise InsufficientStockError("Not enough stock of product %r for %d" % (product_id,quantity))
+    return StockReservation.objects.create(product_id_id=product_id,quantity=quantity,expires_at=timezone.now()+ttl)
+
+def take_reservation(reservation):
+    #Deleting the row is the claim: of two concurrent callers only one deletes it
+    deleted=StockReservation.objects.filter(id=reservation.id,expires_at__gt=timezone.now()).delete()[0]
+    if not deleted:
+        raise InsufficientStockError("Reservation %d has expired or was already used" % reservation.id)
+
+@transaction.atomic
+def sell_reservation(reservation,description=RESERVATION_SOLD_DESCRIPTION):
+    take_reservation(reservation)
+    Products.objects.filter(id=reservation.product_id_id).update(in_stock_total=F("in_stock_total")-reservation.quantity,reserved_stock_total=F("reserved_stock_total")-reservation.quantity)
+    record_stock_change(reservation.product_id_id,reservation.quantity,2,description)
+
+@transaction.atomic
+def release_reservation(reservation):
+    take_reservation(reservation)
+    Products.objects.filter(id=reservation.product_id_id).update(reserved_stock_total=F("reserved_stock_total")-reservation.quantity)
+
+def expire_reservations(now=None,batch_size=EXPIRE_BATCH_SIZE):
+    """
+    Release every reservation that expired before `now`, a batch at a time
+    with one UPDATE of the affected products and one DELETE. Returns the
+    number released.
+    """
+    now=now or timezone.now()
+    released=0
+    while True:
+        with transaction.atomic():
+            ids=list(StockReservation.objects.filter(expires_at__lte=now).order_by("expires_at").values_list("id",flat=True)[:batch_size])
+            if not ids:
+                return released
+            expired=StockReservation.objects.filter(id__in=ids)
+            held=expired.filter(product_id=OuterRef("pk")).order_by().values("product_id").annotate(total=Sum("quantity")).values("total")
+            Products.objects.filter(id__in=expired.values("product_id")).update(reserved_stock_total=F("reserved_stock_total")-Coalesce(Subquery(held),0))
+            released+=expired.delete()[0]
@@ -0,0 +1,39 @@
+import datetime
+
+from django.core.management.base import BaseCommand,CommandError
+from django.utils import timezone
+
+from DjangoEcommerceApp.models import Products
+from DjangoEcommerceApp.stock_ledger import SNAPSHOT_BATCH_SIZE,compact_stock_ledger,stock_drift
+
+
+class Command(BaseCommand):
+    help="Snapshot every product's stock ledger so point-in-time stock queries only sum the rows after the snapshot."
+
+    def add_arguments(self,parser):
+        parser.add_argument("--until",help="Only cover ledger rows created before this YYYY-MM-DD date (defaults to now).")
+        parser.add_argument("--batch-size",type=int,default=SNAPSHOT_BATCH_SIZE)
+        parser.add_argument("--check",action="store_true",help="Afterwards report products whose in_stock_total disagrees with the ledger.")
+
+    def handle(self,*args,**options):
+        until=None
+        if options["until"]:
+            try:
+                until=timezone.make_aware(datetime.datetime.combine(datetime.date.fromisoformat(options["until"]),datetime.time.min))
+            except ValueError:
+                raise CommandError("--until must be a YYYY-MM-DD date")
+
+        def progress(last_id,added):
+            self.stdout.write("Up to product %d: %d snapshots" % (last_id,added))
+
+        added=compact_stock_ledger(until=until,batch_size=options["batch_size"],progress=progress)
+        self.stdout.write(self.style.SUCCESS("%d stock snapshots added" % added))
+
+        if options["check"]:
+            product_ids=list(Products.objects.order_by("id").values_list("id",flat=True))
+            drifted=0
+            for start in range(0,len(product_ids),options["batch_size"]):
+                for product_id,(in_stock_total,ledger_stock) in sorted(stock_drift(product_ids[start:start+options["batch_size"]]).items()):
+                    drifted+=1
+                    self.stdout.write("Product %d: in_stock_total %d, ledger %d" % (product_id,in_stock_total,ledger_stock))
+            self.stdout.write(self.style.SUCCESS("%d products disagree with their ledger" % drifted))
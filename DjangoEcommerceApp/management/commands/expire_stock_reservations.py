@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from DjangoEcommerceApp.inventory import expire_reservations
+
+
+class Command(BaseCommand):
+    help="Release the stock held by expired reservations. Meant to run every few minutes from cron."
+
+    def handle(self,*args,**options):
+        released=expire_reservations()
+        self.stdout.write(self.style.SUCCESS("%d expired reservations released" % released))
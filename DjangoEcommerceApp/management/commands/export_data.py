@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand,CommandError
+
+from DjangoEcommerceApp.exports import EXPORTS,FORMATS,ExportError,export_lines
+
+
+class Command(BaseCommand):
+    help="Stream products, transactions or orders to CSV or JSON Lines."
+
+    def add_arguments(self,parser):
+        parser.add_argument("name",choices=list(EXPORTS))
+        parser.add_argument("--format",choices=list(FORMATS),default="csv")
+        parser.add_argument("--columns",help="Comma separated columns (defaults to the export's standard set).")
+        parser.add_argument("--filter",action="append",default=[],help="Filter as name=value, e.g. created_from=2021-01-01.")
+        parser.add_argument("--output",help="File to write (defaults to standard output).")
+
+    def handle(self,*args,**options):
+        params={}
+        for value in options["filter"]:
+            key,sep,val=value.partition("=")
+            if not sep:
+                raise CommandError("--filter must look like name=value")
+            params[key]=val
+        unknown=set(params)-set(EXPORTS[options["name"]]["filters"])
+        if unknown:
+            raise CommandError("Unknown filters: %s" % ", ".join(sorted(unknown)))
+
+        try:
+            lines=export_lines(options["name"],options["format"],options["columns"],params)
+        except ExportError as e:
+            raise CommandError(str(e))
+        if options["output"]:
+            with open(options["output"],"w",newline="",encoding="utf-8") as output:
+                for line in lines:
+                    output.write(line)
+        else:
+            for line in lines:
+                self.stdout.write(line,ending="")
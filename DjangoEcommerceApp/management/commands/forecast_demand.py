@@ -0,0 +1,45 @@
+import csv
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand,CommandError
+
+from DjangoEcommerceApp import forecasting
+
+COLUMNS=["product_id","available","moving_average","daily_demand","days_of_cover","reorder_point","reorder_quantity"]
+
+
+class Command(BaseCommand):
+    help="Forecast daily demand from the SELL ledger and suggest reorder quantities for the whole catalog."
+
+    def add_arguments(self,parser):
+        parser.add_argument("--history-days",type=int,default=forecasting.HISTORY_DAYS)
+        parser.add_argument("--alpha",type=float,default=forecasting.SMOOTHING_ALPHA,help="Exponential smoothing factor, 0 to 1.")
+        parser.add_argument("--lead-time",type=int,default=forecasting.LEAD_TIME_DAYS,help="Days a restock takes to arrive.")
+        parser.add_argument("--cover-days",type=int,default=forecasting.COVER_DAYS,help="Days of demand a restock should cover.")
+        parser.add_argument("--limit",type=int,help="Only list the first N suggestions.")
+        parser.add_argument("--output",help="Write the suggestions as CSV to this file instead of a table.")
+
+    def handle(self,*args,**options):
+        if not 0<options["alpha"]<=1:
+            raise CommandError("--alpha must be between 0 and 1")
+        if options["history_days"]<1:
+            raise CommandError("--history-days must be at least 1")
+        started=time.perf_counter()
+        try:
+            plan=forecasting.reorder_plan(history_days=options["history_days"],alpha=options["alpha"],window=min(forecasting.MOVING_AVERAGE_DAYS,options["history_days"]),lead_time=options["lead_time"],cover_days=options["cover_days"])
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        suggestions=plan.suggestions(options["limit"])
+        elapsed=time.perf_counter()-started
+
+        if options["output"]:
+            with open(options["output"],"w",newline="",encoding="utf-8") as output:
+                writer=csv.DictWriter(output,COLUMNS)
+                writer.writeheader()
+                writer.writerows(suggestions)
+        else:
+            self.stdout.write("%10s %10s %10s %10s %10s %10s" % ("product","available","demand/day","cover","reorder at","quantity"))
+            for row in suggestions:
+                self.stdout.write("%10d %10d %10.2f %10.1f %10.1f %10d" % (row["product_id"],row["available"],row["daily_demand"],row["days_of_cover"],row["reorder_point"],row["reorder_quantity"]))
+        self.stdout.write(self.style.SUCCESS("Forecast %d products in %.2fs, %d to reorder" % (len(plan),elapsed,len(suggestions))))
@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand,CommandError
+
+from DjangoEcommerceApp.product_import import ProductLookups,read_rows,import_products
+
+
+class Command(BaseCommand):
+    help=("Import products from a CSV file with a header row or a JSON Lines file. Columns: product_name, "
+          "subcategory (id or title), merchant (id or username), product_max_price, product_discount_price, "
+          "brand, url_slug, product_description, product_long_description, in_stock_total, media, details, about, tags. "
+          "In CSV, list columns are separated by '|' and details are written title=value.")
+
+    def add_arguments(self,parser):
+        parser.add_argument("path",help="File to import, or - for standard input.")
+        parser.add_argument("--format",choices=["csv","jsonl"],help="Input format (defaults to the file extension).")
+        parser.add_argument("--batch-size",type=int,default=1000,help="Products written per transaction.")
+        parser.add_argument("--merchant",help="Merchant id or username for rows without a merchant column.")
+
+    def handle(self,*args,**options):
+        path=options["path"]
+        format=options["format"] or ("jsonl" if path.endswith((".jsonl",".json")) else "csv" if path.endswith(".csv") else None)
+        if format is None:
+            raise CommandError("Cannot tell the input format from %r, pass --format" % path)
+
+        lookups=ProductLookups()
+        started=time.monotonic()
+
+        def progress(imported,failed):
+            self.stdout.write("%d products imported, %d failed (%.1fs)" % (imported,failed,time.monotonic()-started))
+
+        def error(line_number,message):
+            self.stderr.write("Line %d: %s" % (line_number,message))
+
+        stream=sys.stdin if path=="-" else open(path,newline="",encoding="utf-8")
+        try:
+            imported,failed=import_products(read_rows(stream,format),lookups,batch_size=options["batch_size"],default_merchant=options["merchant"],progress=progress,error=error)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        style=self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style("Imported %d products, %d rows failed" % (imported,failed)))
@@ -0,0 +1,213 @@
+import logging
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand,CommandError
+from django.db import connection,models,transaction
+from django.test import Client
+from django.urls import reverse
+
+from DjangoEcommerceApp import adminurls
+from DjangoEcommerceApp.models import CustomUser,Products,ProductMedia
+
+#GET handlers with side effects that must not be replayed
+UNSAFE_ROUTES=["admin_logout_process","product_media_delete"]
+
+#Sample values for route arguments that are not the pk of the view's model
+SAMPLE_KWARG_MODELS={"product_id":Products,"id":ProductMedia}
+
+SCAN_RE=re.compile(r'^SCAN (\S+)(?: AS \S+)?$')
+TEMP_BTREE_RE=re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|RIGHT PART OF ORDER BY)')
+CLAUSE_RE=re.compile(r' (WHERE|GROUP BY|ORDER BY|LIMIT|HAVING) ')
+
+
+class Command(BaseCommand):
+    help=("Render every route in adminurls.py, run EXPLAIN QUERY PLAN on the SQL it issues and "
+          "report full table scans and temp B-trees with suggested indexes.")
+
+    def add_arguments(self,parser):
+        parser.add_argument("--username",help="User to log in as (defaults to the first superuser or admin user).")
+        parser.add_argument("--route",action="append",default=[],help="Only check these route names.")
+        parser.add_argument("--exclude",action="append",default=[],help="Skip these route names.")
+        parser.add_argument("--kwarg",action="append",default=[],help="Route argument as name=value or route:name=value.")
+        parser.add_argument("--query",default="",help="Query string added to every route, e.g. 'filter=abc&orderby=title'.")
+        parser.add_argument("--fail-on-warning",action="store_true",help="Exit with an error if anything was flagged.")
+
+    def handle(self,*args,**options):
+        if connection.vendor!="sqlite":
+            raise CommandError("EXPLAIN QUERY PLAN output is only understood for the SQLite backend.")
+
+        self.kwarg_overrides=self.parse_kwargs(options["kwarg"])
+        excluded=set(UNSAFE_ROUTES+options["exclude"])
+        user=self.get_user(options["username"])
+        suggestions={}
+        warnings=0
+
+        #Failing views are reported in the summary line instead of as logged tracebacks
+        request_logger=logging.getLogger("django.request")
+        request_level=request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+
+        try:
+            #Views are only read, but anything they write (sessions, lazy rows) is rolled back
+            with transaction.atomic():
+                client=Client(HTTP_HOST=self.get_host())
+                for pattern in adminurls.urlpatterns:
+                    if pattern.name is None or pattern.name in excluded:
+                        continue
+                    if options["route"] and pattern.name not in options["route"]:
+                        continue
+                    if user is not None:
+                        client.force_login(user)
+                    warnings+=self.check_route(client,pattern,options["query"],suggestions)
+                transaction.set_rollback(True)
+        finally:
+            request_logger.setLevel(request_level)
+
+        self.print_suggestions(suggestions)
+        if warnings and options["fail_on_warning"]:
+            raise CommandError("%d query plan warnings" % warnings)
+
+    def get_host(self):
+        hosts=[host.lstrip(".") for host in settings.ALLOWED_HOSTS if host!="*"]
+        return hosts[0] if hosts else "localhost"
+
+    def parse_kwargs(self,values):
+        overrides={}
+        for value in values:
+            key,sep,val=value.partition("=")
+            if not sep:
+                raise CommandError("--kwarg must look like name=value or route:name=value")
+            route,sep,name=key.rpartition(":")
+            overrides[(route or None,name)]=val
+        return overrides
+
+    def get_user(self,username):
+        if username:
+            return CustomUser.objects.get(username=username)
+        return CustomUser.objects.filter(is_superuser=True).first() or CustomUser.objects.filter(user_type=1).first()
+
+    def sample_kwargs(self,pattern):
+        kwargs={}
+        view_model=getattr(getattr(pattern.callback,"view_class",None),"model",None)
+        for name in pattern.pattern.converters:
+            value=self.kwarg_overrides.get((pattern.name,name),self.kwarg_overrides.get((None,name)))
+            if value is None:
+                model=SAMPLE_KWARG_MODELS.get(name,view_model)
+                value=model.objects.order_by("pk").values_list("pk",flat=True).first() if model else None
+            kwargs[name]=str(value if value is not None else 1)
+        return kwargs
+
+    def check_route(self,client,pattern,query,suggestions):
+        url=reverse(pattern.name,kwargs=self.sample_kwargs(pattern))
+        if query:
+            url+="?"+query
+        statements=[]
+
+        def record(execute,sql,params,many,context):
+            if not many:
+                statements.append((sql,params))
+            return execute(sql,params,many,context)
+
+        with connection.execute_wrapper(record):
+            try:
+                status=client.get(url).status_code
+            except Exception as e:
+                status="error: %s: %s" % (e.__class__.__name__,str(e).splitlines()[0] if str(e) else "")
+
+        selects=[]
+        for sql,params in statements:
+            if sql.lstrip().upper().startswith("SELECT") and (sql,params) not in selects:
+                selects.append((sql,params))
+        self.stdout.write("%s  [%s]  %d queries" % (url,status,len(statements)))
+
+        warnings=0
+        for sql,params in selects:
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN "+sql,params)
+                plan=[row[-1] for row in cursor.fetchall()]
+            flagged=self.flag_plan(plan,sql)
+            if not flagged:
+                continue
+            warnings+=len(flagged)
+            self.stdout.write(self.style.WARNING("    "+self.shorten(sql)))
+            for line in plan:
+                self.stdout.write("      | "+line)
+            for table,reason in flagged:
+                index=self.suggest_index(sql,table)
+                self.stdout.write(self.style.WARNING("      ! %s on %s" % (reason,table)))
+                if index is not None:
+                    suggestions.setdefault((index[0]._meta.model_name,tuple(index[1])),index)
+                    self.stdout.write("        suggest index on %s(%s)" % (table,", ".join(index[1])))
+        return warnings
+
+    def flag_plan(self,plan,sql):
+        clauses=self.split_clauses(sql)
+        flagged=[]
+        for line in plan:
+            match=SCAN_RE.match(line)
+            #An unfiltered scan that stops at LIMIT (a first page in index order) is fine
+            if match and ("WHERE" in clauses or "LIMIT" not in clauses):
+                flagged.append((match.group(1),"full table scan"))
+                continue
+            match=TEMP_BTREE_RE.search(line)
+            if match:
+                table=flagged[-1][0] if flagged else self.last_table(plan)
+                flagged.append((table,"temp B-tree for "+match.group(1)))
+        return flagged
+
+    def last_table(self,plan):
+        for line in plan:
+            match=re.match(r'^(?:SCAN|SEARCH) (\S+)',line)
+            if match:
+                return match.group(1)
+        return None
+
+    def split_clauses(self,sql):
+        clauses={}
+        parts=CLAUSE_RE.split(sql)
+        for keyword,body in zip(parts[1::2],parts[2::2]):
+            clauses.setdefault(keyword,body)
+        return clauses
+
+    def suggest_index(self,sql,table):
+        """
+        Equality columns first, then at most one range column, then the sort
+        columns, which is the order SQLite can use a composite index in.
+        """
+        model=next((m for m in apps.get_models() if m._meta.db_table==table),None)
+        if model is None:
+            return None
+        columns={field.column:field.name for field in model._meta.concrete_fields}
+        clauses=self.split_clauses(sql)
+        column_re=r'"%s"\."(\w+)" ' % re.escape(table)
+        where=clauses.get("WHERE","")
+        equal=re.findall(column_re+r'(?:= |IS |IN \()',where)
+        ranged=re.findall(column_re+r'(?:[<>]=? |BETWEEN )',where)
+        ordered=re.findall(column_re.rstrip(" ")+r'(?: ASC| DESC|,|$)',clauses.get("ORDER BY","")+clauses.get("GROUP BY",""))
+
+        fields=[]
+        for column in equal+ranged[:1]+([] if ranged else ordered):
+            name=columns.get(column)
+            if name and name not in fields and not model._meta.get_field(name).primary_key:
+                fields.append(name)
+        if not fields:
+            return None
+        return (model,fields)
+
+    def print_suggestions(self,suggestions):
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS("No index suggestions."))
+            return
+        self.stdout.write("\nSuggested migration operations:\n")
+        for model,fields in suggestions.values():
+            index=models.Index(fields=fields)
+            index.set_name_with_model(model)
+            self.stdout.write("        migrations.AddIndex(")
+            self.stdout.write("            model_name=%r," % model._meta.model_name)
+            self.stdout.write("            index=models.Index(fields=%r, name=%r)," % (fields,index.name))
+            self.stdout.write("        ),")
+
+    def shorten(self,sql,length=160):
+        return sql if len(sql)<=length else sql[:length]+"..."
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from DjangoEcommerceApp.documents import rebuild_product_documents
+
+
+class Command(BaseCommand):
+    help="Serialize the JSON document of every product served by the product API."
+
+    def add_arguments(self,parser):
+        parser.add_argument("--batch-size",type=int,default=500)
+
+    def handle(self,*args,**options):
+        def progress(built):
+            self.stdout.write("Built %d documents" % built)
+
+        built=rebuild_product_documents(batch_size=options["batch_size"],progress=progress)
+        self.stdout.write(self.style.SUCCESS("Rebuilt %d product documents" % built))
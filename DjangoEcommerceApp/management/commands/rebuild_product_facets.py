@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from DjangoEcommerceApp.facets import rebuild_product_facets
+
+
+class Command(BaseCommand):
+    help="Rebuild the product facet values and facet counts from the catalog."
+
+    def add_arguments(self,parser):
+        parser.add_argument("--batch-size",type=int,default=2000)
+
+    def handle(self,*args,**options):
+        def progress(synced):
+            self.stdout.write("Synced facets for %d products" % synced)
+
+        synced=rebuild_product_facets(batch_size=options["batch_size"],progress=progress)
+        self.stdout.write(self.style.SUCCESS("Rebuilt facets for %d products" % synced))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from DjangoEcommerceApp.search import rebuild_product_index,search_enabled
+
+
+class Command(BaseCommand):
+    help="Rebuild the product full-text search index from the Products and ProductTags tables."
+
+    def add_arguments(self,parser):
+        parser.add_argument("--batch-size",type=int,default=10000)
+
+    def handle(self,*args,**options):
+        if not search_enabled():
+            self.stderr.write("Full-text search index requires the SQLite backend.")
+            return
+
+        def progress(indexed,last_seen,last_id):
+            self.stdout.write("Indexed %d products (id %d of %d)" % (indexed,last_seen,last_id))
+
+        with transaction.atomic():
+            indexed=rebuild_product_index(batch_size=options["batch_size"],progress=progress)
+        self.stdout.write(self.style.SUCCESS("Rebuilt product search index with %d products" % indexed))
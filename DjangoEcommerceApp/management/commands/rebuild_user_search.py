@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from DjangoEcommerceApp.search import rebuild_user_index,search_enabled
+
+
+class Command(BaseCommand):
+    help="Rebuild the user full-text search index used by the merchant, staff and customer lists."
+
+    def add_arguments(self,parser):
+        parser.add_argument("--batch-size",type=int,default=10000)
+
+    def handle(self,*args,**options):
+        if not search_enabled():
+            self.stderr.write("Full-text search index requires the SQLite backend.")
+            return
+
+        def progress(indexed,last_seen,last_id):
+            self.stdout.write("Indexed %d users (id %d of %d)" % (indexed,last_seen,last_id))
+
+        with transaction.atomic():
+            indexed=rebuild_user_index(batch_size=options["batch_size"],progress=progress)
+        self.stdout.write(self.style.SUCCESS("Rebuilt user search index with %d users" % indexed))
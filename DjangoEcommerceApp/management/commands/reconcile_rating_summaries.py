@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from DjangoEcommerceApp.ratings import reconcile_rating_summaries
+
+
+class Command(BaseCommand):
+    help="Recompute the product rating summaries from the active reviews and fix any that drifted."
+
+    def add_arguments(self,parser):
+        parser.add_argument("--dry-run",action="store_true",help="Only report the products whose summary is wrong.")
+
+    def handle(self,*args,**options):
+        drifted=reconcile_rating_summaries(dry_run=options["dry_run"])
+        for product_id in drifted:
+            self.stdout.write("Product %d: summary %s" % (product_id,"out of date" if options["dry_run"] else "fixed"))
+        self.stdout.write(self.style.SUCCESS("%d rating summaries %s" % (len(drifted),"out of date" if options["dry_run"] else "reconciled")))
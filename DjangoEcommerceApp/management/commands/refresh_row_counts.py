@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from DjangoEcommerceApp.row_counts import counters_enabled,refresh_row_counts
+
+
+class Command(BaseCommand):
+    help="Recount the tables tracked in TableRowCount and reinstall their counting triggers."
+
+    def handle(self,*args,**options):
+        if not counters_enabled():
+            self.stderr.write("Table row counters require the SQLite backend.")
+            return
+        for table,count in refresh_row_counts().items():
+            self.stdout.write("%s: %d rows" % (table,count))
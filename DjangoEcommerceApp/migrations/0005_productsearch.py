@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+PRODUCT_SEARCH_TABLE="DjangoEcommerceApp_productsearch"
+
+
+def create_product_search(apps,schema_editor):
+    if schema_editor.connection.vendor!="sqlite":
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE "%s" USING fts5(product_name,brand,product_description,product_long_description,tags,'
+        "tokenize='unicode61 remove_diacritics 2',prefix='2 3 4')" % PRODUCT_SEARCH_TABLE
+    )
+    schema_editor.execute(
+        'INSERT INTO "%s"(rowid,product_name,brand,product_description,product_long_description,tags) '
+        "SELECT p.id,p.product_name,p.brand,p.product_description,p.product_long_description,"
+        "COALESCE((SELECT group_concat(t.title,' ') FROM \"DjangoEcommerceApp_producttags\" t WHERE t.product_id_id=p.id AND t.is_active=1),'') "
+        'FROM "DjangoEcommerceApp_products" p' % PRODUCT_SEARCH_TABLE
+    )
+
+
+def drop_product_search(apps,schema_editor):
+    if schema_editor.connection.vendor!="sqlite":
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS "%s"' % PRODUCT_SEARCH_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0004_keyset_order_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_product_search,drop_product_search),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+USER_SEARCH_TABLE="DjangoEcommerceApp_usersearch"
+
+
+def create_user_search(apps,schema_editor):
+    if schema_editor.connection.vendor!="sqlite":
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE "%s" USING fts5(first_name,last_name,email,username,'
+        "tokenize='unicode61 remove_diacritics 2',prefix='2 3 4')" % USER_SEARCH_TABLE
+    )
+    schema_editor.execute(
+        'INSERT INTO "%s"(rowid,first_name,last_name,email,username) '
+        'SELECT u.id,u.first_name,u.last_name,u.email,u.username FROM "DjangoEcommerceApp_customuser" u' % USER_SEARCH_TABLE
+    )
+
+
+def drop_user_search(apps,schema_editor):
+    if schema_editor.connection.vendor!="sqlite":
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS "%s"' % USER_SEARCH_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0005_productsearch'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_search,drop_user_search),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:50
+
+from django.db import migrations, models
+
+#Tables counted when this migration was written; later additions are installed by the post_migrate hook
+COUNTED_TABLES=[
+    "DjangoEcommerceApp_categories","DjangoEcommerceApp_subcategories","DjangoEcommerceApp_customuser",
+    "DjangoEcommerceApp_merchantuser","DjangoEcommerceApp_staffuser","DjangoEcommerceApp_customeruser",
+    "DjangoEcommerceApp_products","DjangoEcommerceApp_producttags",
+]
+
+
+def create_triggers(apps,schema_editor):
+    from DjangoEcommerceApp.row_counts import create_row_counters
+    if schema_editor.connection.vendor!="sqlite":
+        return
+    TableRowCount=apps.get_model("DjangoEcommerceApp","TableRowCount")
+    with schema_editor.connection.cursor() as cursor:
+        create_row_counters(cursor,COUNTED_TABLES,TableRowCount._meta.db_table)
+
+def drop_triggers(apps,schema_editor):
+    from DjangoEcommerceApp.row_counts import drop_row_counters
+    if schema_editor.connection.vendor!="sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        drop_row_counters(cursor,COUNTED_TABLES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0006_usersearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableRowCount',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('table_name', models.CharField(max_length=255, unique=True)),
+                ('row_count', models.BigIntegerField(default=0)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_triggers,drop_triggers),
+    ]
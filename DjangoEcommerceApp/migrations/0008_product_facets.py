@@ -0,0 +1,101 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:52
+
+import re
+from decimal import Decimal,InvalidOperation
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BACKFILL_BATCH_SIZE=2000
+
+#Upper bounds of the price bands and the spec facet prefix, as of this migration
+PRICE_BANDS=[500,1000,2000,5000,10000]
+SPEC_FACET_PREFIX="spec:"
+
+
+def price_band(value):
+    #Text prices without a number become 0.00 in 0009, so they are banded as 0 here
+    match=re.search(r"-?(?:\d+(?:\.\d*)?|\.\d+)",str(value or "").replace(",",""))
+    try:
+        price=Decimal(match.group()) if match else Decimal(0)
+    except InvalidOperation:
+        price=Decimal(0)
+    lower=0
+    for upper in PRICE_BANDS:
+        if price<upper:
+            return "%d-%d" % (lower,upper)
+        lower=upper
+    return "%d+" % lower
+
+
+def build_product_facets(apps,schema_editor):
+    Products=apps.get_model("DjangoEcommerceApp","Products")
+    ProductDetails=apps.get_model("DjangoEcommerceApp","ProductDetails")
+    ProductFacetValue=apps.get_model("DjangoEcommerceApp","ProductFacetValue")
+    ProductFacetCount=apps.get_model("DjangoEcommerceApp","ProductFacetCount")
+    counts={}
+    last_id=0
+    #One product id range at a time, so memory stays at one batch of facet rows
+    while True:
+        products=list(Products.objects.filter(id__gt=last_id).order_by("id").values_list("id","is_active","subcategories_id_id","in_stock_total","brand","product_discount_price")[:BACKFILL_BATCH_SIZE])
+        if not products:
+            break
+        last_id=products[-1][0]
+        active_ids=[product[0] for product in products if product[1]==1]
+        details={}
+        for product_id,title,title_details in ProductDetails.objects.filter(product_id__in=active_ids,is_active=1).values_list("product_id","title","title_details"):
+            if title.strip() and title_details.strip():
+                details.setdefault(product_id,set()).add(((SPEC_FACET_PREFIX+title.strip())[:255],title_details.strip()[:255]))
+        values=[]
+        for product_id,is_active,subcategory_id,in_stock_total,brand,price in products:
+            if is_active!=1:
+                continue
+            facets={("subcategory",str(subcategory_id)),("stock","in_stock" if in_stock_total>0 else "out_of_stock"),("price",price_band(price))}
+            if brand:
+                facets.add(("brand",brand.strip()[:255]))
+            facets|=details.get(product_id,set())
+            for key in facets:
+                values.append(ProductFacetValue(product_id_id=product_id,facet=key[0],value=key[1]))
+                counts[key]=counts.get(key,0)+1
+        ProductFacetValue.objects.bulk_create(values,batch_size=BACKFILL_BATCH_SIZE)
+    ProductFacetCount.objects.bulk_create([ProductFacetCount(facet=facet,value=value,product_count=count) for (facet,value),count in counts.items()],batch_size=BACKFILL_BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0007_tablerowcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetValue',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('facet', models.CharField(max_length=255)),
+                ('value', models.CharField(max_length=255)),
+                ('product_id', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='DjangoEcommerceApp.products')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductFacetCount',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('facet', models.CharField(max_length=255)),
+                ('value', models.CharField(max_length=255)),
+                ('product_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('facet', 'value')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productfacetvalue',
+            index=models.Index(fields=['facet', 'value', 'product_id'], name='DjangoEcomm_facet_11b8e6_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productfacetvalue',
+            unique_together={('product_id', 'facet', 'value')},
+        ),
+        migrations.RunPython(build_product_facets,migrations.RunPython.noop),
+    ]
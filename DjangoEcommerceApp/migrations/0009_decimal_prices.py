@@ -0,0 +1,73 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:53
+
+import re
+from decimal import Decimal,InvalidOperation
+
+from django.db import migrations, models
+
+BATCH_SIZE=5000
+
+PRICE_COLUMNS=[
+    ("DjangoEcommerceApp_products",["product_max_price","product_discount_price"]),
+    ("DjangoEcommerceApp_customerorders",["purchase_price","discount_amt"]),
+]
+
+
+def normalize_price(value):
+    match=re.search(r"-?(?:\d+(?:\.\d*)?|\.\d+)",str(value or "").replace(",",""))
+    try:
+        return str(Decimal(match.group()).quantize(Decimal("0.01"))) if match else "0.00"
+    except InvalidOperation:
+        return "0.00"
+
+
+def normalize_prices(apps,schema_editor):
+    """
+    Rewrite the text prices ("1,299", "Rs 499", "") as plain decimals in id
+    batches, so the column type change below can copy them as numbers.
+    """
+    connection=schema_editor.connection
+    quote=connection.ops.quote_name
+    for table,columns in PRICE_COLUMNS:
+        select_sql="SELECT id,%s FROM %s WHERE id>%%s ORDER BY id LIMIT %d" % (",".join(quote(column) for column in columns),quote(table),BATCH_SIZE)
+        update_sql="UPDATE %s SET %s WHERE id=%%s" % (quote(table),",".join("%s=%%s" % quote(column) for column in columns))
+        last_id=0
+        with connection.cursor() as cursor:
+            while True:
+                cursor.execute(select_sql,[last_id])
+                rows=cursor.fetchall()
+                if not rows:
+                    break
+                cursor.executemany(update_sql,[[normalize_price(value) for value in row[1:]]+[row[0]] for row in rows])
+                last_id=rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0008_product_facets'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_prices,migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customerorders',
+            name='discount_amt',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='customerorders',
+            name='purchase_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='products',
+            name='product_discount_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='products',
+            name='product_max_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=12),
+        ),
+    ]
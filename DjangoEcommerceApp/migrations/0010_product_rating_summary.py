@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:56
+
+from decimal import Decimal,InvalidOperation
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_rating_summaries(apps,schema_editor):
+    ProductReviews=apps.get_model("DjangoEcommerceApp","ProductReviews")
+    ProductRatingSummary=apps.get_model("DjangoEcommerceApp","ProductRatingSummary")
+    summaries={}
+    for product_id,rating in ProductReviews.objects.filter(is_active=1).values_list("product_id","rating").iterator():
+        try:
+            stars=min(max(int(Decimal(str(rating).strip()).to_integral_value()),1),5)
+        except (InvalidOperation,ValueError):
+            continue
+        summary=summaries.setdefault(product_id,ProductRatingSummary(product_id_id=product_id))
+        summary.review_count+=1
+        summary.rating_total+=stars
+        setattr(summary,"stars_%d" % stars,getattr(summary,"stars_%d" % stars)+1)
+    ProductRatingSummary.objects.bulk_create(summaries.values(),batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0009_decimal_prices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingSummary',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_total', models.IntegerField(default=0)),
+                ('stars_1', models.IntegerField(default=0)),
+                ('stars_2', models.IntegerField(default=0)),
+                ('stars_3', models.IntegerField(default=0)),
+                ('stars_4', models.IntegerField(default=0)),
+                ('stars_5', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rating_summary', to='DjangoEcommerceApp.products')),
+            ],
+        ),
+        migrations.RunPython(build_rating_summaries,migrations.RunPython.noop),
+    ]
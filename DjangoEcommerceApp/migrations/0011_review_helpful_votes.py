@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:56
+
+from django.db import migrations, models
+from django.db.models import Count,IntegerField,OuterRef,Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_helpful_votes(apps,schema_editor):
+    ProductReviews=apps.get_model("DjangoEcommerceApp","ProductReviews")
+    ProductReviewVoting=apps.get_model("DjangoEcommerceApp","ProductReviewVoting")
+    votes=ProductReviewVoting.objects.filter(product_review_id=OuterRef("pk"),is_active=1).order_by().values("product_review_id").annotate(votes=Count("id")).values("votes")
+    ProductReviews.objects.update(helpful_votes=Coalesce(Subquery(votes,output_field=IntegerField()),0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0010_product_rating_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productreviews',
+            name='helpful_votes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_helpful_votes,migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='productreviews',
+            index=models.Index(fields=['product_id', 'is_active', 'helpful_votes', 'id'], name='DjangoEcomm_product_d7791f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productreviews',
+            index=models.Index(fields=['product_id', 'is_active', 'created_at', 'id'], name='DjangoEcomm_product_41e7de_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productreviews',
+            index=models.Index(fields=['product_id', 'is_active', 'rating', 'id'], name='DjangoEcomm_product_6475bc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productreviewvoting',
+            index=models.Index(fields=['product_review_id', 'user_id_voting'], name='DjangoEcomm_product_cc34f7_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0011_review_helpful_votes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDocument',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('document', models.TextField(default='')),
+                ('etag', models.CharField(default='', max_length=64)),
+                ('is_public', models.BooleanField(default=False)),
+                ('version', models.BigIntegerField(default=1)),
+                ('built_version', models.BigIntegerField(default=0)),
+                ('built_at', models.DateTimeField(null=True)),
+                ('product_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='document', to='DjangoEcommerceApp.products')),
+            ],
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:06
+
+import re
+
+from django.db import migrations, models
+from django.db.models import Count,OuterRef,Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+BACKFILL_BATCH_SIZE=2000
+
+
+def build_tag_index(apps,schema_editor):
+    Products=apps.get_model("DjangoEcommerceApp","Products")
+    ProductTags=apps.get_model("DjangoEcommerceApp","ProductTags")
+    Tag=apps.get_model("DjangoEcommerceApp","Tag")
+    ProductTagLink=apps.get_model("DjangoEcommerceApp","ProductTagLink")
+    tag_ids={}
+    last_id=0
+    #One product id range at a time, so memory stays at one batch of tag rows
+    while True:
+        product_ids=list(Products.objects.filter(id__gt=last_id,is_active=1).order_by("id").values_list("id",flat=True)[:BACKFILL_BATCH_SIZE])
+        if not product_ids:
+            break
+        last_id=product_ids[-1]
+        links=set()
+        for product_id,title in ProductTags.objects.filter(product_id__in=product_ids,is_active=1).values_list("product_id","title"):
+            name=re.sub(r"\s+"," ",title or "").strip().lower()[:255]
+            if name:
+                links.add((product_id,name))
+        missing={name for product_id,name in links if name not in tag_ids}
+        if missing:
+            Tag.objects.bulk_create([Tag(name=name) for name in missing],ignore_conflicts=True)
+            tag_ids.update(Tag.objects.filter(name__in=missing).values_list("name","id"))
+        ProductTagLink.objects.bulk_create([ProductTagLink(product_id_id=product_id,tag_id_id=tag_ids[name]) for product_id,name in links],batch_size=BACKFILL_BATCH_SIZE)
+    counts=ProductTagLink.objects.filter(tag_id=OuterRef("pk")).order_by().values("tag_id").annotate(count=Count("id")).values("count")
+    Tag.objects.update(product_count=Coalesce(Subquery(counts),0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0012_product_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('product_count', models.IntegerField(db_index=True, default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductTagLink',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('product_id', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='DjangoEcommerceApp.products')),
+                ('tag_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='DjangoEcommerceApp.tag')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='producttaglink',
+            index=models.Index(fields=['tag_id', 'product_id'], name='DjangoEcomm_tag_id__94c103_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='producttaglink',
+            unique_together={('product_id', 'tag_id')},
+        ),
+        migrations.RunPython(build_tag_index,migrations.RunPython.noop),
+    ]
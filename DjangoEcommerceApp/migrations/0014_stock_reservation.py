@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0013_tag_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='reserved_stock_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='DjangoEcommerceApp.products')),
+            ],
+        ),
+    ]
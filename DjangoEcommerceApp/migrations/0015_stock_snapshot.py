@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0014_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('stock', models.IntegerField()),
+                ('last_transaction_id', models.IntegerField()),
+                ('as_of', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='producttransaction',
+            index=models.Index(fields=['product_id', 'created_at'], name='DjangoEcomm_product_8d68fb_idx'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='product_id',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='DjangoEcommerceApp.products'),
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['product_id', 'as_of'], name='DjangoEcomm_product_a911f2_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stocksnapshot',
+            unique_together={('product_id', 'last_transaction_id')},
+        ),
+    ]
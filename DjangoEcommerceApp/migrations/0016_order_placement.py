@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoEcommerceApp', '0015_stock_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Coupon',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('code', models.CharField(max_length=255, unique=True)),
+                ('discount_percent', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('max_uses', models.IntegerField(blank=True, null=True)),
+                ('used_count', models.IntegerField(default=0)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('is_active', models.IntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customerorders',
+            name='quantity',
+            field=models.IntegerField(default=1),
+        ),
+    ]
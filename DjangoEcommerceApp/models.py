@@ -1,7 +1,7 @@
-from django.db import models
+from django.db import models,transaction
 from django.contrib.auth.models import AbstractUser
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save,post_save,post_delete,post_migrate
 from django.urls import reverse
 
 # Create your models here.
@@ -18,28 +18,28 @@ class AdminUser(models.Model):
 class StaffUser(models.Model):
     profile_pic=models.FileField(default="")
     auth_user_id=models.OneToOneField(CustomUser,on_delete=models.CASCADE)
-    created_at=models.DateTimeField(auto_now_add=True)
+    created_at=models.DateTimeField(auto_now_add=True,db_index=True)
 
 class MerchantUser(models.Model):
     auth_user_id=models.OneToOneField(CustomUser,on_delete=models.CASCADE)
     profile_pic=models.FileField(default="")
-    company_name=models.CharField(max_length=255)
+    company_name=models.CharField(max_length=255,db_index=True)
     gst_details=models.CharField(max_length=255)
     address=models.TextField()
     is_added_by_admin=models.BooleanField(default=False)
-    created_at=models.DateTimeField(auto_now_add=True)
+    created_at=models.DateTimeField(auto_now_add=True,db_index=True)
     objects=models.Manager()
 
 
 class CustomerUser(models.Model):
     auth_user_id=models.OneToOneField(CustomUser,on_delete=models.CASCADE)
     profile_pic=models.FileField(default="")
-    created_at=models.DateTimeField(auto_now_add=True)
+    created_at=models.DateTimeField(auto_now_add=True,db_index=True)
 
 
 class Categories(models.Model):
     id=models.AutoField(primary_key=True)
-    title=models.CharField(max_length=255)
+    title=models.CharField(max_length=255,db_index=True)
     url_slug=models.CharField(max_length=255)
     thumbnail=models.FileField()
     description=models.TextField()
@@ -58,7 +58,7 @@ class Categories(models.Model):
 class SubCategories(models.Model):
     id=models.AutoField(primary_key=True)
     category_id=models.ForeignKey(Categories,on_delete=models.CASCADE)
-    title=models.CharField(max_length=255)
+    title=models.CharField(max_length=255,db_index=True)
     url_slug=models.CharField(max_length=255)
     thumbnail=models.FileField()
     description=models.TextField()
@@ -74,15 +74,17 @@ class Products(models.Model):
     id=models.AutoField(primary_key=True)
     url_slug=models.CharField(max_length=255)
     subcategories_id=models.ForeignKey(SubCategories,on_delete=models.CASCADE)
-    product_name=models.CharField(max_length=255)
+    product_name=models.CharField(max_length=255,db_index=True)
     brand=models.CharField(max_length=255)
-    product_max_price=models.CharField(max_length=255)
-    product_discount_price=models.CharField(max_length=255)
+    product_max_price=models.DecimalField(max_digits=12,decimal_places=2,default=0,db_index=True)
+    product_discount_price=models.DecimalField(max_digits=12,decimal_places=2,default=0,db_index=True)
     product_description=models.TextField()
     product_long_description=models.TextField()
     created_at=models.DateTimeField(auto_now_add=True)
     added_by_merchant=models.ForeignKey(MerchantUser,on_delete=models.CASCADE)
     in_stock_total=models.IntegerField(default=1)
+    #Part of in_stock_total held by unexpired StockReservation rows
+    reserved_stock_total=models.IntegerField(default=0)
     is_active=models.IntegerField(default=1)
 
 class ProductMedia(models.Model):
@@ -103,6 +105,31 @@ class ProductTransaction(models.Model):
     transaction_description=models.CharField(max_length=255)
     created_at=models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes=[models.Index(fields=["product_id","created_at"])]
+
+
+class StockSnapshot(models.Model):
+    #Stock after ledger row last_transaction_id; later stock is this plus the rows after it
+    id=models.AutoField(primary_key=True)
+    product_id=models.ForeignKey(Products,on_delete=models.CASCADE)
+    stock=models.IntegerField()
+    last_transaction_id=models.IntegerField()
+    as_of=models.DateTimeField()
+    created_at=models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together=(("product_id","last_transaction_id"),)
+        indexes=[models.Index(fields=["product_id","as_of"])]
+
+
+class StockReservation(models.Model):
+    id=models.AutoField(primary_key=True)
+    product_id=models.ForeignKey(Products,on_delete=models.CASCADE)
+    quantity=models.IntegerField()
+    expires_at=models.DateTimeField(db_index=True)
+    created_at=models.DateTimeField(auto_now_add=True)
+
 
 class ProductDetails(models.Model):
     id=models.AutoField(primary_key=True)
@@ -144,6 +171,23 @@ class ProductReviews(models.Model):
     review=models.TextField(default="")
     created_at=models.DateTimeField(auto_now_add=True)
     is_active=models.IntegerField(default=1)
+    #Active ProductReviewVoting rows, maintained by the voting receivers
+    helpful_votes=models.IntegerField(default=0)
+
+    class Meta:
+        indexes=[
+            models.Index(fields=["product_id","is_active","helpful_votes","id"]),
+            models.Index(fields=["product_id","is_active","created_at","id"]),
+            models.Index(fields=["product_id","is_active","rating","id"]),
+        ]
+
+    def save(self,*args,**kwargs):
+        #Never write back a stale vote count; it only changes through F() updates
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"]=[field.name for field in self._meta.concrete_fields if not field.primary_key and field.name!="helpful_votes"]
+        #The locked read of the old rating, the row write and the summary delta commit together
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args,**kwargs)
 
 class ProductReviewVoting(models.Model):
     id=models.AutoField(primary_key=True)
@@ -152,6 +196,14 @@ class ProductReviewVoting(models.Model):
     created_at=models.DateTimeField(auto_now_add=True)
     is_active=models.IntegerField(default=1)
 
+    class Meta:
+        indexes=[models.Index(fields=["product_review_id","user_id_voting"])]
+
+    def save(self,*args,**kwargs):
+        #The locked read of the old vote, the row write and the helpful_votes delta commit together
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args,**kwargs)
+
 class ProductVarient(models.Model):
     id=models.AutoField(primary_key=True)
     title=models.CharField(max_length=255)
@@ -167,9 +219,10 @@ class ProductVarientItems(models.Model):
 class CustomerOrders(models.Model):
     id=models.AutoField(primary_key=True)
     product_id=models.ForeignKey(Products,on_delete=models.DO_NOTHING)
-    purchase_price=models.CharField(max_length=255)
+    purchase_price=models.DecimalField(max_digits=12,decimal_places=2,default=0,db_index=True)
     coupon_code=models.CharField(max_length=255)
-    discount_amt=models.CharField(max_length=255)
+    discount_amt=models.DecimalField(max_digits=12,decimal_places=2,default=0,db_index=True)
+    quantity=models.IntegerField(default=1)
     product_status=models.CharField(max_length=255)
     created_at=models.DateTimeField(auto_now_add=True)
 
@@ -181,6 +234,95 @@ class OrderDeliveryStatus(models.Model):
     created_at=models.DateTimeField(auto_now_add=True)
     updated_at=models.DateTimeField(auto_now_add=True)
 
+class Coupon(models.Model):
+    id=models.AutoField(primary_key=True)
+    code=models.CharField(max_length=255,unique=True)
+    discount_percent=models.DecimalField(max_digits=5,decimal_places=2)
+    #Unlimited when empty; used_count is only ever changed by guarded F() updates
+    max_uses=models.IntegerField(null=True,blank=True)
+    used_count=models.IntegerField(default=0)
+    expires_at=models.DateTimeField(null=True,blank=True)
+    is_active=models.IntegerField(default=1)
+    created_at=models.DateTimeField(auto_now_add=True)
+
+
+class ProductFacetValue(models.Model):
+    id=models.AutoField(primary_key=True)
+    #Removed by the Products post_delete receiver, which also decrements the counts
+    product_id=models.ForeignKey(Products,on_delete=models.DO_NOTHING)
+    facet=models.CharField(max_length=255)
+    value=models.CharField(max_length=255)
+
+    class Meta:
+        unique_together=(("product_id","facet","value"),)
+        indexes=[models.Index(fields=["facet","value","product_id"])]
+
+class ProductFacetCount(models.Model):
+    id=models.AutoField(primary_key=True)
+    facet=models.CharField(max_length=255)
+    value=models.CharField(max_length=255)
+    product_count=models.IntegerField(default=0)
+
+    class Meta:
+        unique_together=(("facet","value"),)
+
+class TableRowCount(models.Model):
+    id=models.AutoField(primary_key=True)
+    table_name=models.CharField(max_length=255,unique=True)
+    row_count=models.BigIntegerField(default=0)
+    version=models.BigIntegerField(default=0)
+
+class ProductRatingSummary(models.Model):
+    id=models.AutoField(primary_key=True)
+    product_id=models.OneToOneField(Products,on_delete=models.CASCADE,related_name="rating_summary")
+    review_count=models.IntegerField(default=0)
+    rating_total=models.IntegerField(default=0)
+    stars_1=models.IntegerField(default=0)
+    stars_2=models.IntegerField(default=0)
+    stars_3=models.IntegerField(default=0)
+    stars_4=models.IntegerField(default=0)
+    stars_5=models.IntegerField(default=0)
+    updated_at=models.DateTimeField(auto_now=True)
+
+    def average_rating(self):
+        if self.review_count<=0:
+            return None
+        return round(self.rating_total/self.review_count,1)
+
+    def histogram(self):
+        return [(stars,getattr(self,"stars_%d" % stars)) for stars in range(5,0,-1)]
+
+class Tag(models.Model):
+    id=models.AutoField(primary_key=True)
+    #Normalized with tag_index.normalize_tag: trimmed, single spaced, lower case
+    name=models.CharField(max_length=255,unique=True)
+    product_count=models.IntegerField(default=0,db_index=True)
+    created_at=models.DateTimeField(auto_now_add=True)
+
+class ProductTagLink(models.Model):
+    id=models.AutoField(primary_key=True)
+    #Removed by the Products post_delete receiver, which also decrements the counts
+    product_id=models.ForeignKey(Products,on_delete=models.DO_NOTHING)
+    tag_id=models.ForeignKey(Tag,on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together=(("product_id","tag_id"),)
+        indexes=[models.Index(fields=["tag_id","product_id"])]
+
+class ProductDocument(models.Model):
+    id=models.AutoField(primary_key=True)
+    product_id=models.OneToOneField(Products,on_delete=models.CASCADE,related_name="document")
+    document=models.TextField(default="")
+    etag=models.CharField(max_length=64,default="")
+    is_public=models.BooleanField(default=False)
+    #Bumped on every write that changes the document; it is stale while built_version lags behind
+    version=models.BigIntegerField(default=1)
+    built_version=models.BigIntegerField(default=0)
+    built_at=models.DateTimeField(null=True)
+
+    def is_fresh(self):
+        return self.built_version==self.version
+
 
 @receiver(post_save,sender=CustomUser)
 def create_user_profile(sender,instance,created,**kwargs):
@@ -203,4 +345,141 @@ def save_user_profile(sender,instance,**kwargs):
     if instance.user_type==3:
         instance.merchantuser.save()
     if instance.user_type==4:
-        instance.customeruser.save()
\ No newline at end of file
+        instance.customeruser.save()
+
+@receiver(post_save,sender=Products)
+def index_product_search(sender,instance,**kwargs):
+    from DjangoEcommerceApp.search import index_product
+    index_product(instance.id)
+
+@receiver(post_delete,sender=Products)
+def remove_product_search(sender,instance,**kwargs):
+    from DjangoEcommerceApp.search import remove_product
+    remove_product(instance.id)
+
+@receiver(post_save,sender=ProductTags)
+@receiver(post_delete,sender=ProductTags)
+def index_product_tags_search(sender,instance,**kwargs):
+    from DjangoEcommerceApp.search import index_product
+    index_product(instance.product_id_id)
+
+@receiver(post_save,sender=CustomUser)
+def index_user_search(sender,instance,**kwargs):
+    from DjangoEcommerceApp.search import index_user
+    index_user(instance.id)
+
+@receiver(post_delete,sender=CustomUser)
+def remove_user_search(sender,instance,**kwargs):
+    from DjangoEcommerceApp.search import remove_user
+    remove_user(instance.id)
+
+@receiver(post_save,sender=Categories)
+@receiver(post_delete,sender=Categories)
+@receiver(post_save,sender=SubCategories)
+@receiver(post_delete,sender=SubCategories)
+def invalidate_category_tree_cache(sender,instance,**kwargs):
+    from DjangoEcommerceApp.category_tree import invalidate_category_tree
+    invalidate_category_tree()
+
+@receiver(post_migrate)
+def install_table_row_counters(sender,using,**kwargs):
+    if sender.name=="DjangoEcommerceApp":
+        from DjangoEcommerceApp.row_counts import install_row_counters
+        install_row_counters(using)
+
+@receiver(post_save,sender=Products)
+def sync_product_facet_values(sender,instance,**kwargs):
+    from DjangoEcommerceApp.facets import sync_product_facets
+    sync_product_facets([instance.id])
+
+@receiver(post_delete,sender=Products)
+def remove_product_facet_values(sender,instance,**kwargs):
+    from DjangoEcommerceApp.facets import remove_product_facets
+    remove_product_facets([instance.id])
+
+@receiver(post_save,sender=ProductDetails)
+@receiver(post_delete,sender=ProductDetails)
+def sync_product_details_facet_values(sender,instance,**kwargs):
+    from DjangoEcommerceApp.facets import sync_product_facets
+    sync_product_facets([instance.product_id_id])
+
+@receiver(pre_save,sender=ProductReviews)
+def load_previous_review_rating(sender,instance,**kwargs):
+    from DjangoEcommerceApp.ratings import remember_review_rating
+    remember_review_rating(instance)
+
+@receiver(post_save,sender=ProductReviews)
+def update_review_rating_summary(sender,instance,**kwargs):
+    from DjangoEcommerceApp.ratings import apply_review_change
+    apply_review_change(instance)
+
+@receiver(post_delete,sender=ProductReviews)
+def remove_review_rating_summary(sender,instance,**kwargs):
+    from DjangoEcommerceApp.ratings import apply_review_removal
+    apply_review_removal(instance)
+
+@receiver(pre_save,sender=ProductReviewVoting)
+def load_previous_review_vote(sender,instance,**kwargs):
+    from DjangoEcommerceApp.reviews import remember_vote
+    remember_vote(instance)
+
+@receiver(post_save,sender=ProductReviewVoting)
+def update_review_vote_count(sender,instance,**kwargs):
+    from DjangoEcommerceApp.reviews import apply_vote_change
+    apply_vote_change(instance)
+
+@receiver(post_delete,sender=ProductReviewVoting)
+def remove_review_vote_count(sender,instance,**kwargs):
+    from DjangoEcommerceApp.reviews import apply_vote_removal
+    apply_vote_removal(instance)
+
+@receiver(post_save,sender=Products)
+def invalidate_product_document(sender,instance,**kwargs):
+    from DjangoEcommerceApp.documents import invalidate_product_documents
+    invalidate_product_documents(product_id=instance.id)
+
+@receiver(post_save,sender=ProductMedia)
+@receiver(post_delete,sender=ProductMedia)
+@receiver(post_save,sender=ProductDetails)
+@receiver(post_delete,sender=ProductDetails)
+@receiver(post_save,sender=ProductAbout)
+@receiver(post_delete,sender=ProductAbout)
+@receiver(post_save,sender=ProductTags)
+@receiver(post_delete,sender=ProductTags)
+@receiver(post_save,sender=ProductVarientItems)
+@receiver(post_delete,sender=ProductVarientItems)
+def invalidate_product_child_document(sender,instance,**kwargs):
+    from DjangoEcommerceApp.documents import invalidate_product_documents
+    invalidate_product_documents(product_id=instance.product_id_id)
+
+@receiver(post_save,sender=Categories)
+def invalidate_category_documents(sender,instance,**kwargs):
+    from DjangoEcommerceApp.documents import invalidate_product_documents
+    invalidate_product_documents(product_id__subcategories_id__category_id=instance.id)
+
+@receiver(post_save,sender=SubCategories)
+def invalidate_subcategory_documents(sender,instance,**kwargs):
+    from DjangoEcommerceApp.documents import invalidate_product_documents
+    invalidate_product_documents(product_id__subcategories_id=instance.id)
+
+@receiver(post_save,sender=MerchantUser)
+def invalidate_merchant_documents(sender,instance,**kwargs):
+    from DjangoEcommerceApp.documents import invalidate_product_documents
+    invalidate_product_documents(product_id__added_by_merchant=instance.id)
+
+@receiver(post_save,sender=ProductVarient)
+def invalidate_varient_documents(sender,instance,**kwargs):
+    from DjangoEcommerceApp.documents import invalidate_product_documents
+    invalidate_product_documents(product_id__productvarientitems__product_varient_id=instance.id)
+
+@receiver(post_save,sender=Products)
+@receiver(post_save,sender=ProductTags)
+@receiver(post_delete,sender=ProductTags)
+def sync_product_tag_index(sender,instance,**kwargs):
+    from DjangoEcommerceApp.tag_index import sync_product_tags
+    sync_product_tags([instance.id if sender is Products else instance.product_id_id])
+
+@receiver(post_delete,sender=Products)
+def remove_product_tag_index(sender,instance,**kwargs):
+    from DjangoEcommerceApp.tag_index import remove_product_tags
+    remove_product_tags([instance.id])
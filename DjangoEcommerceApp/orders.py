@@ -0,0 +1,97 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case,When,Value,F,Q,IntegerField
+from django.utils import timezone
+
+from DjangoEcommerceApp.models import Products,ProductTransaction,CustomerOrders,OrderDeliveryStatus,Coupon
+from DjangoEcommerceApp.inventory import InsufficientStockError,parse_quantity
+from DjangoEcommerceApp.facets import sync_product_facets
+from DjangoEcommerceApp.documents import invalidate_product_documents
+from DjangoEcommerceApp.product_import import bulk_create_with_ids
+
+ORDER_STATUS="placed"
+ORDER_STATUS_MESSAGE="Order Placed"
+ORDER_SALE_DESCRIPTION="Customer Order"
+
+#Lines per order; every line is one CASE branch of the stock UPDATE
+MAX_ORDER_LINES=100
+
+CENT=Decimal("0.01")
+
+
+class OrderError(ValueError):
+    pass
+
+
+def merge_lines(lines):
+    """
+    {product id: quantity} from (product id, quantity) pairs, adding up
+    repeated products.
+    """
+    quantities={}
+    for product_id,quantity in lines:
+        try:
+            product_id=int(product_id)
+            quantity=parse_quantity(quantity)
+        except (TypeError,ValueError) as e:
+            raise OrderError(str(e))
+        quantities[product_id]=quantities.get(product_id,0)+quantity
+    if not quantities:
+        raise OrderError("An order needs at least one line")
+    if len(quantities)>MAX_ORDER_LINES:
+        raise OrderError("At most %d products per order" % MAX_ORDER_LINES)
+    return quantities
+
+def take_stock(quantities):
+    """
+    Decrement the stock of every line with one UPDATE whose WHERE only
+    matches products with enough unreserved stock. Anything less than a
+    full match raises, rolling the order back.
+    """
+    taken=Case(*[When(id=product_id,then=Value(quantity)) for product_id,quantity in quantities.items()],output_field=IntegerField())
+    enough=Products.objects.filter(id__in=quantities,is_active=1,in_stock_total__gte=F("reserved_stock_total")+taken)
+    updated=enough.update(in_stock_total=F("in_stock_total")-taken)
+    if updated!=len(quantities):
+        raise InsufficientStockError("Not enough stock for %d of the %d products ordered" % (len(quantities)-updated,len(quantities)))
+
+def use_coupon(code,now):
+    """
+    The discount percent of a valid coupon, counting one use with a guarded
+    UPDATE so a limited coupon is never used more than max_uses times.
+    """
+    valid=Coupon.objects.filter(code=code,is_active=1).filter(Q(expires_at__isnull=True)|Q(expires_at__gt=now))
+    if not valid.filter(Q(max_uses__isnull=True)|Q(used_count__lt=F("max_uses"))).update(used_count=F("used_count")+1):
+        raise OrderError("Coupon %r is not valid" % code)
+    return valid.values_list("discount_percent",flat=True).get()
+
+@transaction.atomic
+def place_order(lines,coupon_code=""):
+    """
+    Place an order for (product id, quantity) lines in one transaction:
+    take the stock, apply the coupon, and insert one CustomerOrders row,
+    one SELL ledger row and one OrderDeliveryStatus row per line with a
+    bulk INSERT each. Returns the CustomerOrders rows.
+    """
+    quantities=merge_lines(lines)
+    coupon_code=(coupon_code or "").strip()
+    #Writes come first, so on SQLite the transaction takes the write lock before reading anything
+    take_stock(quantities)
+    discount_percent=use_coupon(coupon_code,timezone.now()) if coupon_code else Decimal(0)
+
+    prices=dict(Products.objects.filter(id__in=quantities).values_list("id","product_discount_price"))
+    orders=[]
+    for product_id,quantity in sorted(quantities.items()):
+        total=prices[product_id]*quantity
+        discount=(total*discount_percent/100).quantize(CENT)
+        orders.append(CustomerOrders(product_id_id=product_id,quantity=quantity,purchase_price=total-discount,discount_amt=discount,coupon_code=coupon_code,product_status=ORDER_STATUS))
+    bulk_create_with_ids(CustomerOrders,orders)
+    ProductTransaction.objects.bulk_create([ProductTransaction(product_id_id=order.product_id_id,transaction_product_count=order.quantity,transaction_type=2,transaction_description=ORDER_SALE_DESCRIPTION) for order in orders])
+    OrderDeliveryStatus.objects.bulk_create([OrderDeliveryStatus(order_id=order,status=ORDER_STATUS,status_message=ORDER_STATUS_MESSAGE) for order in orders])
+
+    #Selling only moves a product's stock facet when it sells out
+    sold_out=list(Products.objects.filter(id__in=quantities,in_stock_total__lte=0).values_list("id",flat=True))
+    if sold_out:
+        sync_product_facets(sold_out)
+    invalidate_product_documents(product_id__in=list(quantities))
+    return orders
@@ -0,0 +1,311 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator,Page,EmptyPage,PageNotAnInteger
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F,Q
+from django.db.models.sql import Query
+from django.db.models.sql.where import WhereNode
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from DjangoEcommerceApp.row_counts import table_versions
+from DjangoEcommerceApp.search import PRODUCT_SEARCH_TABLE,USER_SEARCH_TABLE
+from DjangoEcommerceApp.models import Products,ProductTags,CustomUser
+
+#Search tables have no triggers; they change exactly when their source tables do
+SEARCH_TABLE_SOURCES={
+    PRODUCT_SEARCH_TABLE:[Products._meta.db_table,ProductTags._meta.db_table],
+    USER_SEARCH_TABLE:[CustomUser._meta.db_table],
+}
+
+COUNT_CACHE_TIMEOUT=3600
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    #DjangoJSONEncoder cuts times to milliseconds; a cursor has to match its row's key exactly
+    def default(self,o):
+        if isinstance(o,(datetime.datetime,datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(value,pk,direction):
+    data=json.dumps([value,pk,direction],cls=CursorEncoder,separators=(",",":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        data=base64.urlsafe_b64decode(cursor+"="*(-len(cursor)%4))
+        value,pk,direction=json.loads(data)
+    except (binascii.Error,ValueError,TypeError):
+        raise Http404("Invalid cursor")
+    if direction not in ("n","p"):
+        raise Http404("Invalid cursor")
+    return value,pk,direction
+
+
+class KeysetPage:
+    def __init__(self,object_list,next_cursor,previous_cursor):
+        self.object_list=object_list
+        self.next_cursor=next_cursor
+        self.previous_cursor=previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Seek pagination over (order_key, id): every page is an indexed range scan
+    with LIMIT, so there is no OFFSET and no COUNT(*).
+    """
+    def __init__(self,queryset,per_page):
+        self.per_page=int(per_page)
+        order_by=queryset.query.order_by[0] if queryset.query.order_by else "id"
+        self.descending=order_by.startswith("-")
+        field=order_by.lstrip("-")
+        self.key=None if field in ("id","pk") else field
+        if self.key is not None:
+            queryset=queryset.annotate(keyset_value=F(self.key))
+        self.queryset=queryset
+
+    def ordering(self,reverse):
+        prefix="-" if self.descending!=reverse else ""
+        if self.key is None:
+            return [prefix+"id"]
+        return [prefix+"keyset_value",prefix+"id"]
+
+    def seek(self,value,pk,reverse):
+        #(key, id) > (value, pk), written so the leading key bound can seek an index
+        lookup="lt" if self.descending!=reverse else "gt"
+        if self.key is None:
+            return Q(**{"id__"+lookup:pk})
+        return Q(**{"keyset_value__"+lookup+"e":value}) & (Q(**{"keyset_value__"+lookup:value}) | Q(**{"id__"+lookup:pk}))
+
+    def cursor_for(self,obj,direction):
+        value=getattr(obj,"keyset_value",None)
+        return encode_cursor(value,obj.pk,direction)
+
+    def page(self,cursor):
+        queryset=self.queryset
+        reverse=False
+        if cursor:
+            value,pk,direction=decode_cursor(cursor)
+            reverse=direction=="p"
+            queryset=queryset.filter(self.seek(value,pk,reverse))
+
+        object_list=list(queryset.order_by(*self.ordering(reverse))[:self.per_page+1])
+        has_more=len(object_list)>self.per_page
+        object_list=object_list[:self.per_page]
+        if reverse:
+            object_list.reverse()
+            has_next,has_previous=True,has_more
+        else:
+            has_next,has_previous=has_more,bool(cursor)
+
+        next_cursor=self.cursor_for(object_list[-1],"n") if object_list and has_next else None
+        previous_cursor=self.cursor_for(object_list[0],"p") if object_list and has_previous else None
+        return KeysetPage(object_list,next_cursor,previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin adding a cursor mode next to the numbered pages. Passing
+    ?cursor= (empty for the first page) switches the view to keyset paging.
+    """
+    cursor_param="cursor"
+
+    def is_cursor_mode(self):
+        return self.cursor_param in self.request.GET
+
+    def keyset_ordering(self,order_by,default="id"):
+        #Cursors seek on a model column; aliases such as search_rank fall back to the default
+        try:
+            field=self.model._meta.get_field(order_by.lstrip("-"))
+        except FieldDoesNotExist:
+            return default
+        return order_by if field.concrete else default
+
+    def paginate_queryset(self,queryset,page_size):
+        if not self.is_cursor_mode():
+            return super().paginate_queryset(queryset,page_size)
+        page=KeysetPaginator(queryset,page_size).page(self.request.GET.get(self.cursor_param))
+        return (None,page,page.object_list,page.has_other_pages())
+
+    def get_context_data(self,**kwargs):
+        context=super().get_context_data(**kwargs)
+        context["cursor_mode"]=self.is_cursor_mode()
+        return context
+
+
+class LookaheadPage(Page):
+    def __init__(self,object_list,number,paginator,has_next):
+        super().__init__(object_list,number,paginator)
+        self.lookahead_has_next=has_next
+
+    def has_next(self):
+        return self.lookahead_has_next
+
+
+def query_table_names(query):
+    """
+    Every table a query reads, including those of subqueries in its WHERE
+    clause and annotations, such as the id__in subqueries of facet filters.
+    """
+    tables=set(query.extra_tables)
+    for alias in query.alias_map.values():
+        tables.add(alias.table_name)
+    pending=[query.where,*query.annotations.values()]
+    while pending:
+        node=pending.pop()
+        inner=getattr(node,"query",None)
+        if isinstance(node,Query) or isinstance(inner,Query):
+            tables|=query_table_names(node if isinstance(node,Query) else inner)
+            continue
+        if isinstance(node,WhereNode):
+            pending.extend(node.children)
+        elif hasattr(node,"get_source_expressions"):
+            pending.extend(node.get_source_expressions())
+        for side in ("lhs","rhs"):
+            if hasattr(node,side):
+                pending.append(getattr(node,side))
+    return tables
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that avoids COUNT(*) where it can:
+
+    * unfiltered querysets read the trigger-maintained TableRowCount row,
+    * filtered counts are cached under the write versions of every table
+      in the query, so any write to those tables invalidates them,
+    * count_mode="capped" stops counting after count_limit rows and reports
+      "more than count_limit", count_mode="none" skips the total entirely.
+
+    Without an exact total, pages find out whether a next page exists by
+    fetching one extra row.
+    """
+    def __init__(self,object_list,per_page,count_mode="capped",count_limit=1000,**kwargs):
+        super().__init__(object_list,per_page,**kwargs)
+        self.count_mode=count_mode
+        self.count_limit=count_limit
+
+    def query_tables(self):
+        tables=query_table_names(self.object_list.query)
+        tables.add(self.object_list.model._meta.db_table)
+        source_tables=set()
+        for table in tables:
+            source_tables.update(SEARCH_TABLE_SOURCES.get(table,[table]))
+        return source_tables
+
+    def is_unfiltered(self):
+        query=self.object_list.query
+        return not query.where and not query.extra_tables and not query.distinct and not query.is_sliced and len(query.alias_map)<=1
+
+    @cached_property
+    def count_info(self):
+        if self.count_mode=="none":
+            return (None,False)
+        if not hasattr(self.object_list,"query"):
+            return (len(self.object_list),True)
+
+        tables=self.query_tables()
+        versions=table_versions(tables)
+        if self.is_unfiltered() and self.object_list.model._meta.db_table in versions:
+            return (versions[self.object_list.model._meta.db_table][0],True)
+
+        cache_key=None
+        if versions and set(versions)==tables:
+            sql,params=self.object_list.query.sql_with_params()
+            digest=hashlib.md5(repr((sql,params,self.count_mode,self.count_limit)).encode()).hexdigest()
+            cache_key="count:%s:%s" % (digest,":".join("%s=%d" % (table,versions[table][1]) for table in sorted(versions)))
+            info=cache.get(cache_key)
+            if info is not None:
+                return info
+
+        if self.count_mode=="capped":
+            count=self.object_list[:self.count_limit+1].count()
+            info=(min(count,self.count_limit),count<=self.count_limit)
+        else:
+            info=(self.object_list.count(),True)
+        if cache_key is not None:
+            cache.set(cache_key,info,COUNT_CACHE_TIMEOUT)
+        return info
+
+    @property
+    def count(self):
+        return self.count_info[0]
+
+    @property
+    def count_is_exact(self):
+        return self.count_info[1]
+
+    @cached_property
+    def num_pages(self):
+        if not self.count_is_exact:
+            return None
+        return super().num_pages
+
+    def validate_number(self,number):
+        if self.count_is_exact:
+            return super().validate_number(number)
+        try:
+            number=int(number)
+        except (TypeError,ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number<1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self,number):
+        if self.count_is_exact:
+            return super().page(number)
+        number=self.validate_number(number)
+        bottom=(number-1)*self.per_page
+        object_list=list(self.object_list[bottom:bottom+self.per_page+1])
+        if not object_list and number>1:
+            raise EmptyPage("That page contains no results")
+        return LookaheadPage(object_list[:self.per_page],number,self,len(object_list)>self.per_page)
+
+    def get_page_range(self,page):
+        if self.count_is_exact:
+            return list(self.get_elided_page_range(page.number))
+        return list(range(max(1,page.number-2),page.number+(2 if page.has_next() else 1)))
+
+
+class CachedCountMixin:
+    """
+    ListView mixin using CachedCountPaginator and exposing an elided
+    "page_range" so templates do not render one link per page.
+    """
+    paginator_class=CachedCountPaginator
+    count_mode="capped"
+    count_limit=1000
+
+    def get_paginator(self,queryset,per_page,orphans=0,allow_empty_first_page=True,**kwargs):
+        return self.paginator_class(queryset,per_page,count_mode=self.count_mode,count_limit=self.count_limit,orphans=orphans,allow_empty_first_page=allow_empty_first_page,**kwargs)
+
+    def get_context_data(self,**kwargs):
+        context=super().get_context_data(**kwargs)
+        paginator=context.get("paginator")
+        if paginator is not None and context.get("page_obj") is not None:
+            context["page_range"]=paginator.get_page_range(context["page_obj"])
+        return context
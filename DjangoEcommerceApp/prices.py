@@ -0,0 +1,24 @@
+import re
+from decimal import Decimal,InvalidOperation
+
+PRICE_QUANTUM=Decimal("0.01")
+
+PRICE_RE=re.compile(r"-?(?:\d+(?:\.\d*)?|\.\d+)")
+
+
+def parse_price(value,default=None):
+    """
+    Decimal from user or legacy input such as "1,299", "₹ 499.50" or "90".
+    Returns `default` when no number can be read.
+    """
+    if value is None:
+        return default
+    if isinstance(value,Decimal):
+        return value.quantize(PRICE_QUANTUM)
+    match=PRICE_RE.search(str(value).replace(",",""))
+    if match is None:
+        return default
+    try:
+        return Decimal(match.group()).quantize(PRICE_QUANTUM)
+    except InvalidOperation:
+        return default
@@ -0,0 +1,100 @@
+from django.db.models import Min
+
+from DjangoEcommerceApp.models import Products,ProductMedia,ProductTags
+
+MAX_BATCH_SIZE=50
+
+DEFAULT_FIELDS=["name","price","image"]
+
+#API field: the Products columns it reads, joined in the same query
+COLUMN_FIELDS={
+    "name":["product_name"],
+    "url_slug":["url_slug"],
+    "brand":["brand"],
+    "price":["product_discount_price"],
+    "max_price":["product_max_price"],
+    "description":["product_description"],
+    "in_stock":["in_stock_total"],
+    "subcategory":["subcategories_id__title"],
+    "rating":["rating_summary__review_count","rating_summary__rating_total"],
+}
+
+#API fields loaded with one extra query over all the requested products
+RELATED_FIELDS=["image","tags"]
+
+
+class BatchError(ValueError):
+    pass
+
+
+def parse_ids(value):
+    ids=[]
+    for part in value.split(","):
+        part=part.strip()
+        if part=="":
+            continue
+        if not part.isdigit():
+            raise BatchError("Invalid product id: %s" % part)
+        if int(part) not in ids:
+            ids.append(int(part))
+        if len(ids)>MAX_BATCH_SIZE:
+            raise BatchError("At most %d product ids per request" % MAX_BATCH_SIZE)
+    if not ids:
+        raise BatchError("No product ids given")
+    return ids
+
+def parse_fields(value):
+    fields=[field.strip() for field in value.split(",") if field.strip()] if value else list(DEFAULT_FIELDS)
+    unknown=[field for field in fields if field not in COLUMN_FIELDS and field not in RELATED_FIELDS]
+    if unknown:
+        raise BatchError("Unknown fields: %s" % ", ".join(unknown))
+    return fields
+
+def column_value(field,row):
+    if field=="rating":
+        count=row["rating_summary__review_count"] or 0
+        return {"average":round(row["rating_summary__rating_total"]/count,1) if count else None,"count":count}
+    return row[COLUMN_FIELDS[field][0]]
+
+def primary_images(product_ids):
+    first_images=ProductMedia.objects.filter(product_id__in=product_ids,media_type=1,is_active=1).values("product_id").annotate(first_id=Min("id")).values("first_id")
+    return dict(ProductMedia.objects.filter(id__in=first_images).values_list("product_id","media_content"))
+
+def product_tags(product_ids):
+    tags={}
+    for product_id,title in ProductTags.objects.filter(product_id__in=product_ids,is_active=1).order_by("id").values_list("product_id","title"):
+        tags.setdefault(product_id,[]).append(title)
+    return tags
+
+def load_products(ids,fields):
+    """
+    ([product dicts in the order of `ids`], [ids that are missing or not
+    active]), reading only the columns behind `fields`: one query for the
+    products and one per related field.
+    """
+    columns=["id"]
+    for field in fields:
+        columns.extend(COLUMN_FIELDS.get(field,[]))
+    rows={row["id"]:row for row in Products.objects.filter(id__in=ids,is_active=1).values(*columns)}
+
+    related={}
+    if "image" in fields and rows:
+        related["image"]=primary_images(rows.keys())
+    if "tags" in fields and rows:
+        related["tags"]=product_tags(rows.keys())
+
+    products=[]
+    for product_id in ids:
+        row=rows.get(product_id)
+        if row is None:
+            continue
+        product={"id":product_id}
+        for field in fields:
+            if field=="image":
+                product[field]=related["image"].get(product_id)
+            elif field=="tags":
+                product[field]=related["tags"].get(product_id,[])
+            else:
+                product[field]=column_value(field,row)
+        products.append(product)
+    return products,[product_id for product_id in ids if product_id not in rows]
@@ -0,0 +1,89 @@
+from django.db import transaction
+
+from DjangoEcommerceApp.models import ProductDetails,ProductAbout,ProductTags
+from DjangoEcommerceApp.product_import import refresh_product_indexes
+from DjangoEcommerceApp.bulk_actions import raw_delete
+
+#Marks a form row that has no database row yet
+NEW_ROW_ID="blank"
+
+
+def update_product_fields(product,values):
+    """
+    Save only the Products fields whose value changed; returns their names.
+    """
+    changed=[]
+    for field,value in values.items():
+        if getattr(product,field)!=value:
+            setattr(product,field,value)
+            changed.append(field)
+    if changed:
+        product.save(update_fields=changed)
+    return changed
+
+def diff_rows(model,product,existing,submitted):
+    """
+    Rows to create and rows to update for submitted (id, {field: value})
+    pairs against the product's existing rows. Rows left out of the form
+    are kept, as are ids that belong to another product.
+    """
+    existing={str(row.id):row for row in existing}
+    created=[]
+    updated=[]
+    for row_id,values in submitted:
+        if row_id==NEW_ROW_ID:
+            created.append(model(product_id=product,**values))
+            continue
+        row=existing.get(row_id)
+        if row is None:
+            continue
+        if any(getattr(row,field)!=value for field,value in values.items()):
+            for field,value in values.items():
+                setattr(row,field,value)
+            updated.append(row)
+    return created,updated
+
+def sync_tags(product,titles):
+    """
+    Keep one existing row per wanted title, delete the others with one
+    DELETE and insert the missing titles with one INSERT.
+    """
+    wanted=list(dict.fromkeys(titles))
+    kept=set()
+    removed=[]
+    for tag in ProductTags.objects.filter(product_id=product).order_by("id"):
+        if tag.title in wanted and tag.title not in kept:
+            kept.add(tag.title)
+        else:
+            removed.append(tag.id)
+    if removed:
+        raw_delete(ProductTags.objects.filter(id__in=removed))
+    created=[ProductTags(product_id=product,title=title) for title in wanted if title not in kept]
+    ProductTags.objects.bulk_create(created)
+    return bool(removed or created)
+
+@transaction.atomic
+def apply_product_edit(product,values,details,about,tags):
+    """
+    Apply a submitted edit form with writes only for what changed. `details`
+    is [(id, title, title_details)], `about` is [(id, title)], with "blank"
+    as the id of new rows; rows with an empty title are ignored.
+    """
+    changed=update_product_fields(product,values)
+
+    children_changed=False
+    submitted_details=[(row_id,{"title":title,"title_details":title_details}) for row_id,title,title_details in details if title!=""]
+    submitted_about=[(row_id,{"title":title}) for row_id,title in about if title!=""]
+    for model,submitted,fields in ((ProductDetails,submitted_details,["title","title_details"]),(ProductAbout,submitted_about,["title"])):
+        created,updated=diff_rows(model,product,model.objects.filter(product_id=product),submitted)
+        if created:
+            model.objects.bulk_create(created)
+        if updated:
+            model.objects.bulk_update(updated,fields)
+        children_changed=children_changed or bool(created or updated)
+    children_changed=sync_tags(product,tags) or children_changed
+
+    #Bulk writes send no signals
+    if children_changed:
+        refresh_product_indexes([product.id])
+    return changed,children_changed
@@ -0,0 +1,251 @@
+import csv
+import json
+
+from django.db import connection,transaction,DatabaseError
+from django.utils.text import slugify
+
+from DjangoEcommerceApp.models import SubCategories,MerchantUser,Products,ProductMedia,ProductDetails,ProductAbout,ProductTags,ProductTransaction
+from DjangoEcommerceApp.prices import parse_price
+from DjangoEcommerceApp.search import index_products
+from DjangoEcommerceApp.facets import sync_product_facets
+from DjangoEcommerceApp.documents import invalidate_product_documents
+from DjangoEcommerceApp.tag_index import normalize_tag,sync_product_tags
+
+INITIAL_STOCK_DESCRIPTION="Intially Item Added in Stocks"
+
+#Separators for list columns in CSV input; JSONL rows use real lists
+CSV_LIST_SEPARATOR="|"
+CSV_DETAIL_SEPARATOR="="
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def read_rows(stream,format):
+    """
+    (line number, dict) for every record of a CSV file with a header row
+    or of a JSON Lines file, read lazily.
+    """
+    if format=="csv":
+        reader=csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num,row
+    elif format=="jsonl":
+        for line_number,line in enumerate(stream,1):
+            if not line.strip():
+                continue
+            try:
+                row=json.loads(line)
+            except ValueError as e:
+                yield line_number,ImportRowError("Invalid JSON: %s" % e)
+                continue
+            yield line_number,row if isinstance(row,dict) else ImportRowError("Expected a JSON object")
+    else:
+        raise ValueError("Unknown format %r" % format)
+
+
+class ProductLookups:
+    """
+    Subcategories and merchants by id, title or username, loaded once so
+    that rows resolve their foreign keys without queries.
+    """
+    def __init__(self):
+        self.subcategories={}
+        for subcategory_id,title in SubCategories.objects.values_list("id","title"):
+            self.subcategories.setdefault(title.strip().lower(),subcategory_id)
+            self.subcategories[str(subcategory_id)]=subcategory_id
+        self.merchants={}
+        for merchant_id,username in MerchantUser.objects.values_list("id","auth_user_id__username"):
+            self.merchants[username.lower()]=merchant_id
+            self.merchants[str(merchant_id)]=merchant_id
+
+    def subcategory(self,value):
+        subcategory_id=self.subcategories.get(str(value or "").strip().lower())
+        if subcategory_id is None:
+            raise ImportRowError("Unknown subcategory %r" % value)
+        return subcategory_id
+
+    def merchant(self,value):
+        merchant_id=self.merchants.get(str(value or "").strip().lower())
+        if merchant_id is None:
+            raise ImportRowError("Unknown merchant %r" % value)
+        return merchant_id
+
+
+def split_list(value):
+    if value is None or value=="":
+        return []
+    if isinstance(value,list):
+        return value
+    return [item.strip() for item in str(value).split(CSV_LIST_SEPARATOR) if item.strip()]
+
+def parse_media(value):
+    media=[]
+    for item in split_list(value):
+        if isinstance(item,dict):
+            media.append((str(item.get("media_type",1)),item.get("url") or item.get("media_content") or ""))
+        else:
+            media.append(("1",str(item)))
+    return [(media_type,url) for media_type,url in media if url]
+
+def parse_details(value):
+    if isinstance(value,dict):
+        return [(str(title),str(details)) for title,details in value.items()]
+    details=[]
+    for item in split_list(value):
+        if isinstance(item,(list,tuple)) and len(item)==2:
+            details.append((str(item[0]),str(item[1])))
+        elif isinstance(item,str) and CSV_DETAIL_SEPARATOR in item:
+            title,details_value=item.split(CSV_DETAIL_SEPARATOR,1)
+            details.append((title.strip(),details_value.strip()))
+        else:
+            raise ImportRowError("Invalid detail %r, expected title%svalue" % (item,CSV_DETAIL_SEPARATOR))
+    return details
+
+def parse_tags(value):
+    #Titles that normalize to the same tag are kept once, first spelling wins
+    titles=value if isinstance(value,list) else str(value or "").split(",")
+    tags={}
+    for title in titles:
+        title=str(title).strip()
+        if normalize_tag(title):
+            tags.setdefault(normalize_tag(title),title)
+    return list(tags.values())
+
+def parse_row(row,lookups,default_merchant=None):
+    """
+    A product spec (the Products field values plus its child rows) from
+    one input record; raises ImportRowError when the record is unusable.
+    """
+    name=str(row.get("product_name") or "").strip()
+    if not name:
+        raise ImportRowError("product_name is required")
+    try:
+        in_stock_total=int(row.get("in_stock_total") or 0)
+    except (TypeError,ValueError):
+        raise ImportRowError("Invalid in_stock_total %r" % row.get("in_stock_total"))
+    max_price=parse_price(row.get("product_max_price"))
+    discount_price=parse_price(row.get("product_discount_price"),max_price)
+    if max_price is None or discount_price is None:
+        raise ImportRowError("A product price is required")
+
+    return {
+        "product":dict(
+            product_name=name[:255],
+            url_slug=(str(row.get("url_slug") or "").strip() or slugify(name))[:255],
+            brand=str(row.get("brand") or "").strip()[:255],
+            subcategories_id_id=lookups.subcategory(row.get("subcategory")),
+            added_by_merchant_id=lookups.merchant(row.get("merchant") or default_merchant),
+            product_max_price=max_price,
+            product_discount_price=discount_price,
+            product_description=str(row.get("product_description") or ""),
+            product_long_description=str(row.get("product_long_description") or ""),
+            in_stock_total=in_stock_total,
+        ),
+        "media":parse_media(row.get("media")),
+        "details":parse_details(row.get("details")),
+        "about":[str(about) for about in split_list(row.get("about"))],
+        "tags":parse_tags(row.get("tags")),
+    }
+
+def bulk_create_with_ids(model,rows,batch_size=None):
+    """
+    bulk_create that leaves the database-assigned id on every row, also on
+    backends whose bulk INSERT returns nothing. On SQLite each batch is one
+    multi-row INSERT, whose rows get consecutive ids ending at
+    last_insert_rowid(); ids of deleted rows are never reused.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(rows,batch_size=batch_size)
+    fields=[field for field in model._meta.concrete_fields if not field.primary_key]
+    if connection.vendor!="sqlite":
+        for row in rows:
+            for value,field in zip(model._base_manager._insert([row],fields=fields,returning_fields=model._meta.db_returning_fields,using=connection.alias)[0],model._meta.db_returning_fields):
+                setattr(row,field.attname,value)
+            row._state.adding=False
+            row._state.db=connection.alias
+        return rows
+    max_batch_size=connection.ops.bulk_batch_size(fields,rows)
+    batch_size=min(batch_size,max_batch_size) if batch_size else max_batch_size
+    with connection.cursor() as cursor:
+        for start in range(0,len(rows),batch_size):
+            batch=rows[start:start+batch_size]
+            model.objects.bulk_create(batch,batch_size=len(batch))
+            cursor.execute("SELECT last_insert_rowid()")
+            last_id=cursor.fetchone()[0]
+            for offset,row in enumerate(batch):
+                row.id=last_id-len(batch)+1+offset
+    return rows
+
+def refresh_product_indexes(product_ids):
+    """
+    Bring the search index, facet counts, tag index and API documents up to
+    date for products written with bulk_create or update(), which send no
+    signals.
+    """
+    index_products(product_ids)
+    sync_product_facets(product_ids)
+    sync_product_tags(product_ids)
+    invalidate_product_documents(product_id__in=product_ids)
+
+@transaction.atomic
+def bulk_create_products(specs,batch_size=500):
+    """
+    Insert products and all their child rows with one bulk INSERT per
+    table; returns the new products in the order of `specs`.
+    """
+    products=[Products(**spec["product"]) for spec in specs]
+    bulk_create_with_ids(Products,products,batch_size=batch_size)
+
+    media,details,about,tags,transactions=[],[],[],[],[]
+    for product,spec in zip(products,specs):
+        media.extend(ProductMedia(product_id=product,media_type=media_type,media_content=url) for media_type,url in spec["media"])
+        details.extend(ProductDetails(product_id=product,title=title,title_details=value) for title,value in spec["details"])
+        about.extend(ProductAbout(product_id=product,title=title) for title in spec["about"])
+        tags.extend(ProductTags(product_id=product,title=title) for title in spec["tags"])
+        transactions.append(ProductTransaction(product_id=product,transaction_type=1,transaction_product_count=product.in_stock_total,transaction_description=INITIAL_STOCK_DESCRIPTION))
+    for model,rows in ((ProductMedia,media),(ProductDetails,details),(ProductAbout,about),(ProductTags,tags),(ProductTransaction,transactions)):
+        model.objects.bulk_create(rows,batch_size=batch_size)
+
+    refresh_product_indexes([product.id for product in products])
+    return products
+
+def import_products(rows,lookups,batch_size=1000,default_merchant=None,progress=None,error=None):
+    """
+    Import (line number, record) pairs in chunks of batch_size, each chunk
+    in its own transaction. Bad records are reported through `error` and
+    skipped; a chunk that fails to write is reported line by line and
+    rolled back on its own. Returns (imported, failed).
+    """
+    imported=failed=0
+    chunk=[]
+
+    def flush():
+        nonlocal imported,failed
+        try:
+            bulk_create_products([spec for line_number,spec in chunk])
+            imported+=len(chunk)
+        except (DatabaseError,ValueError) as e:
+            failed+=len(chunk)
+            if error is not None:
+                for line_number,spec in chunk:
+                    error(line_number,"Not imported, chunk failed: %s" % e)
+        chunk.clear()
+        if progress is not None:
+            progress(imported,failed)
+
+    for line_number,row in rows:
+        try:
+            if isinstance(row,Exception):
+                raise row
+            chunk.append((line_number,parse_row(row,lookups,default_merchant)))
+        except ImportRowError as e:
+            failed+=1
+            if error is not None:
+                error(line_number,str(e))
+        if len(chunk)>=batch_size:
+            flush()
+    if chunk:
+        flush()
+    return imported,failed
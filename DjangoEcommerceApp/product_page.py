@@ -0,0 +1,74 @@
+from django.db.models import Prefetch
+
+from DjangoEcommerceApp.models import Products,ProductMedia,ProductDetails,ProductAbout,ProductTags,ProductVarientItems,ProductQuestions,ProductReviews
+from DjangoEcommerceApp.reviews import review_feed,review_data,customer_name
+
+LATEST_QUESTIONS=5
+TOP_REVIEWS=5
+
+
+def product_page_queryset():
+    active=dict(is_active=1)
+    return Products.objects.select_related("subcategories_id__category_id","added_by_merchant","rating_summary").prefetch_related(
+        Prefetch("productmedia_set",queryset=ProductMedia.objects.filter(**active).order_by("id"),to_attr="active_media"),
+        Prefetch("productdetails_set",queryset=ProductDetails.objects.filter(**active).order_by("id"),to_attr="active_details"),
+        Prefetch("productabout_set",queryset=ProductAbout.objects.filter(**active).order_by("id"),to_attr="active_about"),
+        Prefetch("producttags_set",queryset=ProductTags.objects.filter(**active).order_by("id"),to_attr="active_tags"),
+        Prefetch("productvarientitems_set",queryset=ProductVarientItems.objects.select_related("product_varient_id").order_by("product_varient_id","id"),to_attr="variant_items"),
+    )
+
+def rating_summary(product):
+    summary=getattr(product,"rating_summary",None)
+    if summary is None:
+        return {"average":None,"count":0,"histogram":[[stars,0] for stars in range(5,0,-1)]}
+    return {"average":summary.average_rating(),"count":summary.review_count,"histogram":[list(item) for item in summary.histogram()]}
+
+def catalog_data(product):
+    """
+    The catalog part of a product page, from a product loaded with
+    product_page_queryset(); it only changes when the product, its
+    category, merchant or child rows do.
+    """
+    subcategory=product.subcategories_id
+    merchant=product.added_by_merchant
+    variants={}
+    for item in product.variant_items:
+        variants.setdefault(item.product_varient_id.title,[]).append(item.title)
+    return {
+        "id":product.id,
+        "name":product.product_name,
+        "url_slug":product.url_slug,
+        "brand":product.brand,
+        "max_price":product.product_max_price,
+        "discount_price":product.product_discount_price,
+        "description":product.product_description,
+        "long_description":product.product_long_description,
+        "in_stock_total":product.in_stock_total,
+        "is_active":product.is_active,
+        "category":{"id":subcategory.category_id.id,"title":subcategory.category_id.title},
+        "subcategory":{"id":subcategory.id,"title":subcategory.title},
+        "merchant":{"id":merchant.id,"company_name":merchant.company_name},
+        "media":[{"id":media.id,"media_type":media.media_type,"url":media.media_content.name} for media in product.active_media],
+        "details":[{"title":detail.title,"value":detail.title_details} for detail in product.active_details],
+        "about":[about.title for about in product.active_about],
+        "tags":[tag.title for tag in product.active_tags],
+        "variants":[{"title":title,"items":items} for title,items in variants.items()],
+    }
+
+def load_product_page(product_id):
+    """
+    Everything a product page shows, as plain dicts and lists, in a fixed
+    number of queries: the product with its category, merchant and rating
+    summary, one query per related list, and the latest questions and
+    most helpful reviews. Raises Products.DoesNotExist.
+    """
+    product=product_page_queryset().get(id=product_id)
+    questions=ProductQuestions.objects.filter(product_id=product.id,is_active=1).select_related("user_id__auth_user_id").order_by("-created_at","-id")[:LATEST_QUESTIONS]
+    reviews=review_feed(product.id,"helpful",per_page=TOP_REVIEWS)
+
+    page=catalog_data(product)
+    page["rating"]=rating_summary(product)
+    page["questions"]=[{"id":question.id,"question":question.question,"answer":question.answer,"user":customer_name(question.user_id),"created_at":question.created_at} for question in questions]
+    page["reviews"]=[review_data(review) for review in reviews]
+    page["more_reviews_cursor"]=reviews.next_cursor
+    return page
@@ -0,0 +1,113 @@
+from decimal import Decimal,InvalidOperation
+
+from django.db import connection,transaction
+from django.db.models import F
+
+from DjangoEcommerceApp.models import ProductReviews,ProductRatingSummary
+
+
+SUMMARY_FIELDS=["review_count","rating_total","stars_1","stars_2","stars_3","stars_4","stars_5"]
+
+
+def review_stars(rating):
+    """
+    Star rating 1-5 stored as text in ProductReviews.rating, or None when
+    it cannot be read.
+    """
+    try:
+        stars=int(Decimal(str(rating).strip()).to_integral_value())
+    except (InvalidOperation,ValueError):
+        return None
+    return min(max(stars,1),5)
+
+def review_contribution(product_id,rating,is_active):
+    #(product, stars) the review is counted under, or None
+    if product_id is None or is_active!=1:
+        return None
+    stars=review_stars(rating)
+    if stars is None:
+        return None
+    return (product_id,stars)
+
+def summary_deltas(contribution,sign):
+    product_id,stars=contribution
+    return {"review_count":F("review_count")+sign,"rating_total":F("rating_total")+sign*stars,"stars_%d" % stars:F("stars_%d" % stars)+sign}
+
+def locked_values(queryset,*fields):
+    """
+    values_list(*fields).first() read under a row lock, to be called inside
+    the transaction that writes the row. SQLite has no SELECT FOR UPDATE, so
+    a no-op UPDATE takes the database write lock before the read instead.
+    """
+    if connection.features.has_select_for_update:
+        return queryset.select_for_update().values_list(*fields).first()
+    queryset.update(is_active=F("is_active"))
+    return queryset.values_list(*fields).first()
+
+def remember_review_rating(review):
+    #The stored row is what the summary currently counts, whatever the instance holds now
+    review._counted_rating=None
+    if review.pk is not None:
+        row=locked_values(ProductReviews.objects.filter(pk=review.pk),"product_id","rating","is_active")
+        if row is not None:
+            review._counted_rating=review_contribution(*row)
+
+def apply_review_change(review):
+    previous=getattr(review,"_counted_rating",None)
+    current=review_contribution(review.product_id_id,review.rating,review.is_active)
+    review._counted_rating=current
+    if previous==current:
+        return
+    if previous is not None:
+        ProductRatingSummary.objects.filter(product_id=previous[0]).update(**summary_deltas(previous,-1))
+    if current is not None:
+        ProductRatingSummary.objects.bulk_create([ProductRatingSummary(product_id_id=current[0])],ignore_conflicts=True)
+        ProductRatingSummary.objects.filter(product_id=current[0]).update(**summary_deltas(current,1))
+
+def apply_review_removal(review):
+    #Only ever decrements: a cascade from a deleted product must not recreate its summary
+    counted=review_contribution(review.product_id_id,review.rating,review.is_active)
+    if counted is not None:
+        ProductRatingSummary.objects.filter(product_id=counted[0]).update(**summary_deltas(counted,-1))
+
+def computed_summaries(product_ids=None):
+    """
+    {product_id: {field: value}} recomputed from the active reviews.
+    """
+    reviews=ProductReviews.objects.filter(is_active=1)
+    if product_ids is not None:
+        reviews=reviews.filter(product_id__in=product_ids)
+    summaries={}
+    for product_id,rating in reviews.values_list("product_id","rating").order_by().iterator():
+        stars=review_stars(rating)
+        if stars is None:
+            continue
+        summary=summaries.setdefault(product_id,dict.fromkeys(SUMMARY_FIELDS,0))
+        summary["review_count"]+=1
+        summary["rating_total"]+=stars
+        summary["stars_%d" % stars]+=1
+    return summaries
+
+@transaction.atomic
+def reconcile_rating_summaries(dry_run=False):
+    """
+    Compare every stored summary with the reviews and fix the ones that
+    drifted. Returns the product ids that were wrong.
+    """
+    expected=computed_summaries()
+    empty=dict.fromkeys(SUMMARY_FIELDS,0)
+    stored={summary.product_id_id:summary for summary in ProductRatingSummary.objects.select_for_update()}
+    drifted=[]
+    for product_id in sorted(set(expected)|set(stored)):
+        values=expected.get(product_id,empty)
+        summary=stored.get(product_id)
+        if summary is not None and all(getattr(summary,field)==value for field,value in values.items()):
+            continue
+        drifted.append(product_id)
+        if dry_run:
+            continue
+        if summary is None:
+            ProductRatingSummary.objects.create(product_id_id=product_id,**values)
+        else:
+            ProductRatingSummary.objects.filter(id=summary.id).update(**values)
+    return drifted
@@ -0,0 +1,57 @@
+from django.db.models import F
+
+from DjangoEcommerceApp.models import ProductReviews,ProductReviewVoting
+from DjangoEcommerceApp.pagination import KeysetPaginator
+from DjangoEcommerceApp.ratings import locked_values
+
+#Feed sort name: ordering, each served by a (product_id, is_active, key, id) index
+REVIEW_FEED_ORDERINGS={
+    "helpful":"-helpful_votes",
+    "recent":"-created_at",
+    "rating":"-rating",
+}
+
+REVIEW_FEED_PAGE_SIZE=10
+
+
+def customer_name(customer):
+    user=customer.auth_user_id
+    return user.get_full_name() or user.username
+
+def review_data(review):
+    return {"id":review.id,"user":customer_name(review.user_id),"rating":review.rating,"review":review.review,"helpful_votes":review.helpful_votes,"created_at":review.created_at}
+
+def counted_review(review_id,is_active):
+    return review_id if is_active==1 else None
+
+def remember_vote(vote):
+    vote._counted_review=None
+    if vote.pk is not None:
+        row=locked_values(ProductReviewVoting.objects.filter(pk=vote.pk),"product_review_id","is_active")
+        if row is not None:
+            vote._counted_review=counted_review(*row)
+
+def apply_vote_change(vote):
+    previous=getattr(vote,"_counted_review",None)
+    current=counted_review(vote.product_review_id_id,vote.is_active)
+    vote._counted_review=current
+    if previous==current:
+        return
+    if previous is not None:
+        ProductReviews.objects.filter(id=previous).update(helpful_votes=F("helpful_votes")-1)
+    if current is not None:
+        ProductReviews.objects.filter(id=current).update(helpful_votes=F("helpful_votes")+1)
+
+def apply_vote_removal(vote):
+    review_id=counted_review(vote.product_review_id_id,vote.is_active)
+    if review_id is not None:
+        ProductReviews.objects.filter(id=review_id).update(helpful_votes=F("helpful_votes")-1)
+
+def review_feed(product_id,sort="helpful",cursor=None,per_page=REVIEW_FEED_PAGE_SIZE):
+    """
+    One keyset page of a product's active reviews. Each page is a range
+    scan on the matching index, however many reviews and votes there are.
+    """
+    reviews=ProductReviews.objects.filter(product_id=product_id,is_active=1).select_related("user_id__auth_user_id")
+    reviews=reviews.order_by(REVIEW_FEED_ORDERINGS.get(sort,REVIEW_FEED_ORDERINGS["helpful"]))
+    return KeysetPaginator(reviews,per_page).page(cursor)
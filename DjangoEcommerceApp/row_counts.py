@@ -0,0 +1,71 @@
+from django.db import connections
+
+from DjangoEcommerceApp.models import Categories,SubCategories,CustomUser,MerchantUser,StaffUser,CustomerUser,Products,ProductTags,TableRowCount
+
+#Tables whose row count and write version are maintained by triggers
+COUNTED_MODELS=[Categories,SubCategories,CustomUser,MerchantUser,StaffUser,CustomerUser,Products,ProductTags]
+
+
+def counted_tables():
+    return [model._meta.db_table for model in COUNTED_MODELS]
+
+def counters_enabled(using="default"):
+    return connections[using].vendor=="sqlite"
+
+ROW_COUNTER_EVENTS=(("insert","+1"),("delete","-1"),("update",""))
+
+
+def create_row_counters(cursor,tables,counter_table):
+    #Plain table names, so migrations can call this with their own frozen list
+    for table in tables:
+        cursor.execute('INSERT OR IGNORE INTO "%s"(table_name,row_count,version) SELECT %%s,COUNT(*),0 FROM "%s"' % (counter_table,table),[table])
+        for event,delta in ROW_COUNTER_EVENTS:
+            cursor.execute(
+                'CREATE TRIGGER IF NOT EXISTS "%s_%s_rowcount" AFTER %s ON "%s" BEGIN '
+                'UPDATE "%s" SET row_count=row_count%s,version=version+1 WHERE table_name=\'%s\'; END'
+                % (table,event,event.upper(),table,counter_table,delta,table)
+            )
+
+def drop_row_counters(cursor,tables):
+    for table in tables:
+        for event,delta in ROW_COUNTER_EVENTS:
+            cursor.execute('DROP TRIGGER IF EXISTS "%s_%s_rowcount"' % (table,event))
+
+def install_row_counters(using="default"):
+    """
+    Seed a TableRowCount row per counted table and (re)create the triggers
+    that keep it current. The 0007 migration creates them and drops them
+    when unapplied; this runs after every migrate as well, because SQLite
+    table rebuilds during migrations drop the triggers of the rebuilt table.
+    """
+    if not counters_enabled(using):
+        return
+    connection=connections[using]
+    counter_table=TableRowCount._meta.db_table
+    #Migrated back to before 0007: there is nothing to count into
+    if counter_table not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        create_row_counters(cursor,counted_tables(),counter_table)
+
+def refresh_row_counts(using="default"):
+    if not counters_enabled(using):
+        return {}
+    install_row_counters(using)
+    counter_table=TableRowCount._meta.db_table
+    counts={}
+    with connections[using].cursor() as cursor:
+        for table in counted_tables():
+            cursor.execute('SELECT COUNT(*) FROM "%s"' % table)
+            counts[table]=cursor.fetchone()[0]
+            cursor.execute('UPDATE "%s" SET row_count=%%s,version=version+1 WHERE table_name=%%s' % counter_table,[counts[table],table])
+    return counts
+
+def table_versions(tables,using="default"):
+    """
+    {table: (row_count, version)} for the counted tables among `tables`.
+    """
+    if not counters_enabled(using):
+        return {}
+    rows=TableRowCount.objects.using(using).filter(table_name__in=tables).values_list("table_name","row_count","version")
+    return {table:(row_count,version) for table,row_count,version in rows}
@@ -0,0 +1,138 @@
+import re
+
+from django.db import connection
+from django.db.models import Q,Max,Value,FloatField
+
+from DjangoEcommerceApp.models import CustomUser,Products,ProductTags
+
+PRODUCT_SEARCH_TABLE="DjangoEcommerceApp_productsearch"
+
+#Column weights for bm25(): name, brand, description, long description, tags
+PRODUCT_SEARCH_WEIGHTS=(10.0,5.0,2.0,1.0,3.0)
+
+PRODUCT_SEARCH_ROWS_SQL='''
+    SELECT p.id,p.product_name,p.brand,p.product_description,p.product_long_description,
+        COALESCE((SELECT group_concat(t.title,' ') FROM "{tags}" t WHERE t.product_id_id=p.id AND t.is_active=1),'')
+    FROM "{products}" p
+'''.format(tags=ProductTags._meta.db_table,products=Products._meta.db_table)
+
+PRODUCT_SEARCH_INSERT_SQL='INSERT INTO "%s"(rowid,product_name,brand,product_description,product_long_description,tags) ' % PRODUCT_SEARCH_TABLE+PRODUCT_SEARCH_ROWS_SQL
+
+USER_SEARCH_TABLE="DjangoEcommerceApp_usersearch"
+
+USER_SEARCH_INSERT_SQL='INSERT INTO "%s"(rowid,first_name,last_name,email,username) SELECT p.id,p.first_name,p.last_name,p.email,p.username FROM "%s" p' % (USER_SEARCH_TABLE,CustomUser._meta.db_table)
+
+
+def search_enabled():
+    return connection.vendor=="sqlite"
+
+def build_match_query(text):
+    #Every word must match, each as a prefix: "red"* "sho"*
+    return " ".join('"%s"*' % token for token in re.findall(r"[^\W_]+",text))
+
+def index_row(table,insert_sql,row_id):
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM "%s" WHERE rowid=%%s' % table,[row_id])
+        cursor.execute(insert_sql+" WHERE p.id=%s",[row_id])
+
+def index_rows(table,insert_sql,row_ids,batch_size=500):
+    if not search_enabled():
+        return
+    row_ids=list(row_ids)
+    with connection.cursor() as cursor:
+        for start in range(0,len(row_ids),batch_size):
+            batch=row_ids[start:start+batch_size]
+            placeholders=",".join(["%s"]*len(batch))
+            cursor.execute('DELETE FROM "%s" WHERE rowid IN (%s)' % (table,placeholders),batch)
+            cursor.execute(insert_sql+" WHERE p.id IN (%s)" % placeholders,batch)
+
+def remove_row(table,row_id):
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM "%s" WHERE rowid=%%s' % table,[row_id])
+
+def remove_rows(table,row_ids,batch_size=500):
+    if not search_enabled():
+        return
+    row_ids=list(row_ids)
+    with connection.cursor() as cursor:
+        for start in range(0,len(row_ids),batch_size):
+            batch=row_ids[start:start+batch_size]
+            cursor.execute('DELETE FROM "%s" WHERE rowid IN (%s)' % (table,",".join(["%s"]*len(batch))),batch)
+
+def rebuild_table(table,insert_sql,model,batch_size,progress):
+    if not search_enabled():
+        return 0
+    last_id=model.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+    indexed=0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM "%s"' % table)
+        for start in range(0,last_id,batch_size):
+            cursor.execute(insert_sql+" WHERE p.id>%s AND p.id<=%s",[start,start+batch_size])
+            indexed+=cursor.rowcount
+            if progress is not None:
+                progress(indexed,min(start+batch_size,last_id),last_id)
+        cursor.execute('INSERT INTO "%s"("%s") VALUES (\'optimize\')' % (table,table))
+    return indexed
+
+def index_product(product_id):
+    index_row(PRODUCT_SEARCH_TABLE,PRODUCT_SEARCH_INSERT_SQL,product_id)
+
+def index_products(product_ids):
+    index_rows(PRODUCT_SEARCH_TABLE,PRODUCT_SEARCH_INSERT_SQL,product_ids)
+
+def remove_product(product_id):
+    remove_row(PRODUCT_SEARCH_TABLE,product_id)
+
+def remove_products(product_ids):
+    remove_rows(PRODUCT_SEARCH_TABLE,product_ids)
+
+def rebuild_product_index(batch_size=10000,progress=None):
+    return rebuild_table(PRODUCT_SEARCH_TABLE,PRODUCT_SEARCH_INSERT_SQL,Products,batch_size,progress)
+
+def index_user(user_id):
+    index_row(USER_SEARCH_TABLE,USER_SEARCH_INSERT_SQL,user_id)
+
+def remove_user(user_id):
+    remove_row(USER_SEARCH_TABLE,user_id)
+
+def rebuild_user_index(batch_size=10000,progress=None):
+    return rebuild_table(USER_SEARCH_TABLE,USER_SEARCH_INSERT_SQL,CustomUser,batch_size,progress)
+
+def search_products(queryset,text):
+    """
+    Restrict a Products queryset to rows matching the full-text index and
+    expose the BM25 score as "search_rank" (lower is better) for ordering.
+    """
+    match=build_match_query(text)
+    if not search_enabled() or match=="":
+        queryset=queryset.filter(Q(product_name__contains=text) | Q(product_description__contains=text))
+        return queryset.annotate(search_rank=Value(0.0,output_field=FloatField()))
+
+    table=PRODUCT_SEARCH_TABLE
+    weights=",".join(str(weight) for weight in PRODUCT_SEARCH_WEIGHTS)
+    return queryset.extra(
+        select={"search_rank":'bm25("%s",%s)' % (table,weights)},
+        tables=[table],
+        where=['"%s".rowid="%s"."id"' % (table,Products._meta.db_table),'"%s" MATCH %%s' % table],
+        params=[match],
+    )
+
+def search_profiles(queryset,text):
+    """
+    Restrict a StaffUser/MerchantUser/CustomerUser queryset to profiles whose
+    user name, email or username contains every word as a prefix.
+    """
+    match=build_match_query(text)
+    if not search_enabled() or match=="":
+        return queryset.filter(Q(auth_user_id__first_name__contains=text) | Q(auth_user_id__last_name__contains=text) | Q(auth_user_id__email__contains=text) | Q(auth_user_id__username__contains=text))
+
+    table=USER_SEARCH_TABLE
+    return queryset.extra(
+        tables=[table],
+        where=['"%s".rowid="%s"."auth_user_id_id"' % (table,queryset.model._meta.db_table),'"%s" MATCH %%s' % table],
+        params=[match],
+    )
@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models import Case,When,F,Max,Sum,OuterRef,Subquery,IntegerField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from DjangoEcommerceApp.models import Products,ProductTransaction,StockSnapshot
+
+#Products snapshotted per transaction by compact_stock_ledger
+SNAPSHOT_BATCH_SIZE=1000
+
+#BUY rows add to the stock, SELL rows take from it
+SIGNED_COUNT=Case(When(transaction_type="1",then=F("transaction_product_count")),default=-F("transaction_product_count"),output_field=IntegerField())
+
+
+def latest_snapshots(product_ids,when=None):
+    """
+    {product id: the newest StockSnapshot taken at or before `when`}.
+    """
+    snapshots=StockSnapshot.objects.filter(product_id__in=product_ids)
+    if when is not None:
+        snapshots=snapshots.filter(as_of__lte=when)
+    newest=snapshots.filter(product_id=OuterRef("product_id")).order_by("-as_of","-last_transaction_id").values("id")[:1]
+    return {snapshot.product_id_id:snapshot for snapshot in snapshots.filter(id=Subquery(newest))}
+
+def ledger_tail(product_ids,when=None):
+    """
+    The ledger rows of the products that no snapshot (taken at or before
+    `when`) covers yet.
+    """
+    last_covered=StockSnapshot.objects.filter(product_id=OuterRef("product_id"))
+    if when is not None:
+        last_covered=last_covered.filter(as_of__lte=when)
+    last_covered=last_covered.order_by("-as_of","-last_transaction_id").values("last_transaction_id")[:1]
+    rows=ProductTransaction.objects.filter(product_id__in=product_ids)
+    if when is not None:
+        rows=rows.filter(created_at__lte=when)
+    return rows.annotate(covered=Coalesce(Subquery(last_covered),0)).filter(id__gt=F("covered"))
+
+def ledger_stocks(product_ids,when=None):
+    """
+    {product id: stock according to the ledger} at `when` (default now),
+    read as the nearest snapshot plus the sum of the rows after it.
+    """
+    product_ids=list(product_ids)
+    stocks={product_id:0 for product_id in product_ids}
+    for product_id,snapshot in latest_snapshots(product_ids,when).items():
+        stocks[product_id]=snapshot.stock
+    for product_id,delta in ledger_tail(product_ids,when).values_list("product_id").annotate(delta=Sum(SIGNED_COUNT)).order_by():
+        stocks[product_id]+=delta
+    return stocks
+
+def stock_at(product_id,when=None):
+    return ledger_stocks([product_id],when)[product_id]
+
+def stock_drift(product_ids):
+    """
+    {product id: (in_stock_total, ledger stock)} for the products whose
+    stock column disagrees with their ledger.
+    """
+    stocks=ledger_stocks(product_ids)
+    drift={}
+    for product_id,in_stock_total in Products.objects.filter(id__in=product_ids).values_list("id","in_stock_total"):
+        if in_stock_total!=stocks[product_id]:
+            drift[product_id]=(in_stock_total,stocks[product_id])
+    return drift
+
+@transaction.atomic
+def snapshot_products(product_ids,until=None):
+    """
+    Add a snapshot for every product with ledger rows created before
+    `until` that no snapshot covers; returns the number added.
+    """
+    tail=ledger_tail(product_ids)
+    if until is not None:
+        tail=tail.filter(created_at__lt=until)
+    tails=list(tail.values_list("product_id").annotate(delta=Sum(SIGNED_COUNT),last_id=Max("id"),last_at=Max("created_at")).order_by())
+    if not tails:
+        return 0
+    previous=latest_snapshots([product_id for product_id,delta,last_id,last_at in tails])
+    StockSnapshot.objects.bulk_create([
+        StockSnapshot(product_id_id=product_id,stock=(previous[product_id].stock if product_id in previous else 0)+delta,last_transaction_id=last_id,as_of=last_at)
+        for product_id,delta,last_id,last_at in tails
+    ])
+    return len(tails)
+
+def compact_stock_ledger(until=None,batch_size=SNAPSHOT_BATCH_SIZE,progress=None):
+    """
+    Snapshot the ledger of every product, batch_size products per
+    transaction. Run periodically so point-in-time queries only ever sum a
+    short tail. Returns the number of snapshots added.
+    """
+    until=until or timezone.now()
+    product_ids=Products.objects.order_by("id").values_list("id",flat=True)
+    last_id=0
+    added=0
+    while True:
+        batch=list(product_ids.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return added
+        added+=snapshot_products(batch,until)
+        last_id=batch[-1]
+        if progress is not None:
+            progress(last_id,added)
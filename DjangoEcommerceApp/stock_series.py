@@ -0,0 +1,115 @@
+import datetime
+
+from django.core.cache import cache
+from django.db.models import Case,When,F,Sum,IntegerField
+from django.db.models.functions import TruncHour,TruncDay,TruncWeek
+from django.utils import timezone
+
+from DjangoEcommerceApp.models import ProductTransaction
+from DjangoEcommerceApp.stock_ledger import stock_at
+
+#Resolution: (SQL truncation, bucket length)
+RESOLUTIONS={
+    "hour":(TruncHour,datetime.timedelta(hours=1)),
+    "day":(TruncDay,datetime.timedelta(days=1)),
+    "week":(TruncWeek,datetime.timedelta(weeks=1)),
+}
+DEFAULT_BUCKETS=30
+MAX_BUCKETS=2000
+
+#Closed buckets never change, the timeout only bounds the cache size
+SERIES_CACHE_TIMEOUT=60*60*24*7
+
+BOUGHT=Sum(Case(When(transaction_type="1",then=F("transaction_product_count")),default=0,output_field=IntegerField()))
+SOLD=Sum(Case(When(transaction_type="2",then=F("transaction_product_count")),default=0,output_field=IntegerField()))
+
+
+class SeriesError(ValueError):
+    pass
+
+
+def bucket_start(moment,resolution):
+    #Same boundaries as the SQL truncation, in the current time zone
+    moment=timezone.localtime(moment).replace(minute=0,second=0,microsecond=0)
+    if resolution!="hour":
+        moment=moment.replace(hour=0)
+    if resolution=="week":
+        moment-=datetime.timedelta(days=moment.weekday())
+    return moment
+
+def bucket_starts(start,end,resolution):
+    step=RESOLUTIONS[resolution][1]
+    buckets=[]
+    bucket=bucket_start(start,resolution)
+    while bucket<end:
+        if len(buckets)==MAX_BUCKETS:
+            raise SeriesError("At most %d buckets, use a coarser resolution or a shorter range" % MAX_BUCKETS)
+        buckets.append(bucket)
+        bucket+=step
+    return buckets
+
+def ledger_buckets(product_id,resolution,start,end):
+    """
+    {bucket start: (units bought, units sold)} for the non-empty buckets
+    between start and end, with one grouped query over the ledger.
+    """
+    trunc=RESOLUTIONS[resolution][0]
+    rows=ProductTransaction.objects.filter(product_id=product_id,created_at__gte=start,created_at__lt=end)
+    rows=rows.annotate(bucket=trunc("created_at")).values("bucket").annotate(bought=BOUGHT,sold=SOLD).order_by()
+    return {row["bucket"]:(row["bought"],row["sold"]) for row in rows}
+
+def series_cache_key(product_id,resolution,bucket):
+    return "stock_series:%d:%s:%d" % (product_id,resolution,bucket.timestamp())
+
+def stock_series(product_id,resolution="day",start=None,end=None,now=None):
+    """
+    [{start, bought, sold, stock}] per bucket from start to end, where stock
+    is the level at the end of the bucket. Buckets that have closed are
+    cached, so a repeat view only aggregates the ledger of the open one.
+    """
+    if resolution not in RESOLUTIONS:
+        raise SeriesError("Unknown resolution %r, expected one of %s" % (resolution,", ".join(RESOLUTIONS)))
+    step=RESOLUTIONS[resolution][1]
+    now=now or timezone.now()
+    end=end or now
+    start=start or end-step*DEFAULT_BUCKETS
+    if start>=end:
+        raise SeriesError("The range must start before it ends")
+    buckets=bucket_starts(start,end,resolution)
+    open_from=bucket_start(now,resolution)
+
+    closed=[bucket for bucket in buckets if bucket<open_from]
+    keys={bucket:series_cache_key(product_id,resolution,bucket) for bucket in closed}
+    cached=cache.get_many(keys.values())
+    values={bucket:tuple(cached[key]) for bucket,key in keys.items() if key in cached}
+    missing=[bucket for bucket in closed if bucket not in values]
+    if missing:
+        computed=ledger_buckets(product_id,resolution,missing[0],missing[-1]+step)
+        fresh={bucket:computed.get(bucket,(0,0)) for bucket in missing}
+        cache.set_many({keys[bucket]:value for bucket,value in fresh.items()},SERIES_CACHE_TIMEOUT)
+        values.update(fresh)
+    if len(closed)<len(buckets):
+        values.update(ledger_buckets(product_id,resolution,open_from,buckets[-1]+step))
+
+    stock=stock_at(product_id,buckets[0]-datetime.timedelta(microseconds=1))
+    series=[]
+    for bucket in buckets:
+        bought,sold=values.get(bucket,(0,0))
+        stock+=bought-sold
+        series.append({"start":bucket,"bought":bought,"sold":sold,"stock":stock})
+    return series
+
+def parse_series_date(value,name):
+    try:
+        return timezone.make_aware(datetime.datetime.combine(datetime.date.fromisoformat(value),datetime.time.min))
+    except (TypeError,ValueError):
+        raise SeriesError("%s must be a YYYY-MM-DD date" % name)
+
+def parse_series_params(params):
+    """
+    (resolution, start, end) from ?resolution=&start=&end=, both dates
+    inclusive; missing dates fall back to the stock_series defaults.
+    """
+    start=parse_series_date(params["start"],"start") if params.get("start") else None
+    end=parse_series_date(params["end"],"end")+datetime.timedelta(days=1) if params.get("end") else None
+    return params.get("resolution") or "day",start,end
@@ -0,0 +1,95 @@
+import re
+
+from django.db import transaction
+from django.db.models import Count,F
+
+from DjangoEcommerceApp.models import Products,ProductTags,Tag,ProductTagLink
+from DjangoEcommerceApp.pagination import KeysetPaginator
+
+TAG_PRODUCTS_PAGE_SIZE=50
+
+
+def normalize_tag(title):
+    return re.sub(r"\s+"," ",str(title or "")).strip().lower()[:255]
+
+def tag_ids(names):
+    """
+    {name: Tag id} for normalized names, creating the missing tags with one
+    INSERT.
+    """
+    names=set(names)
+    if not names:
+        return {}
+    Tag.objects.bulk_create([Tag(name=name) for name in names],ignore_conflicts=True)
+    return dict(Tag.objects.filter(name__in=names).values_list("name","id"))
+
+def apply_tag_count_deltas(deltas):
+    #One UPDATE per distinct delta, usually just +1 and -1
+    by_delta={}
+    for tag_id,delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta,[]).append(tag_id)
+    for delta,ids in by_delta.items():
+        Tag.objects.filter(id__in=ids).update(product_count=F("product_count")+delta)
+
+@transaction.atomic
+def sync_product_tags(product_ids):
+    """
+    Diff the tag links of the given products against their active
+    ProductTags rows and adjust the per-tag product counts by the
+    difference. Inactive products are not linked.
+    """
+    product_ids=set(product_ids)
+    active=set(Products.objects.filter(id__in=product_ids,is_active=1).values_list("id",flat=True))
+    wanted={}
+    for product_id,title in ProductTags.objects.filter(product_id__in=active,is_active=1).values_list("product_id","title"):
+        name=normalize_tag(title)
+        if name:
+            wanted.setdefault(product_id,set()).add(name)
+    ids=tag_ids(set().union(*wanted.values())) if wanted else {}
+
+    stored={}
+    for link_id,product_id,tag_id in ProductTagLink.objects.filter(product_id__in=product_ids).values_list("id","product_id","tag_id"):
+        stored.setdefault(product_id,{})[tag_id]=link_id
+
+    deltas={}
+    removed=[]
+    added=[]
+    for product_id in product_ids:
+        current={ids[name] for name in wanted.get(product_id,())}
+        previous=stored.get(product_id,{})
+        for tag_id in previous.keys()-current:
+            removed.append(previous[tag_id])
+            deltas[tag_id]=deltas.get(tag_id,0)-1
+        for tag_id in current-previous.keys():
+            added.append(ProductTagLink(product_id_id=product_id,tag_id_id=tag_id))
+            deltas[tag_id]=deltas.get(tag_id,0)+1
+
+    if removed:
+        ProductTagLink.objects.filter(id__in=removed).delete()
+    if added:
+        ProductTagLink.objects.bulk_create(added)
+    apply_tag_count_deltas(deltas)
+
+@transaction.atomic
+def remove_product_tags(product_ids):
+    links=ProductTagLink.objects.filter(product_id__in=product_ids)
+    deltas={tag_id:-count for tag_id,count in links.values_list("tag_id").annotate(count=Count("id")).order_by()}
+    links.delete()
+    apply_tag_count_deltas(deltas)
+
+def products_tagged(name,queryset=None):
+    """
+    Products carrying the tag, resolved through the (tag, product) index.
+    """
+    queryset=Products.objects.all() if queryset is None else queryset
+    return queryset.filter(id__in=ProductTagLink.objects.filter(tag_id__name=normalize_tag(name)).values("product_id"))
+
+def tag_cloud(limit=50):
+    return list(Tag.objects.filter(product_count__gt=0).order_by("-product_count","name").values_list("name","product_count")[:limit])
+
+def tagged_product_page(name,cursor=None,per_page=TAG_PRODUCTS_PAGE_SIZE):
+    """
+    A keyset page of the active products carrying the tag, newest first.
+    """
+    return KeysetPaginator(products_tagged(name,Products.objects.filter(is_active=1).only("id")).order_by("-id"),per_page).page(cursor)
@@ -1,3 +1,1270 @@
-from django.test import TestCase
+from decimal import Decimal
+import datetime
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock,skipIf
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection,connections,DatabaseError
+from django.test import TestCase,TransactionTestCase,RequestFactory,override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from DjangoEcommerceApp.models import Categories,SubCategories,CustomUser,CustomerUser,Products,ProductMedia,ProductTags,ProductDetails,ProductFacetCount,ProductAbout,ProductQuestions,ProductVarient,ProductVarientItems,ProductReviews,ProductReviewVoting,ProductRatingSummary,ProductDocument,ProductTransaction,CustomerOrders,Tag,ProductTagLink,StockReservation,StockSnapshot,OrderDeliveryStatus,Coupon
+from DjangoEcommerceApp import AdminViews
+from DjangoEcommerceApp.pagination import KeysetPaginator,CachedCountPaginator
+from DjangoEcommerceApp.search import search_products,search_profiles,PRODUCT_SEARCH_TABLE
+from DjangoEcommerceApp.category_tree import get_category_tree
+from DjangoEcommerceApp.facets import facet_counts,filter_products,sync_product_facets
+from DjangoEcommerceApp.prices import parse_price
+from DjangoEcommerceApp.ratings import review_stars
+from DjangoEcommerceApp.reviews import review_feed
+from DjangoEcommerceApp.product_page import load_product_page,LATEST_QUESTIONS,TOP_REVIEWS
+from DjangoEcommerceApp.product_batch import MAX_BATCH_SIZE
+from DjangoEcommerceApp.tag_index import products_tagged,tag_cloud
+from DjangoEcommerceApp.product_import import bulk_create_products,parse_tags
+from DjangoEcommerceApp import inventory
+from DjangoEcommerceApp.stock_ledger import stock_at,ledger_stocks,stock_drift
+from DjangoEcommerceApp.stock_series import stock_series
+from DjangoEcommerceApp import forecasting
+from DjangoEcommerceApp.orders import OrderError,place_order
 
 # Create your tests here.
+def create_merchant(username="merchant"):
+    user=CustomUser(username=username,email=username+"@example.com",user_type=3)
+    user.set_password("password")
+    user.save()
+    return user.merchantuser
+
+def create_subcategory(title="Phones"):
+    category=Categories.objects.create(title="Electronics",url_slug="electronics",thumbnail="",description="")
+    return SubCategories.objects.create(category_id=category,title=title,url_slug=title.lower(),thumbnail="",description="")
+
+def create_customer(username="customer"):
+    user=CustomUser(username=username,email=username+"@example.com",user_type=4)
+    user.set_password("password")
+    user.save()
+    return user.customeruser
+
+def create_product(subcategory,merchant,name="Product",**kwargs):
+    fields=dict(product_name=name,url_slug=name.lower().replace(" ","-"),brand="Brand",subcategories_id=subcategory,product_max_price="100",product_discount_price="90",product_description="",product_long_description="",added_by_merchant=merchant)
+    fields.update(kwargs)
+    return Products.objects.create(**fields)
+
+
+class ProductListViewTest(TestCase):
+
+    def setUp(self):
+        self.merchant=create_merchant()
+        self.subcategory=create_subcategory()
+
+    def render_page_context(self,query=""):
+        request=RequestFactory().get("/admindashboard/product_list"+query)
+        view=AdminViews.ProductListView()
+        view.setup(request)
+        view.object_list=view.get_queryset()
+        context=view.get_context_data()
+        return [(product.product_name,[media.media_content.name for media in product.primary_media]) for product in context["object_list"]]
+
+    def add_products(self,count):
+        for i in range(count):
+            product=create_product(self.subcategory,self.merchant,name="Product %d" % (Products.objects.count()+1))
+            ProductMedia.objects.create(product_id=product,media_type=2,media_content="/media/video.mp4")
+            ProductMedia.objects.create(product_id=product,media_type=1,media_content="/media/old.jpg",is_active=0)
+            ProductMedia.objects.create(product_id=product,media_type=1,media_content="/media/%d.jpg" % product.id)
+            ProductMedia.objects.create(product_id=product,media_type=1,media_content="/media/%d_2.jpg" % product.id)
+
+    def test_page_fetches_only_primary_image(self):
+        self.add_products(2)
+        rows=self.render_page_context()
+        first=Products.objects.order_by("id").first()
+        self.assertEqual(rows[0],(first.product_name,["/media/%d.jpg" % first.id,"/media/%d_2.jpg" % first.id]))
+
+    def test_query_count_is_constant(self):
+        self.add_products(4)
+        #count, page of products with subcategory, media prefetch
+        with self.assertNumQueries(3):
+            self.render_page_context()
+        self.add_products(20)
+        with self.assertNumQueries(3):
+            self.render_page_context("?page=5")
+
+    def test_cursor_mode_falls_back_from_search_rank(self):
+        self.add_products(2)
+        response=self.client.get("/admindashboard/product_list",{"filter":"Product","orderby":"search_rank","cursor":""})
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.context["orderby"],"id")
+
+
+class KeysetPaginatorTest(TestCase):
+
+    def setUp(self):
+        category=Categories.objects.create(title="Root",url_slug="root",thumbnail="",description="")
+        for title in ["b","a","c","b","a","d","b"]:
+            SubCategories.objects.create(category_id=category,title=title,url_slug=title,thumbnail="",description="")
+
+    def walk(self,order_by):
+        queryset=SubCategories.objects.order_by(order_by)
+        paginator=KeysetPaginator(queryset,3)
+        pages=[paginator.page("")]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return paginator,pages
+
+    def test_forward_walk_matches_offset_order(self):
+        for order_by,tiebreak in [("id","id"),("title","id"),("-title","-id"),("-id","-id")]:
+            paginator,pages=self.walk(order_by)
+            seen=[obj.id for page in pages for obj in page]
+            expected=list(SubCategories.objects.order_by(order_by,tiebreak).values_list("id",flat=True))
+            self.assertEqual(seen,expected,order_by)
+            self.assertFalse(pages[0].has_previous())
+
+    def test_previous_cursor_returns_prior_page(self):
+        paginator,pages=self.walk("title")
+        for before,after in zip(pages,pages[1:]):
+            back=paginator.page(after.previous_cursor)
+            self.assertEqual([obj.id for obj in back],[obj.id for obj in before])
+
+    def test_datetime_key_keeps_microseconds(self):
+        #Two rows in one millisecond and one exact tie, all sub-millisecond apart
+        start=timezone.now().replace(microsecond=0)
+        for subcategory,micros in zip(SubCategories.objects.order_by("id"),[0,100,100,900,1000,1001,5000]):
+            SubCategories.objects.filter(id=subcategory.id).update(created_at=start+datetime.timedelta(microseconds=micros))
+        for order_by,tiebreak in [("created_at","id"),("-created_at","-id")]:
+            paginator,pages=self.walk(order_by)
+            seen=[obj.id for page in pages for obj in page]
+            self.assertEqual(seen,list(SubCategories.objects.order_by(order_by,tiebreak).values_list("id",flat=True)),order_by)
+            for before,after in zip(pages,pages[1:]):
+                self.assertEqual([obj.id for obj in paginator.page(after.previous_cursor)],[obj.id for obj in before])
+
+    def test_cursor_page_skips_count(self):
+        merchant=create_merchant()
+        subcategory=SubCategories.objects.first()
+        for i in range(5):
+            create_product(subcategory,merchant,name="Product %d" % i)
+        request=RequestFactory().get("/admindashboard/product_list?orderby=product_name&cursor=")
+        view=AdminViews.ProductListView()
+        view.setup(request)
+        #page of products with subcategory, media prefetch
+        with self.assertNumQueries(2):
+            view.object_list=view.get_queryset()
+            context=view.get_context_data()
+        self.assertTrue(context["cursor_mode"])
+        self.assertEqual([p.product_name for p in context["object_list"]],["Product 0","Product 1","Product 2"])
+
+
+class ProductSearchTest(TestCase):
+
+    def setUp(self):
+        merchant=create_merchant()
+        subcategory=create_subcategory()
+        self.phone=create_product(subcategory,merchant,name="Galaxy Phone",brand="Samsung",product_description="A phone with a great camera")
+        self.case=create_product(subcategory,merchant,name="Leather Case",brand="Generic",product_description="Fits the galaxy phone")
+        self.cable=create_product(subcategory,merchant,name="USB Cable",brand="Generic")
+
+    def search(self,text):
+        return list(search_products(Products.objects.all(),text).order_by("search_rank").values_list("id",flat=True))
+
+    def test_ranks_name_matches_first(self):
+        self.assertEqual(self.search("galaxy"),[self.phone.id,self.case.id])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.search("gala pho"),[self.phone.id,self.case.id])
+        self.assertEqual(self.search("cab"),[self.cable.id])
+
+    def test_index_follows_product_and_tag_changes(self):
+        tag=ProductTags.objects.create(product_id=self.cable,title="charger")
+        self.assertEqual(self.search("charger"),[self.cable.id])
+        tag.delete()
+        self.assertEqual(self.search("charger"),[])
+        self.case.product_name="Silicone Cover"
+        self.case.save()
+        self.assertEqual(self.search("leather"),[])
+        self.phone.delete()
+        self.assertEqual(self.search("galaxy"),[self.case.id])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM "%s"' % PRODUCT_SEARCH_TABLE)
+        self.assertEqual(self.search("cable"),[])
+        call_command("rebuild_product_search",batch_size=1,stdout=StringIO())
+        self.assertEqual(self.search("cable"),[self.cable.id])
+
+
+class ProfileSearchTest(TestCase):
+
+    def setUp(self):
+        self.ada=CustomUser.objects.create(username="ada_l",first_name="Ada",last_name="Lovelace",email="ada@engine.org",user_type=4)
+        self.alan=CustomUser.objects.create(username="aturing",first_name="Alan",last_name="Turing",email="alan@bletchley.uk",user_type=4)
+        CustomUser.objects.create(username="ada_merchant",first_name="Ada",last_name="Shop",user_type=3)
+
+    def search(self,text):
+        return list(search_profiles(CustomerUser.objects.all(),text).order_by("id").values_list("auth_user_id",flat=True))
+
+    def test_token_and_prefix_matching(self):
+        self.assertEqual(self.search("ada"),[self.ada.id])
+        self.assertEqual(self.search("a"),[self.ada.id,self.alan.id])
+        self.assertEqual(self.search("lov ada"),[self.ada.id])
+        self.assertEqual(self.search("bletchley.uk"),[self.alan.id])
+        self.assertEqual(self.search("ada_l"),[self.ada.id])
+
+    def test_index_follows_user_changes(self):
+        self.alan.last_name="Kay"
+        self.alan.save()
+        self.assertEqual(self.search("turing"),[])
+        self.assertEqual(self.search("kay"),[self.alan.id])
+        self.alan.delete()
+        self.assertEqual(self.search("alan"),[])
+
+
+class CategoryTreeTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.phones=create_subcategory("Phones")
+        self.category=self.phones.category_id
+        self.laptops=SubCategories.objects.create(category_id=self.category,title="Laptops",url_slug="laptops",thumbnail="",description="")
+        SubCategories.objects.create(category_id=self.category,title="Hidden",url_slug="hidden",thumbnail="",description="",is_active=0)
+        Categories.objects.create(title="Archived",url_slug="archived",thumbnail="",description="",is_active=0)
+
+    def test_tree_is_loaded_in_two_queries_and_cached(self):
+        with self.assertNumQueries(2):
+            tree=get_category_tree()
+        self.assertEqual([node["category"].id for node in tree],[self.category.id])
+        self.assertEqual([sub.id for sub in tree[0]["sub_category"]],[self.phones.id,self.laptops.id])
+        with self.assertNumQueries(0):
+            get_category_tree()
+
+    def test_writes_invalidate_tree(self):
+        get_category_tree()
+        self.laptops.is_active=0
+        self.laptops.save()
+        self.assertEqual([sub.id for sub in get_category_tree()[0]["sub_category"]],[self.phones.id])
+        self.category.delete()
+        self.assertEqual(get_category_tree(),[])
+
+
+class QueryPlanAdvisorTest(TestCase):
+
+    def test_flags_scans_and_prints_migration_snippet(self):
+        create_product(create_subcategory(),create_merchant())
+        out=StringIO()
+        call_command("query_plan_advisor",route=["product_view","product_edit"],stdout=out)
+        output=out.getvalue()
+        self.assertIn("/admindashboard/product_create  [200]",output)
+        self.assertIn("/admindashboard/product_edit/",output)
+        self.assertIn("full table scan on DjangoEcommerceApp_categories",output)
+        self.assertIn("migrations.AddIndex(",output)
+        self.assertIn("model_name='categories'",output)
+
+    def test_restores_request_log_level_after_failure(self):
+        request_logger=logging.getLogger("django.request")
+        level=request_logger.level
+        with mock.patch("DjangoEcommerceApp.management.commands.query_plan_advisor.Command.check_route",side_effect=RuntimeError("route")):
+            with self.assertRaises(RuntimeError):
+                call_command("query_plan_advisor",route=["product_view"],stdout=StringIO())
+        self.assertEqual(request_logger.level,level)
+
+
+class CachedCountPaginatorTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category=Categories.objects.create(title="Root",url_slug="root",thumbnail="",description="")
+        SubCategories.objects.bulk_create([SubCategories(category_id=self.category,title="sub %d" % i,url_slug="",thumbnail="",description="odd" if i%2 else "even") for i in range(10)])
+
+    def paginator(self,queryset,**kwargs):
+        return CachedCountPaginator(queryset,3,**kwargs)
+
+    def test_unfiltered_count_comes_from_row_counter(self):
+        SubCategories.objects.filter(description="odd").delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.paginator(SubCategories.objects.order_by("id")).count,5)
+
+    def test_filtered_count_is_cached_until_a_write(self):
+        queryset=SubCategories.objects.filter(description="odd").order_by("id")
+        with self.assertNumQueries(2):
+            self.assertEqual(self.paginator(queryset).count,5)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.paginator(queryset).count,5)
+        SubCategories.objects.filter(title="sub 2").update(description="odd")
+        self.assertEqual(self.paginator(queryset).count,6)
+
+    def test_capped_count_pages_by_lookahead(self):
+        paginator=self.paginator(SubCategories.objects.filter(is_active=1).order_by("id"),count_limit=4)
+        self.assertEqual(paginator.count,4)
+        self.assertFalse(paginator.count_is_exact)
+        self.assertIsNone(paginator.num_pages)
+        page=paginator.page(3)
+        self.assertTrue(page.has_next())
+        self.assertFalse(paginator.page(4).has_next())
+        self.assertEqual(paginator.get_page_range(page),[1,2,3,4])
+
+    def test_no_total_mode(self):
+        paginator=self.paginator(SubCategories.objects.filter(is_active=1).order_by("id"),count_mode="none")
+        with self.assertNumQueries(1):
+            page=paginator.page(1)
+        self.assertTrue(page.has_next())
+        self.assertEqual(len(page),3)
+
+    def test_refresh_command_fixes_drift(self):
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE "DjangoEcommerceApp_tablerowcount" SET row_count=0')
+        call_command("refresh_row_counts",stdout=StringIO())
+        self.assertEqual(self.paginator(SubCategories.objects.order_by("id")).count,10)
+
+
+class ProductFacetsTest(TestCase):
+
+    def setUp(self):
+        merchant=create_merchant()
+        self.subcategory=create_subcategory()
+        self.red=create_product(self.subcategory,merchant,name="Red Phone",brand="Acme",product_discount_price="799")
+        self.blue=create_product(self.subcategory,merchant,name="Blue Phone",brand="Acme",product_discount_price="1500",in_stock_total=0)
+        self.other=create_product(self.subcategory,merchant,name="Other Phone",brand="Globex",product_discount_price="99")
+        ProductDetails.objects.create(product_id=self.red,title="Color",title_details="Red")
+        ProductDetails.objects.create(product_id=self.blue,title="Color",title_details="Blue")
+
+    def stored_counts(self):
+        return {(c.facet,c.value):c.product_count for c in ProductFacetCount.objects.filter(product_count__gt=0)}
+
+    def test_catalog_counts_are_maintained(self):
+        counts=facet_counts()
+        self.assertEqual(counts["brand"],[("Acme",2),("Globex",1)])
+        self.assertEqual(counts["price"],[("0-500",1),("1000-2000",1),("500-1000",1)])
+        self.assertEqual(counts["stock"],[("in_stock",2),("out_of_stock",1)])
+        self.assertEqual(counts["spec:Color"],[("Blue",1),("Red",1)])
+
+        self.blue.brand="Globex"
+        self.blue.save()
+        self.red.delete()
+        counts=facet_counts()
+        self.assertEqual(counts["brand"],[("Globex",2)])
+        self.assertEqual(counts["spec:Color"],[("Blue",1)])
+
+    def test_filtered_counts(self):
+        with self.assertNumQueries(1):
+            counts=facet_counts({"brand":["Acme"],"stock":["in_stock"]})
+        self.assertEqual(counts["spec:Color"],[("Red",1)])
+        self.assertEqual(list(filter_products(Products.objects.all(),{"brand":["Acme","Globex"],"spec:Color":["Blue"]})),[self.blue])
+
+    def test_rebuild_matches_incremental_counts(self):
+        expected=self.stored_counts()
+        call_command("rebuild_product_facets",stdout=StringIO())
+        self.assertEqual(self.stored_counts(),expected)
+
+    def test_list_count_follows_facet_changes(self):
+        cache.clear()
+        queryset=filter_products(Products.objects.order_by("id"),{"spec:Color":["Red"]})
+        self.assertEqual(CachedCountPaginator(queryset,3).count,1)
+        ProductDetails.objects.filter(product_id=self.blue).update(title_details="Red")
+        sync_product_facets([self.blue.id])
+        self.assertEqual(CachedCountPaginator(queryset,3).count,2)
+
+    def test_list_links_keep_facet_filters(self):
+        for i in range(4):
+            product=create_product(self.subcategory,self.red.added_by_merchant,name="Red %d" % i,brand="Acme")
+            ProductDetails.objects.create(product_id=product,title="Color",title_details="Red")
+        response=self.client.get("/admindashboard/product_list",{"brand":"Acme","spec:Color":"Red","price_max":"900","page":"1"})
+        self.assertContains(response,"?filter=&amp;brand=Acme&amp;spec%3AColor=Red&amp;price_max=900&orderby=id&page=2")
+        self.assertContains(response,"?filter=&amp;brand=Acme&amp;spec%3AColor=Red&amp;price_max=900&orderby=product_name")
+
+    def test_facets_endpoint(self):
+        response=self.client.get("/admindashboard/product_facets?brand=Acme")
+        facets=response.json()["facets"]
+        self.assertEqual(facets["subcategory"],[{"value":str(self.subcategory.id),"label":"Phones","count":2}])
+
+
+class ProductPriceTest(TestCase):
+
+    def setUp(self):
+        merchant=create_merchant()
+        subcategory=create_subcategory()
+        for name,price in (("Mid","799"),("High","1,500"),("Low","99.5")):
+            create_product(subcategory,merchant,name=name,product_discount_price=parse_price(price))
+
+    def list_names(self,query):
+        request=RequestFactory().get("/admindashboard/product_list"+query)
+        view=AdminViews.ProductListView()
+        view.setup(request)
+        view.object_list=view.get_queryset()
+        return [product.product_name for product in view.get_context_data()["object_list"]]
+
+    def test_parse_price(self):
+        self.assertEqual(parse_price("Rs. 1,299.5"),Decimal("1299.50"))
+        self.assertEqual(parse_price("",Decimal("0")),Decimal("0"))
+        self.assertIsNone(parse_price("n/a"))
+
+    def test_price_sort_is_numeric(self):
+        self.assertEqual(self.list_names("?orderby=product_discount_price"),["Low","Mid","High"])
+        self.assertEqual(self.list_names("?orderby=-product_discount_price&cursor="),["High","Mid","Low"])
+
+    def test_price_range_filter(self):
+        self.assertEqual(self.list_names("?orderby=product_discount_price&price_min=100&price_max=1500"),["Mid","High"])
+        self.assertEqual(self.list_names("?price_max=500"),["Low"])
+
+
+class ProductRatingSummaryTest(TestCase):
+
+    def setUp(self):
+        self.product=create_product(create_subcategory(),create_merchant())
+        self.customer=create_customer()
+
+    def summary(self):
+        summary=ProductRatingSummary.objects.get(product_id=self.product)
+        return (summary.review_count,summary.rating_total,[count for stars,count in summary.histogram()])
+
+    def add_review(self,rating):
+        return ProductReviews.objects.create(product_id=self.product,user_id=self.customer,review_image="",rating=rating)
+
+    def test_summary_follows_review_changes(self):
+        first=self.add_review("5")
+        second=self.add_review("3")
+        self.add_review("not rated")
+        self.assertEqual(self.summary(),(2,8,[1,0,1,0,0]))
+
+        second.rating="4"
+        second.save()
+        self.assertEqual(self.summary(),(2,9,[1,1,0,0,0]))
+        first.is_active=0
+        first.save()
+        self.assertEqual(self.summary(),(1,4,[0,1,0,0,0]))
+        second.delete()
+        self.assertEqual(self.summary(),(0,0,[0,0,0,0,0]))
+        self.assertIsNone(ProductRatingSummary.objects.get(product_id=self.product).average_rating())
+
+    def test_reconcile_fixes_drift(self):
+        self.add_review("4")
+        self.add_review("2")
+        ProductRatingSummary.objects.update(review_count=7,stars_4=0)
+        out=StringIO()
+        call_command("reconcile_rating_summaries",stdout=out)
+        self.assertIn("1 rating summaries reconciled",out.getvalue())
+        self.assertEqual(self.summary(),(2,6,[0,1,0,1,0]))
+        self.assertEqual(ProductRatingSummary.objects.get(product_id=self.product).average_rating(),3.0)
+
+    def test_product_delete_removes_summary(self):
+        self.add_review("5")
+        self.product.delete()
+        self.assertFalse(ProductRatingSummary.objects.exists())
+
+    def test_failed_summary_update_rolls_back_review(self):
+        review=self.add_review("5")
+        review.rating="2"
+        with mock.patch("DjangoEcommerceApp.ratings.summary_deltas",side_effect=DatabaseError("summary")):
+            with self.assertRaises(DatabaseError):
+                review.save()
+        self.assertEqual(ProductReviews.objects.get(id=review.id).rating,"5")
+        self.assertEqual(self.summary(),(1,5,[1,0,0,0,0]))
+
+
+class ProductRatingConcurrencyTest(TransactionTestCase):
+
+    def test_concurrent_rating_changes_keep_summary_exact(self):
+        product=create_product(create_subcategory(),create_merchant())
+        review=ProductReviews.objects.create(product_id=product,user_id=create_customer(),review_image="",rating="5")
+        errors=[]
+        def rate(stars):
+            try:
+                for i in range(10):
+                    stale=ProductReviews.objects.get(id=review.id)
+                    stale.rating=str(stars)
+                    stale.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+        threads=[threading.Thread(target=rate,args=(stars,)) for stars in range(1,6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors,[])
+        self.assertEqual(ProductRatingSummary.objects.filter(product_id=product).values_list("review_count","rating_total").get(),(1,review_stars(ProductReviews.objects.get(id=review.id).rating)))
+
+
+class ReviewFeedTest(TestCase):
+
+    def setUp(self):
+        self.product=create_product(create_subcategory(),create_merchant())
+        self.voters=[create_customer("voter%d" % i) for i in range(3)]
+        self.reviews=[ProductReviews.objects.create(product_id=self.product,user_id=self.voters[0],review_image="",rating=str(rating)) for rating in (2,5,4,3)]
+
+    def vote(self,review,count):
+        return [ProductReviewVoting.objects.create(product_review_id=review,user_id_voting=voter) for voter in self.voters[:count]]
+
+    def helpful_votes(self):
+        return [review.helpful_votes for review in ProductReviews.objects.order_by("id")]
+
+    def test_vote_counter_is_maintained(self):
+        votes=self.vote(self.reviews[0],3)
+        self.vote(self.reviews[2],1)
+        self.assertEqual(self.helpful_votes(),[3,0,1,0])
+        votes[0].is_active=0
+        votes[0].save()
+        votes[1].delete()
+        self.assertEqual(self.helpful_votes(),[1,0,1,0])
+
+        #Saving a review loaded before the votes must not overwrite the counter
+        self.reviews[0].review="Edited"
+        self.reviews[0].save()
+        self.assertEqual(self.helpful_votes(),[1,0,1,0])
+
+    def test_feed_pages_by_helpfulness(self):
+        self.vote(self.reviews[2],2)
+        self.vote(self.reviews[3],1)
+        first=self.client.get("/admindashboard/product_reviews/%d?sort=helpful" % self.product.id).json()
+        self.assertEqual([review["id"] for review in first["reviews"]],[self.reviews[2].id,self.reviews[3].id,self.reviews[1].id,self.reviews[0].id])
+
+        page=review_feed(self.product.id,"rating",per_page=3)
+        self.assertEqual([review.rating for review in page],["5","4","3"])
+        page=review_feed(self.product.id,"rating",page.next_cursor,per_page=3)
+        self.assertEqual([review.rating for review in page],["2"])
+        self.assertFalse(page.has_next())
+
+    def test_recent_feed_pages_through_same_millisecond_reviews(self):
+        start=timezone.now().replace(microsecond=0)
+        for review,micros in zip(self.reviews,[300,100,300,200]):
+            ProductReviews.objects.filter(id=review.id).update(created_at=start+datetime.timedelta(microseconds=micros))
+        seen=[]
+        page=review_feed(self.product.id,"recent",per_page=1)
+        while True:
+            seen.extend(review.id for review in page)
+            if not page.has_next() or len(seen)>len(self.reviews):
+                break
+            page=review_feed(self.product.id,"recent",page.next_cursor,per_page=1)
+        self.assertEqual(seen,[self.reviews[2].id,self.reviews[0].id,self.reviews[3].id,self.reviews[1].id])
+
+
+class ReviewVoteConcurrencyTest(TransactionTestCase):
+
+    def test_concurrent_vote_toggles_keep_counter_exact(self):
+        product=create_product(create_subcategory(),create_merchant())
+        customer=create_customer()
+        review=ProductReviews.objects.create(product_id=product,user_id=customer,review_image="",rating="5")
+        vote=ProductReviewVoting.objects.create(product_review_id=review,user_id_voting=customer)
+        errors=[]
+        def toggle(is_active):
+            try:
+                for i in range(10):
+                    stale=ProductReviewVoting.objects.get(id=vote.id)
+                    stale.is_active=is_active
+                    stale.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+        threads=[threading.Thread(target=toggle,args=(i%2,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors,[])
+        self.assertEqual(ProductReviews.objects.get(id=review.id).helpful_votes,ProductReviewVoting.objects.get(id=vote.id).is_active)
+
+
+class ProductPageLoaderTest(TestCase):
+
+    def setUp(self):
+        self.product=create_product(create_subcategory(),create_merchant(),name="Loaded Phone")
+        self.customer=create_customer()
+        self.size=ProductVarient.objects.create(title="Size")
+
+    def add_related_rows(self,count):
+        for i in range(count):
+            ProductMedia.objects.create(product_id=self.product,media_type=1,media_content="/media/%d.jpg" % i)
+            ProductDetails.objects.create(product_id=self.product,title="Spec %d" % i,title_details="Value")
+            ProductAbout.objects.create(product_id=self.product,title="About %d" % i)
+            ProductTags.objects.create(product_id=self.product,title="tag%d" % i)
+            ProductVarientItems.objects.create(product_varient_id=self.size,product_id=self.product,title="S%d" % i)
+            ProductQuestions.objects.create(product_id=self.product,user_id=self.customer,question="Q%d" % i,answer="")
+            ProductReviews.objects.create(product_id=self.product,user_id=self.customer,review_image="",rating="4")
+
+    def test_query_budget_does_not_grow(self):
+        #product with joins, media, details, about, tags, variant items, questions, reviews
+        with self.assertNumQueries(8):
+            page=load_product_page(self.product.id)
+        self.assertEqual(page["rating"]["count"],0)
+        self.add_related_rows(12)
+        with self.assertNumQueries(8):
+            page=load_product_page(self.product.id)
+        self.assertEqual(len(page["media"]),12)
+        self.assertEqual(page["variants"],[{"title":"Size","items":["S%d" % i for i in range(12)]}])
+        self.assertEqual(len(page["questions"]),LATEST_QUESTIONS)
+        self.assertEqual(len(page["reviews"]),TOP_REVIEWS)
+        self.assertIsNotNone(page["more_reviews_cursor"])
+        self.assertEqual(page["rating"]["average"],4.0)
+        self.assertEqual(page["category"]["title"],"Electronics")
+
+    def test_inactive_rows_are_left_out(self):
+        self.add_related_rows(2)
+        ProductTags.objects.filter(title="tag0").update(is_active=0)
+        ProductQuestions.objects.filter(question="Q1").update(is_active=0)
+        page=load_product_page(self.product.id)
+        self.assertEqual(page["tags"],["tag1"])
+        self.assertEqual([question["question"] for question in page["questions"]],["Q0"])
+
+
+class ProductDocumentApiTest(TestCase):
+
+    def setUp(self):
+        self.product=create_product(create_subcategory(),create_merchant(),name="Api Phone")
+        self.tag=ProductTags.objects.create(product_id=self.product,title="android")
+        self.url="/api/products/%d" % self.product.id
+
+    def test_document_is_built_once_and_revalidated(self):
+        response=self.client.get(self.url)
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.json()["tags"],["android"])
+        etag=response["ETag"]
+
+        #Fresh document: one indexed read, no product or child tables
+        with self.assertNumQueries(1):
+            response=self.client.get(self.url,HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code,304)
+        with self.assertNumQueries(1):
+            content=self.client.get(self.url).content
+        self.assertEqual(content,ProductDocument.objects.get(product_id=self.product).document.encode())
+
+    def test_child_changes_rebuild_the_document(self):
+        etag=self.client.get(self.url)["ETag"]
+        self.tag.title="ios"
+        self.tag.save()
+        response=self.client.get(self.url,HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.json()["tags"],["ios"])
+        self.assertNotEqual(response["ETag"],etag)
+
+        self.product.subcategories_id.title="Smartphones"
+        self.product.subcategories_id.save()
+        self.assertEqual(self.client.get(self.url).json()["subcategory"]["title"],"Smartphones")
+
+    def test_inactive_and_missing_products_are_not_found(self):
+        self.product.is_active=0
+        self.product.save()
+        self.assertEqual(self.client.get(self.url).status_code,404)
+        self.assertEqual(self.client.get("/api/products/999").status_code,404)
+        self.assertFalse(ProductDocument.objects.filter(product_id=999).exists())
+
+
+class ProductBatchApiTest(TestCase):
+
+    def setUp(self):
+        subcategory=create_subcategory()
+        merchant=create_merchant()
+        self.products=[create_product(subcategory,merchant,name="Batch %d" % i,product_discount_price=Decimal(10*i)) for i in range(1,5)]
+        for product in self.products:
+            ProductMedia.objects.create(product_id=product,media_type=1,media_content="/media/%d.jpg" % product.id)
+            ProductMedia.objects.create(product_id=product,media_type=1,media_content="/media/%d_2.jpg" % product.id)
+        self.products[3].is_active=0
+        self.products[3].save()
+
+    def get(self,query):
+        return self.client.get("/api/products"+query)
+
+    def test_results_follow_request_order(self):
+        first,second,third,inactive=[product.id for product in self.products]
+        #products with the requested columns, primary images
+        with self.assertNumQueries(2):
+            response=self.get("?ids=%d,%d,999,%d,%d&fields=name,price,image" % (third,first,inactive,second))
+        data=response.json()
+        self.assertEqual(data["products"],[
+            {"id":third,"name":"Batch 3","price":"30.00","image":"/media/%d.jpg" % third},
+            {"id":first,"name":"Batch 1","price":"10.00","image":"/media/%d.jpg" % first},
+            {"id":second,"name":"Batch 2","price":"20.00","image":"/media/%d.jpg" % second},
+        ])
+        self.assertEqual(data["missing"],[999,inactive])
+
+    def test_sparse_fields_and_limits(self):
+        product_id=self.products[0].id
+        with self.assertNumQueries(1):
+            data=self.get("?ids=%d&fields=brand,rating" % product_id).json()
+        self.assertEqual(data["products"],[{"id":product_id,"brand":"Brand","rating":{"average":None,"count":0}}])
+        self.assertEqual(self.get("?ids=%s" % ",".join(str(i) for i in range(1,MAX_BATCH_SIZE+2))).status_code,400)
+        self.assertEqual(self.get("?ids=1,x").status_code,400)
+        self.assertEqual(self.get("?ids=1&fields=name,secret").status_code,400)
+
+
+class ImportProductsTest(TestCase):
+
+    def setUp(self):
+        self.merchant=create_merchant()
+        self.subcategory=create_subcategory()
+
+    def run_import(self,suffix,content,*args):
+        with tempfile.NamedTemporaryFile("w",suffix=suffix,delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove,f.name)
+        out,err=StringIO(),StringIO()
+        call_command("import_products",f.name,*args,stdout=out,stderr=err)
+        return out.getvalue(),err.getvalue()
+
+    def test_csv_import_with_row_errors(self):
+        content=(
+            "product_name,subcategory,merchant,product_max_price,product_discount_price,in_stock_total,media,details,tags\n"
+            "Imported Phone,phones,merchant,\"1,299\",999,5,/media/a.jpg|/media/b.jpg,Color=Red|Storage=64GB,\"android,5g\"\n"
+            "No Category,Laptops,merchant,100,90,1,,,\n"
+            ",Phones,merchant,100,90,1,,,\n"
+            "Cheap Phone,%d,merchant,100,,2,,,\n" % self.subcategory.id
+        )
+        out,err=self.run_import(".csv",content,"--batch-size","1")
+        self.assertIn("Imported 2 products, 2 rows failed",out)
+        self.assertIn("Line 3: Unknown subcategory 'Laptops'",err)
+        self.assertIn("Line 4: product_name is required",err)
+
+        product=Products.objects.get(product_name="Imported Phone")
+        self.assertEqual((product.url_slug,product.product_max_price,product.product_discount_price),("imported-phone",Decimal("1299.00"),Decimal("999.00")))
+        self.assertEqual(Products.objects.get(product_name="Cheap Phone").product_discount_price,Decimal("100.00"))
+        self.assertEqual(ProductMedia.objects.filter(product_id=product).count(),2)
+        self.assertEqual(list(ProductDetails.objects.filter(product_id=product).values_list("title","title_details")),[("Color","Red"),("Storage","64GB")])
+        self.assertEqual(ProductTransaction.objects.get(product_id=product).transaction_product_count,5)
+        self.assertEqual([p.product_name for p in search_products(Products.objects.all(),"5g")],["Imported Phone"])
+        self.assertIn(("Red",1),facet_counts()["spec:Color"])
+
+    def test_jsonl_import_in_chunks(self):
+        rows=[{"product_name":"Json %d" % i,"subcategory":"Phones","product_max_price":"50","tags":["bulk"],"about":["Fast"]} for i in range(5)]
+        content="\n".join(json.dumps(row) for row in rows)+"\nnot json\n"
+        with CaptureQueriesContext(connection) as queries:
+            out,err=self.run_import(".jsonl",content,"--batch-size","2","--merchant","merchant")
+        #One multi-row INSERT per table and chunk of 2, 2 and 1 products
+        self.assertEqual(len([query for query in queries if query["sql"].startswith('INSERT INTO "DjangoEcommerceApp_producttags"')]),3)
+        self.assertIn("Imported 5 products, 1 rows failed",out)
+        self.assertIn("Line 6: Invalid JSON",err)
+        self.assertEqual(ProductTags.objects.filter(title="bulk").count(),5)
+        self.assertEqual(len(set(Products.objects.values_list("id",flat=True))),5)
+
+    def test_ids_of_deleted_products_are_not_reused(self):
+        spec=lambda name:{"product":dict(product_name=name,url_slug=name,brand="",subcategories_id=self.subcategory,added_by_merchant=self.merchant,product_max_price=1,product_discount_price=1,product_description="",product_long_description="",in_stock_total=1),"media":[],"details":[],"about":["Fast"],"tags":[]}
+        first,last=bulk_create_products([spec("first"),spec("last")])
+        deleted_id=last.id
+        last.delete()
+        products=bulk_create_products([spec("a"),spec("b"),spec("c")],batch_size=2)
+        self.assertEqual([product.id for product in products],[deleted_id+1,deleted_id+2,deleted_id+3])
+        self.assertEqual([Products.objects.get(id=product.id).product_name for product in products],["a","b","c"])
+        self.assertEqual(list(ProductAbout.objects.filter(product_id__in=products).values_list("product_id__product_name",flat=True).order_by("id")),["a","b","c"])
+
+
+class ExportTest(TestCase):
+
+    def setUp(self):
+        subcategory=create_subcategory()
+        merchant=create_merchant()
+        self.cheap=create_product(subcategory,merchant,name="Cheap, Phone",product_discount_price=Decimal("90"))
+        self.dear=create_product(subcategory,merchant,name="Dear Phone",product_discount_price=Decimal("900"))
+        CustomerOrders.objects.create(product_id=self.dear,purchase_price=Decimal("900"),coupon_code="",discount_amt=Decimal("0"),product_status="shipped")
+        admin=CustomUser.objects.create_superuser("admin","admin@example.com","password")
+        self.client.force_login(admin)
+
+    def test_streams_csv_with_columns_and_filters(self):
+        response=self.client.get("/admindashboard/export/products?columns=id,product_name,product_discount_price&price_max=100")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"],"text/csv")
+        self.assertEqual(b"".join(response.streaming_content).decode(),'id,product_name,product_discount_price\r\n%d,"Cheap, Phone",90.00\r\n' % self.cheap.id)
+        self.assertEqual(self.client.get("/admindashboard/export/products?columns=secret").status_code,400)
+        self.assertEqual(self.client.get("/admindashboard/export/products?price_max=cheap").status_code,400)
+
+    def test_command_writes_jsonl(self):
+        out=StringIO()
+        call_command("export_data","orders","--format","jsonl","--columns","product_name,purchase_price,product_status","--filter","product_status=shipped",stdout=out)
+        self.assertEqual([json.loads(line) for line in out.getvalue().splitlines()],[{"product_name":"Dear Phone","purchase_price":"900.00","product_status":"shipped"}])
+
+
+class ProductBulkActionTest(TestCase):
+
+    def setUp(self):
+        self.subcategory=create_subcategory()
+        self.merchant=create_merchant()
+        self.products=[create_product(self.subcategory,self.merchant,name="Bulk %d" % i,in_stock_total=5) for i in range(4)]
+        self.ids=[product.id for product in self.products]
+
+    def post(self,action,ids,**params):
+        return self.client.post("/admindashboard/product_bulk_action",dict(params,action=action,product_ids=ids))
+
+    def test_list_page_posts_to_the_bulk_action(self):
+        response=self.client.get("/admindashboard/product_list")
+        self.assertContains(response,'action="/admindashboard/product_bulk_action"')
+
+    def test_status_category_and_stock_are_set_based(self):
+        other=SubCategories.objects.create(category_id=self.subcategory.category_id,title="Tablets",url_slug="tablets",thumbnail="",description="")
+        with CaptureQueriesContext(connection) as queries:
+            self.post("deactivate",self.ids[:3])
+        self.assertEqual(len([query for query in queries if query["sql"].startswith('UPDATE "DjangoEcommerceApp_products"')]),1)
+        self.assertEqual(list(Products.objects.order_by("id").values_list("is_active",flat=True)),[0,0,0,1])
+        self.assertEqual(facet_counts()["stock"],[("in_stock",1)])
+
+        self.post("recategorize",self.ids[1:],sub_category=other.id)
+        self.assertEqual(Products.objects.filter(subcategories_id=other).count(),3)
+
+        Products.objects.filter(id=self.ids[0]).update(in_stock_total=1)
+        response=self.post("adjust_stock",self.ids,stock_delta="-2",next="/admindashboard/product_list?page=1")
+        self.assertRedirects(response,"/admindashboard/product_list?page=1",fetch_redirect_response=False)
+        self.assertEqual(list(Products.objects.order_by("id").values_list("in_stock_total",flat=True)),[1,3,3,3])
+        self.assertEqual(ProductTransaction.objects.filter(transaction_description="Bulk Stock Adjustment",transaction_type=2,transaction_product_count=2).count(),3)
+
+    def test_post_without_action_deletes_nothing(self):
+        response=self.client.post("/admindashboard/product_bulk_action",{"product_ids":self.ids})
+        self.assertEqual([str(message) for message in get_messages(response.wsgi_request)],["Choose an action"])
+        self.post("drop",self.ids)
+        self.assertEqual(Products.objects.count(),4)
+
+    def test_delete_removes_children_and_files_after_commit(self):
+        customer=create_customer()
+        storage_name=default_storage.save("bulk_delete_test.jpg",ContentFile(b"image"))
+        self.addCleanup(default_storage.delete,storage_name)
+        ProductMedia.objects.create(product_id=self.products[0],media_type=1,media_content=settings.MEDIA_URL+storage_name)
+        ProductTags.objects.create(product_id=self.products[0],title="gone")
+        review=ProductReviews.objects.create(product_id=self.products[0],user_id=customer,review_image="",rating="5")
+        ProductReviewVoting.objects.create(product_review_id=review,user_id_voting=customer)
+        CustomerOrders.objects.create(product_id=self.products[1],purchase_price=Decimal("1"),coupon_code="",discount_amt=Decimal("0"),product_status="new")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response=self.post("delete",self.ids[:2])
+        self.assertEqual([m.message for m in get_messages(response.wsgi_request)],["1 products deleted, 1 kept because they have orders"])
+        self.assertEqual(list(Products.objects.values_list("id",flat=True).order_by("id")),self.ids[1:])
+        self.assertFalse(ProductTags.objects.filter(title="gone").exists())
+        self.assertFalse(ProductReviewVoting.objects.exists())
+        self.assertFalse(default_storage.exists(storage_name))
+        self.assertEqual(list(search_products(Products.objects.all(),"Bulk 0")),[])
+        self.assertEqual(dict(facet_counts()["stock"])["in_stock"],3)
+
+
+class ProductCreateTest(TestCase):
+
+    def setUp(self):
+        self.media_root=tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree,self.media_root,ignore_errors=True)
+        self.subcategory=create_subcategory()
+        self.merchant=create_merchant()
+
+    def post_product(self,**fields):
+        data={
+            "product_name":"Form Phone","brand":"Acme","url_slug":"form-phone","sub_category":self.subcategory.id,"added_by_merchant":self.merchant.id,
+            "product_max_price":"1,000","product_discount_price":"899","product_description":"","long_desc":"","in_stock_total":"7",
+            "media_type[]":["1","1"],"media_content[]":[SimpleUploadedFile("a.jpg",b"a"),SimpleUploadedFile("b.jpg",b"b")],
+            "title_title[]":["Color%d" % i for i in range(10)],"title_details[]":["Red"]*10,"about_title[]":["Fast","Light"],
+            "product_tags":",".join("tag%d" % i for i in range(15)),
+        }
+        data.update(fields)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            return self.client.post("/admindashboard/product_create",data)
+
+    def test_product_and_children_are_written_in_one_batch(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.post_product().content,b"OK")
+        inserts=[query["sql"].split('"')[1] for query in queries if query["sql"].startswith("INSERT INTO")]
+        for table in ("products","productmedia","productdetails","productabout","producttags","producttransaction"):
+            self.assertEqual(inserts.count("DjangoEcommerceApp_"+table),1)
+
+        product=Products.objects.get(product_name="Form Phone")
+        self.assertEqual((product.product_max_price,product.in_stock_total),(Decimal("1000.00"),7))
+        self.assertEqual(ProductDetails.objects.filter(product_id=product).count(),10)
+        self.assertEqual(ProductTags.objects.filter(product_id=product).count(),15)
+        self.assertEqual(len(os.listdir(self.media_root)),2)
+        self.assertEqual([p.product_name for p in search_products(Products.objects.all(),"tag14")],["Form Phone"])
+
+    def test_failure_rolls_back_rows_and_files(self):
+        with mock.patch.object(ProductTransaction.objects,"bulk_create",side_effect=DatabaseError("disk full")):
+            with self.assertRaises(DatabaseError):
+                self.post_product()
+        self.assertFalse(Products.objects.exists())
+        self.assertFalse(ProductTags.objects.exists())
+        self.assertEqual(os.listdir(self.media_root),[])
+
+    def test_invalid_stock_is_rejected_before_uploads(self):
+        for stock in ("lots","-3"):
+            self.assertEqual(self.post_product(in_stock_total=stock).status_code,400)
+        self.assertFalse(Products.objects.exists())
+        self.assertEqual(os.listdir(self.media_root),[])
+
+
+class ProductEditTest(TestCase):
+
+    def setUp(self):
+        self.subcategory=create_subcategory()
+        self.product=create_product(self.subcategory,create_merchant(),name="Edit Phone",product_description="Desc",product_long_description="Long")
+        self.color=ProductDetails.objects.create(product_id=self.product,title="Color",title_details="Red")
+        self.size=ProductDetails.objects.create(product_id=self.product,title="Size",title_details="Small")
+        self.about=ProductAbout.objects.create(product_id=self.product,title="Fast")
+        for title in ("a","b","b"):
+            ProductTags.objects.create(product_id=self.product,title=title)
+
+    def post_edit(self,**changes):
+        data={
+            "product_name":"Edit Phone","brand":"Brand","url_slug":"edit-phone","sub_category":self.subcategory.id,
+            "product_max_price":"100","product_discount_price":"90","product_description":"Desc","long_desc":"Long",
+            "details_id[]":[self.color.id,self.size.id],"title_title[]":["Color","Size"],"title_details[]":["Red","Small"],
+            "about_id[]":[self.about.id],"about_title[]":["Fast"],"product_tags":"a,b",
+        }
+        data.update(changes)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.post("/admindashboard/product_edit/%d" % self.product.id,data).content,b"OK")
+        return [query["sql"] for query in queries if query["sql"].startswith(("INSERT","UPDATE","DELETE"))]
+
+    def test_unchanged_form_writes_nothing_but_duplicate_tags(self):
+        #Only the duplicate "b" tag goes, then the search index and facets are refreshed
+        writes=self.post_edit()
+        self.assertTrue(writes[0].startswith('DELETE FROM "DjangoEcommerceApp_producttags"'))
+        self.assertFalse([sql for sql in writes if sql.startswith(('UPDATE "DjangoEcommerceApp_products"','INSERT INTO "DjangoEcommerceApp_producttags"','UPDATE "DjangoEcommerceApp_productdetails"'))])
+        self.assertEqual(self.post_edit(),[])
+
+    def test_only_changes_are_written(self):
+        self.post_edit()
+        writes=self.post_edit(**{
+            "details_id[]":[self.color.id,self.size.id,"blank"],"title_title[]":["Color","Size","Weight"],"title_details[]":["Blue","Small","1kg"],
+            "product_tags":"b,c",
+        })
+        self.assertFalse([sql for sql in writes if sql.startswith('UPDATE "DjangoEcommerceApp_products"')])
+        self.assertEqual(list(ProductDetails.objects.filter(product_id=self.product).order_by("id").values_list("title","title_details")),[("Color","Blue"),("Size","Small"),("Weight","1kg")])
+        self.assertEqual(sorted(ProductTags.objects.filter(product_id=self.product).values_list("title",flat=True)),["b","c"])
+        self.assertEqual([p.id for p in search_products(Products.objects.all(),"c")],[self.product.id])
+
+        writes=self.post_edit(product_discount_price="80",**{"details_id[]":[self.color.id,self.size.id],"title_title[]":["Color","Size"],"title_details[]":["Blue","Small"],"product_tags":"b,c"})
+        self.assertEqual(len([sql for sql in writes if sql.startswith('UPDATE "DjangoEcommerceApp_products"')]),1)
+        self.assertIn('SET "product_discount_price"',[sql for sql in writes if sql.startswith('UPDATE "DjangoEcommerceApp_products"')][0])
+
+
+class TagIndexTest(TestCase):
+
+    def setUp(self):
+        self.subcategory=create_subcategory()
+        self.merchant=create_merchant()
+        self.phone=create_product(self.subcategory,self.merchant,name="Phone")
+        self.laptop=create_product(self.subcategory,self.merchant,name="Laptop")
+        ProductTags.objects.create(product_id=self.phone,title="Android  Phone")
+        ProductTags.objects.create(product_id=self.phone,title="android phone")
+        ProductTags.objects.create(product_id=self.laptop,title="Android Phone ")
+        ProductTags.objects.create(product_id=self.laptop,title="Office")
+
+    def counts(self):
+        return dict(Tag.objects.values_list("name","product_count"))
+
+    def test_tags_are_normalized_and_counted_per_product(self):
+        self.assertEqual(self.counts(),{"android phone":2,"office":1})
+        self.assertEqual(ProductTagLink.objects.count(),3)
+        self.assertEqual(sorted(p.id for p in products_tagged("ANDROID phone")),[self.phone.id,self.laptop.id])
+        self.assertEqual(tag_cloud(),[("android phone",2),("office",1)])
+
+    def test_counts_follow_tag_and_product_changes(self):
+        ProductTags.objects.filter(product_id=self.phone,title="android phone").delete()
+        self.assertEqual(self.counts()["android phone"],2)
+        ProductTags.objects.get(product_id=self.phone).delete()
+        self.assertEqual(self.counts()["android phone"],1)
+
+        self.laptop.is_active=0
+        self.laptop.save()
+        self.assertEqual(self.counts(),{"android phone":0,"office":0})
+        self.laptop.is_active=1
+        self.laptop.save()
+        self.assertEqual(self.counts(),{"android phone":1,"office":1})
+
+        self.laptop.delete()
+        self.assertEqual(self.counts(),{"android phone":0,"office":0})
+        self.assertFalse(ProductTagLink.objects.exists())
+
+    def test_bulk_paths_keep_the_index(self):
+        self.client.post("/admindashboard/product_bulk_action",{"action":"delete","product_ids":[self.laptop.id]})
+        self.assertEqual(self.counts(),{"android phone":1,"office":0})
+        products=bulk_create_products([{"product":dict(product_name="Tablet",url_slug="tablet",brand="",subcategories_id=self.subcategory,added_by_merchant=self.merchant,product_max_price=1,product_discount_price=1,product_description="",product_long_description="",in_stock_total=0),"media":[],"details":[],"about":[],"tags":parse_tags("Office, office ,Tablet")}])
+        self.assertEqual(ProductTags.objects.filter(product_id=products[0]).count(),2)
+        self.assertEqual(self.counts(),{"android phone":1,"office":1,"tablet":1})
+
+    def test_tag_api(self):
+        response=self.client.get("/api/tags")
+        self.assertEqual(response.json()["tags"][0],{"name":"android phone","product_count":2})
+        response=self.client.get("/api/tags/Android Phone")
+        self.assertEqual(response.json(),{"products":[self.laptop.id,self.phone.id],"next_cursor":None})
+        self.assertEqual(self.client.get("/api/tags/office?cursor=bad").status_code,404)
+
+
+class InventoryTest(TestCase):
+
+    def setUp(self):
+        self.product=create_product(create_subcategory(),create_merchant(),in_stock_total=5)
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.in_stock_total,self.product.reserved_stock_total
+
+    def test_changes_are_guarded_and_ledgered(self):
+        inventory.add_stock(self.product.id,"3")
+        inventory.remove_stock(self.product.id,8)
+        with self.assertRaises(inventory.InsufficientStockError):
+            inventory.remove_stock(self.product.id,1)
+        with self.assertRaises(ValueError):
+            inventory.add_stock(self.product.id,-2)
+        self.assertEqual(self.stock(),(0,0))
+        self.assertEqual(list(ProductTransaction.objects.filter(product_id=self.product).values_list("transaction_type","transaction_product_count")),[("1",3),("2",8)])
+
+    def test_reservations_hold_stock_until_sold_released_or_expired(self):
+        sold=inventory.reserve_stock(self.product.id,2)
+        released=inventory.reserve_stock(self.product.id,2)
+        expired=inventory.reserve_stock(self.product.id,1,ttl=datetime.timedelta(seconds=-1))
+        self.assertEqual(self.stock(),(5,5))
+        with self.assertRaises(inventory.InsufficientStockError):
+            inventory.remove_stock(self.product.id,1)
+
+        inventory.sell_reservation(sold)
+        inventory.release_reservation(released)
+        with self.assertRaises(inventory.InsufficientStockError):
+            inventory.sell_reservation(sold)
+        with self.assertRaises(inventory.InsufficientStockError):
+            inventory.sell_reservation(expired)
+        self.assertEqual(self.stock(),(3,1))
+
+        out=StringIO()
+        call_command("expire_stock_reservations",stdout=out)
+        self.assertIn("1 expired",out.getvalue())
+        self.assertEqual(self.stock(),(3,0))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_add_stocks_view(self):
+        self.client.post("/admindashboard/product_add_stocks/%d" % self.product.id,{"add_stocks":"4"})
+        self.client.post("/admindashboard/product_add_stocks/%d" % self.product.id,{"add_stocks":"many"})
+        self.assertEqual(self.stock(),(9,0))
+
+
+class InventoryConcurrencyTest(TransactionTestCase):
+    THREADS=8
+    ROUNDS=25
+
+    def run_threads(self,work):
+        errors=[]
+        def target(n):
+            try:
+                for i in range(self.ROUNDS):
+                    work(n,i)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+        threads=[threading.Thread(target=target,args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors,[])
+
+    def test_no_lost_updates_or_negative_stock(self):
+        product=create_product(create_subcategory(),create_merchant(),in_stock_total=0)
+        self.run_threads(lambda n,i:inventory.add_stock(product.id,1))
+        product.refresh_from_db()
+        self.assertEqual(product.in_stock_total,self.THREADS*self.ROUNDS)
+
+        #Twice as many removals as there is stock: exactly half succeed
+        sold=[]
+        def remove(n,i):
+            for _ in range(2):
+                try:
+                    inventory.remove_stock(product.id,1)
+                    sold.append(1)
+                except inventory.InsufficientStockError:
+                    pass
+        self.run_threads(remove)
+        product.refresh_from_db()
+        self.assertEqual((product.in_stock_total,len(sold)),(0,self.THREADS*self.ROUNDS))
+        self.assertEqual(ProductTransaction.objects.filter(product_id=product,transaction_type=2).count(),len(sold))
+
+
+class StockLedgerTest(TestCase):
+
+    def setUp(self):
+        self.product=create_product(create_subcategory(),create_merchant(),in_stock_total=0)
+        self.start=timezone.now()-datetime.timedelta(days=10)
+        #(days after start, BUY or SELL, count)
+        for day,transaction_type,count in [(0,1,10),(1,2,3),(2,1,5),(5,2,4),(8,2,1)]:
+            row=ProductTransaction.objects.create(product_id=self.product,transaction_type=transaction_type,transaction_product_count=count,transaction_description="")
+            ProductTransaction.objects.filter(id=row.id).update(created_at=self.start+datetime.timedelta(days=day))
+        Products.objects.filter(id=self.product.id).update(in_stock_total=7)
+
+    def stocks_by_day(self):
+        return [stock_at(self.product.id,self.start+datetime.timedelta(days=day,hours=1)) for day in range(10)]
+
+    def test_point_in_time_stock_is_the_same_with_snapshots(self):
+        expected=[10,7,12,12,12,8,8,8,7,7]
+        self.assertEqual(self.stocks_by_day(),expected)
+        call_command("compact_stock_ledger","--until",(self.start+datetime.timedelta(days=3)).date().isoformat(),stdout=StringIO())
+        self.assertEqual(list(StockSnapshot.objects.values_list("stock",flat=True)),[12])
+        self.assertEqual(self.stocks_by_day(),expected)
+        call_command("compact_stock_ledger",stdout=StringIO())
+        self.assertEqual(list(StockSnapshot.objects.order_by("id").values_list("stock",flat=True)),[12,7])
+        self.assertEqual(self.stocks_by_day(),expected)
+        #Nothing new in the ledger, so nothing to add
+        call_command("compact_stock_ledger",stdout=StringIO())
+        self.assertEqual(StockSnapshot.objects.count(),2)
+
+    def test_current_stock_reads_the_snapshot_and_the_tail(self):
+        call_command("compact_stock_ledger",stdout=StringIO())
+        inventory.add_stock(self.product.id,4)
+        with self.assertNumQueries(2):
+            self.assertEqual(ledger_stocks([self.product.id]),{self.product.id:11})
+        self.assertEqual(stock_drift([self.product.id]),{})
+        Products.objects.filter(id=self.product.id).update(in_stock_total=1)
+        out=StringIO()
+        call_command("compact_stock_ledger","--check",stdout=out)
+        self.assertIn("Product %d: in_stock_total 1, ledger 11" % self.product.id,out.getvalue())
+
+
+class StockSeriesTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.product=create_product(create_subcategory(),create_merchant(),in_stock_total=0)
+        self.now=timezone.now().replace(hour=12,minute=0,second=0,microsecond=0)
+        self.start=self.now-datetime.timedelta(days=3)
+        for days,transaction_type,count in [(-1,1,4),(0,1,10),(0.25,2,3),(2,2,2),(3,2,1)]:
+            self.add_row(self.start+datetime.timedelta(days=days),transaction_type,count)
+
+    def add_row(self,created_at,transaction_type,count):
+        row=ProductTransaction.objects.create(product_id=self.product,transaction_type=transaction_type,transaction_product_count=count,transaction_description="")
+        ProductTransaction.objects.filter(id=row.id).update(created_at=created_at)
+
+    def points(self,resolution="day"):
+        return [(point["bought"],point["sold"],point["stock"]) for point in stock_series(self.product.id,resolution,self.start,self.now+datetime.timedelta(hours=1),now=self.now)]
+
+    def test_buckets_and_stock_levels(self):
+        self.assertEqual(self.points(),[(10,3,11),(0,0,11),(0,2,9),(0,1,8)])
+        hourly=self.points("hour")
+        self.assertEqual(len(hourly),73)
+        self.assertEqual(sum(sold for bought,sold,stock in hourly),6)
+        self.assertEqual(hourly[-1][2],8)
+
+    def test_closed_buckets_come_from_the_cache(self):
+        self.points()
+        with CaptureQueriesContext(connection) as queries:
+            self.points()
+        self.assertEqual(len([query for query in queries if "django_datetime_trunc" in query["sql"]]),1)
+        #A row landing in a closed bucket after it was cached is not picked up, one in the open bucket is
+        self.add_row(self.start+datetime.timedelta(days=1),2,5)
+        self.add_row(self.now,1,7)
+        self.assertEqual(self.points()[1:],[(0,0,11),(0,2,9),(7,1,15)])
+
+    def test_endpoint(self):
+        response=self.client.get("/admindashboard/product_stock_series/%d" % self.product.id,{"resolution":"week"})
+        self.assertEqual(response.json()["series"][-1]["stock"],8)
+        self.assertEqual(self.client.get("/admindashboard/product_stock_series/%d" % self.product.id,{"resolution":"minute"}).status_code,400)
+        self.assertEqual(self.client.get("/admindashboard/product_stock_series/%d" % self.product.id,{"resolution":"hour","start":"2000-01-01"}).status_code,400)
+
+
+@skipIf(forecasting.np is None,"numpy is not installed")
+class ForecastingTest(TestCase):
+
+    def setUp(self):
+        subcategory=create_subcategory()
+        merchant=create_merchant()
+        self.steady=create_product(subcategory,merchant,name="Steady",in_stock_total=20)
+        self.stocked=create_product(subcategory,merchant,name="Stocked",in_stock_total=500)
+        self.idle=create_product(subcategory,merchant,name="Idle",in_stock_total=0)
+        #Five a day for the last 30 days
+        today=timezone.now().replace(hour=12,minute=0,second=0,microsecond=0)
+        for product in (self.steady,self.stocked):
+            for day in range(1,31):
+                row=ProductTransaction.objects.create(product_id=product,transaction_type=2,transaction_product_count=5,transaction_description="")
+                ProductTransaction.objects.filter(id=row.id).update(created_at=today-datetime.timedelta(days=day))
+
+    def test_plan_for_the_whole_catalog(self):
+        with self.assertNumQueries(2):
+            plan=forecasting.reorder_plan(history_days=30)
+        self.assertEqual(list(plan.product_ids),[self.steady.id,self.stocked.id,self.idle.id])
+        self.assertEqual(list(plan.moving_average),[5,5,0])
+        self.assertAlmostEqual(plan.demand[0],5)
+        self.assertAlmostEqual(plan.days_of_cover[0],4)
+        #No variance, so no safety stock: 5 a day for 7 + 14 days, less the 20 on hand
+        self.assertEqual(list(plan.reorder_quantity),[85,0,0])
+        self.assertEqual([row["product_id"] for row in plan.suggestions()],[self.steady.id])
+
+    def test_reservations_count_against_stock(self):
+        inventory.reserve_stock(self.stocked.id,490)
+        plan=forecasting.reorder_plan(history_days=30)
+        self.assertEqual([row["product_id"] for row in plan.suggestions()],[self.stocked.id,self.steady.id])
+
+    def test_command_and_report(self):
+        out=StringIO()
+        call_command("forecast_demand","--history-days","30",stdout=out)
+        self.assertIn("Forecast 3 products",out.getvalue())
+        response=self.client.get("/admindashboard/reorder_report")
+        self.assertContains(response,"Steady")
+        self.assertNotContains(response,"Stocked")
+
+
+class ReorderReportWithoutNumpyTest(TestCase):
+
+    def test_report_explains_missing_numpy(self):
+        with mock.patch.object(forecasting,"np",None):
+            response=self.client.get("/admindashboard/reorder_report")
+        self.assertEqual(response.status_code,200)
+        self.assertContains(response,"Forecasting is unavailable")
+        self.assertIn("requires numpy",[str(message) for message in get_messages(response.wsgi_request)][0])
+
+
+class OrderPlacementTest(TestCase):
+
+    def setUp(self):
+        subcategory=create_subcategory()
+        merchant=create_merchant()
+        self.phone=create_product(subcategory,merchant,name="Phone",product_discount_price=Decimal("199.99"),in_stock_total=5)
+        self.case=create_product(subcategory,merchant,name="Case",product_discount_price=Decimal("10"),in_stock_total=2)
+        Coupon.objects.create(code="SALE10",discount_percent=Decimal("10"),max_uses=1)
+
+    def stock(self):
+        return list(Products.objects.filter(id__in=[self.phone.id,self.case.id]).order_by("id").values_list("in_stock_total",flat=True))
+
+    def test_order_is_written_in_bulk(self):
+        with CaptureQueriesContext(connection) as queries:
+            orders=place_order([(self.phone.id,2),(self.case.id,1),(self.case.id,1)],"SALE10")
+        self.assertEqual(len([query for query in queries if query["sql"].startswith('UPDATE "DjangoEcommerceApp_products"')]),1)
+        for table in ("customerorders","producttransaction","orderdeliverystatus"):
+            self.assertEqual(len([query for query in queries if query["sql"].startswith('INSERT INTO "DjangoEcommerceApp_%s"' % table)]),1)
+        self.assertEqual([(order.quantity,order.purchase_price,order.discount_amt) for order in orders],[(2,Decimal("359.98"),Decimal("40.00")),(2,Decimal("18.00"),Decimal("2.00"))])
+        self.assertEqual(self.stock(),[3,0])
+        self.assertEqual(OrderDeliveryStatus.objects.filter(order_id__in=orders,status="placed").count(),2)
+        self.assertEqual(ProductTransaction.objects.filter(transaction_type=2).count(),2)
+
+    def test_failed_order_changes_nothing(self):
+        with self.assertRaises(inventory.InsufficientStockError):
+            place_order([(self.phone.id,1),(self.case.id,3)])
+        place_order([(self.phone.id,1)],"SALE10")
+        with self.assertRaises(OrderError):
+            place_order([(self.phone.id,1)],"SALE10")
+        with self.assertRaises(OrderError):
+            place_order([(self.phone.id,0)])
+        self.assertEqual(self.stock(),[4,2])
+        self.assertEqual(CustomerOrders.objects.count(),1)
+        self.assertEqual(Coupon.objects.get().used_count,1)
+
+
+class OrderConcurrencyTest(TransactionTestCase):
+
+    def test_concurrent_orders_never_oversell(self):
+        product=create_product(create_subcategory(),create_merchant(),in_stock_total=50)
+        placed=[]
+        errors=[]
+        def buy():
+            try:
+                for i in range(10):
+                    try:
+                        placed.extend(place_order([(product.id,1)]))
+                    except inventory.InsufficientStockError:
+                        pass
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+        threads=[threading.Thread(target=buy) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        product.refresh_from_db()
+        self.assertEqual(errors,[])
+        self.assertEqual((product.in_stock_total,len(placed),CustomerOrders.objects.count()),(0,50,50))
@@ -0,0 +1,117 @@
+"""
+Place orders from concurrent threads through orders.place_order, as on a
+sale day, and report throughput and latency.
+
+    python benchmarks/order_placement.py --threads 8 --orders 4000
+
+Runs against a throwaway SQLite database, never the project database.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE","DjangoEcommerce.settings")
+
+import django
+from django.conf import settings
+
+
+def populate(products,stock,batch_size=20000):
+    from decimal import Decimal
+    from django.db import connection,transaction
+    from DjangoEcommerceApp.models import Products,CustomUser,Categories,SubCategories,Coupon
+
+    user=CustomUser.objects.create(username="bench_merchant",user_type=3)
+    category=Categories.objects.create(title="Bench",url_slug="bench",thumbnail="",description="")
+    subcategory=SubCategories.objects.create(category_id=category,title="Bench",url_slug="bench",thumbnail="",description="")
+    Coupon.objects.create(code="SALE",discount_percent=Decimal("15"))
+    product_sql='INSERT INTO "%s"(id,url_slug,subcategories_id_id,product_name,brand,product_max_price,product_discount_price,product_description,product_long_description,created_at,added_by_merchant_id,in_stock_total,reserved_stock_total,is_active) VALUES (%%s,%%s,%%s,%%s,%%s,%%s,%%s,%%s,%%s,%%s,%%s,%%s,0,1)' % Products._meta.db_table
+    random.seed(1)
+    for start in range(1,products+1,batch_size):
+        rows=[(product_id,"p-%d" % product_id,subcategory.id,"Product %d" % product_id,"Bench","%d.00" % (price+100),"%d.99" % price,"","","2021-01-01 00:00:00",user.merchantuser.id,stock) for product_id,price in ((product_id,random.randint(1,5000)) for product_id in range(start,min(start+batch_size,products+1)))]
+        with transaction.atomic(),connection.cursor() as cursor:
+            cursor.executemany(product_sql,rows)
+
+
+def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument("--threads",type=int,default=8)
+    parser.add_argument("--orders",type=int,default=4000,help="Orders placed in total, split over the threads.")
+    parser.add_argument("--products",type=int,default=1000)
+    parser.add_argument("--lines",type=int,default=3,help="Most products per order.")
+    parser.add_argument("--stock",type=int,default=1000,help="Starting stock of every product; lower it to measure sold-out contention.")
+    parser.add_argument("--hot",type=float,default=0.2,help="Share of orders that include one of the 10 best sellers.")
+    args=parser.parse_args()
+
+    directory=tempfile.mkdtemp()
+    #The database is removed even when the run fails
+    try:
+        settings.DATABASES["default"]["NAME"]=os.path.join(directory,"bench.sqlite3")
+        django.setup()
+
+        from django.core.management import call_command
+        from django.db import connections
+        from DjangoEcommerceApp.models import Products,CustomerOrders
+        from DjangoEcommerceApp.inventory import InsufficientStockError
+        from DjangoEcommerceApp.orders import place_order
+
+        call_command("migrate",verbosity=0)
+        populate(args.products,args.stock)
+
+        latencies=[]
+        outcomes={"placed":0,"sold out":0,"error":0}
+        lock=threading.Lock()
+
+        def shopper(seed,count):
+            rng=random.Random(seed)
+            try:
+                for i in range(count):
+                    lines=[(rng.randint(1,args.products),rng.randint(1,2)) for line in range(rng.randint(1,args.lines))]
+                    if rng.random()<args.hot:
+                        lines.append((rng.randint(1,10),1))
+                    started=time.perf_counter()
+                    try:
+                        place_order(lines,"SALE" if rng.random()<0.3 else "")
+                        outcome="placed"
+                    except InsufficientStockError:
+                        outcome="sold out"
+                    except Exception as e:
+                        outcome="error"
+                        print("  %s: %s" % (type(e).__name__,e))
+                    elapsed=(time.perf_counter()-started)*1000
+                    with lock:
+                        latencies.append(elapsed)
+                        outcomes[outcome]+=1
+            finally:
+                connections.close_all()
+
+        per_thread=args.orders//args.threads
+        threads=[threading.Thread(target=shopper,args=(n,per_thread)) for n in range(args.threads)]
+        started=time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed=time.perf_counter()-started
+
+        latencies.sort()
+        def percentile(p):
+            return latencies[min(len(latencies)-1,int(len(latencies)*p/100))]
+        print("%d orders from %d threads in %.2fs: %.0f orders/s" % (len(latencies),args.threads,elapsed,len(latencies)/elapsed))
+        print("  %s" % ", ".join("%s %d" % item for item in outcomes.items()))
+        print("  latency p50 %.2f ms   p99 %.2f ms   max %.2f ms" % (percentile(50),percentile(99),latencies[-1]))
+
+        negative=Products.objects.filter(in_stock_total__lt=0).count()
+        print("  %d order rows written, %d products with negative stock" % (CustomerOrders.objects.count(),negative))
+    finally:
+        shutil.rmtree(directory,ignore_errors=True)
+
+
+if __name__=="__main__":
+    main()
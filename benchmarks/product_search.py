@@ -0,0 +1,110 @@
+"""
+Compare the old LIKE '%term%' product search with the FTS5 index.
+
+    python benchmarks/product_search.py --rows 1000000
+
+Runs against a throwaway SQLite database, never the project database.
+"""
+import argparse
+import itertools
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE","DjangoEcommerce.settings")
+
+import django
+from django.conf import settings
+
+SYLLABLES=["ka","lo","mi","ne","ru","sa","ti","vo","ze","pa","da","fi","go","hu","je","bo"]
+#Catalogue text drawn from a 20k word vocabulary with a skewed (Zipf-like) frequency
+WORDS=["".join(syllables) for syllables in itertools.product(SYLLABLES,repeat=4)]
+random.Random(7).shuffle(WORDS)
+WORDS=WORDS[:20000]
+WEIGHTS=list(itertools.accumulate(1.0/(rank+1) for rank in range(len(WORDS))))
+BRANDS=["Acme","Globex","Initech","Umbrella","Stark","Wayne","Hooli","Soylent"]
+
+
+def populate(rows,batch_size=20000):
+    from django.db import connection,transaction
+    from DjangoEcommerceApp.models import Products,ProductTags,CustomUser,Categories,SubCategories
+
+    user=CustomUser.objects.create(username="bench_merchant",user_type=3)
+    category=Categories.objects.create(title="Bench",url_slug="bench",thumbnail="",description="")
+    subcategory=SubCategories.objects.create(category_id=category,title="Bench",url_slug="bench",thumbnail="",description="")
+    random.seed(1)
+    product_sql='INSERT INTO "%s"(id,url_slug,subcategories_id_id,product_name,brand,product_max_price,product_discount_price,product_description,product_long_description,created_at,added_by_merchant_id,in_stock_total,reserved_stock_total,is_active) VALUES (%%s,%%s,%%s,%%s,%%s,%%s,%%s,%%s,%%s,%%s,%%s,1,0,1)' % Products._meta.db_table
+    tag_sql='INSERT INTO "%s"(product_id_id,title,created_at,is_active) VALUES (%%s,%%s,%%s,1)' % ProductTags._meta.db_table
+    now="2021-01-01 00:00:00"
+    for start in range(1,rows+1,batch_size):
+        products=[]
+        tags=[]
+        for product_id in range(start,min(start+batch_size,rows+1)):
+            name=" ".join(random.choices(WORDS,cum_weights=WEIGHTS,k=3))+" %d" % product_id
+            description=" ".join(random.choices(WORDS,cum_weights=WEIGHTS,k=12))
+            products.append((product_id,"p-%d" % product_id,subcategory.id,name,random.choice(BRANDS),"100","90",description,description,now,user.merchantuser.id))
+            tags.append((product_id,random.choices(WORDS,cum_weights=WEIGHTS)[0],now))
+        with transaction.atomic(),connection.cursor() as cursor:
+            cursor.executemany(product_sql,products)
+            cursor.executemany(tag_sql,tags)
+
+
+def timed(label,run,repeat):
+    timings=[]
+    for i in range(repeat):
+        started=time.perf_counter()
+        run()
+        timings.append((time.perf_counter()-started)*1000)
+    timings.sort()
+    print("%-28s median %9.2f ms   max %9.2f ms" % (label,timings[len(timings)//2],timings[-1]))
+
+
+def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument("--rows",type=int,default=1000000)
+    parser.add_argument("--repeat",type=int,default=5)
+    args=parser.parse_args()
+
+    directory=tempfile.mkdtemp()
+    #The database is removed even when the run fails; at full scale it is several GB
+    try:
+        settings.DATABASES["default"]["NAME"]=os.path.join(directory,"bench.sqlite3")
+        django.setup()
+
+        from django.core.management import call_command
+        from django.db.models import Q
+        from DjangoEcommerceApp.models import Products
+        from DjangoEcommerceApp.search import rebuild_product_index,search_products
+
+        call_command("migrate",verbosity=0)
+        started=time.perf_counter()
+        populate(args.rows)
+        print("Inserted %d products in %.1fs" % (args.rows,time.perf_counter()-started))
+        started=time.perf_counter()
+        rebuild_product_index(batch_size=50000)
+        print("Built search index in %.1fs" % (time.perf_counter()-started))
+
+        #A common word, a mid-frequency word, a rare word, a prefix and a two word query
+        terms=[WORDS[0],WORDS[50],WORDS[5000],WORDS[5000][:5],WORDS[3]+" "+WORDS[40]]
+        for term in terms:
+            def like_page():
+                queryset=Products.objects.filter(Q(product_name__contains=term) | Q(product_description__contains=term)).order_by("id")
+                queryset.count()
+                list(queryset[:3])
+            def fts_page():
+                queryset=search_products(Products.objects.all(),term).order_by("search_rank")
+                queryset.count()
+                list(queryset[:3])
+            print("term %r" % term)
+            timed("  LIKE scan",like_page,args.repeat)
+            timed("  FTS5 bm25",fts_page,args.repeat)
+    finally:
+        shutil.rmtree(directory,ignore_errors=True)
+
+
+if __name__=="__main__":
+    main()